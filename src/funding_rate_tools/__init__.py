@@ -1 +1,10 @@
 # src/funding_rate_tools/__init__.py
+# The library API is imported on first use: importing database creates the default
+# database file, which importing e.g. config on its own must not do.
+__all__ = ["FundingClient", "FundingError", "FundingRate", "FundingStore", "PaRate", "RefreshResult"]
+
+def __getattr__(name: str):
+    if name in __all__:
+        from . import api
+        return getattr(api, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
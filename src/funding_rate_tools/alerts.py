@@ -0,0 +1,314 @@
+import argparse
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+import requests
+
+from . import config, http_client
+
+# Alert rules, read from config.ALERTS_PATH (FUNDING_ALERTS_FILE), e.g.:
+#   {"sinks": [{"type": "stderr"}, {"type": "jsonl", "path": "alerts.jsonl"},
+#              {"type": "webhook", "url": "http://127.0.0.1:8999/mock/webhook"}],
+#    "rules": [{"name": "btc-7d-negative", "metric": "pa", "window_days": 7, "below": -20, "symbols": ["BTCUSDT"]},
+#              {"name": "flip", "metric": "sign_flip", "sources": ["binance"]}]}
+# Metrics: "pa" is the time-weighted p.a. % over the trailing window_days, "rate" the
+# p.a. % of a single payment, "sign_flip" fires whenever a payment's sign differs from
+# the previous nonzero one. "pa" and "rate" fire once when the value crosses below/above
+# and re-arm when it is back inside. Rules are checked by store_funding_rates on the
+# rows it just stored, so the cost per store is a few indexed queries per symbol,
+# whatever the number of rules. Only rows past the symbol's previously stored tail
+# can raise alerts: a symbol's first fetch and backfills just build up the state.
+# Alerts never go to stdout, which carries the tools' own output (e.g. --json).
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+HOURS_PER_YEAR = 24 * 365
+METRICS = ("pa", "rate", "sign_flip")
+SINK_TYPES = ("stderr", "jsonl", "webhook")
+# Settlements older than this update the rolling state without alerting, so catching
+# up after downtime doesn't replay past events.
+MAX_ALERT_AGE_MS = DAY_MS
+WEBHOOK_TIMEOUT_S = 5
+
+_lock = threading.Lock()
+_loaded = (None, None, None)  # (path, mtime, rules or None)
+
+def parse_rules(data: dict, base_dir: str = ".", version: str = "") -> dict:
+    """
+    Validates a rules document, returning it with defaults filled in and jsonl
+    paths resolved against base_dir (the rules file's directory). `version`
+    identifies the file contents in the window state. Raises ValueError.
+    """
+    if not isinstance(data, dict) or not isinstance(data.get("rules"), list):
+        raise ValueError('expected an object with a "rules" list')
+    rules, names = [], set()
+    for n, raw in enumerate(data["rules"]):
+        if not isinstance(raw, dict):
+            raise ValueError(f"rule {n} is not an object")
+        name = raw.get("name") or f"rule-{n}"
+        if name in names:
+            raise ValueError(f"duplicate rule name {name!r}")
+        names.add(name)
+        metric = raw.get("metric", "pa")
+        if metric not in METRICS:
+            raise ValueError(f"rule {name!r}: metric must be one of {', '.join(METRICS)}")
+        rule = {"name": name, "metric": metric, "below": raw.get("below"), "above": raw.get("above")}
+        for key in ("below", "above"):
+            if rule[key] is not None and not isinstance(rule[key], (int, float)):
+                raise ValueError(f"rule {name!r}: {key} must be a number")
+        if metric != "sign_flip" and rule["below"] is None and rule["above"] is None:
+            raise ValueError(f"rule {name!r}: needs below and/or above")
+        if metric == "pa":
+            days = raw.get("window_days", 7)
+            if not isinstance(days, (int, float)) or days <= 0:
+                raise ValueError(f"rule {name!r}: window_days must be a positive number")
+            rule["window_days"] = days
+            rule["window_ms"] = int(days * DAY_MS)
+        rule["symbols"] = {s.upper() for s in raw["symbols"]} if raw.get("symbols") else None
+        rule["sources"] = {s.lower() for s in raw["sources"]} if raw.get("sources") else None
+        rules.append(rule)
+    sinks = data.get("sinks") or [{"type": "stderr"}]
+    for sink in sinks:
+        if isinstance(sink, dict) and sink.get("type") == "stdout":
+            raise ValueError("stdout carries the tools' own output; use a stderr sink")
+        if not isinstance(sink, dict) or sink.get("type") not in SINK_TYPES:
+            raise ValueError(f"sink types are {', '.join(SINK_TYPES)}")
+        if sink["type"] == "jsonl":
+            if not sink.get("path"):
+                raise ValueError('jsonl sinks need a "path"')
+            sink["path"] = os.path.join(base_dir, sink["path"])
+        if sink["type"] == "webhook" and not sink.get("url"):
+            raise ValueError('webhook sinks need a "url"')
+    return {"rules": rules, "sinks": sinks, "version": version}
+
+def _read_rules(path: str) -> dict:
+    with open(path, "rb") as f:
+        raw = f.read()
+    return parse_rules(json.loads(raw), os.path.dirname(os.path.abspath(path)), hashlib.sha1(raw).hexdigest())
+
+def load_rules(path: str | None = None) -> dict | None:
+    """
+    The parsed rules file, or None if there is none. Re-read only when the file
+    changes; an invalid file is reported on stderr once and disables alerting.
+    """
+    global _loaded
+    path = path or config.ALERTS_PATH
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    with _lock:
+        if _loaded[:2] == (path, mtime):
+            return _loaded[2]
+        try:
+            rules = _read_rules(path)
+        except (OSError, ValueError) as e:
+            print(f"Warning: Ignoring alert rules in {path}: {e}", file=sys.stderr)
+            rules = None
+        _loaded = (path, mtime, rules)
+        return rules
+
+def _applies(rule: dict, source: str, symbol: str) -> bool:
+    return (rule["sources"] is None or source in rule["sources"]) and (rule["symbols"] is None or symbol in rule["symbols"])
+
+def _breached(rule: dict, value: float | None) -> bool:
+    if value is None:
+        return False
+    return (rule["below"] is not None and value < rule["below"]) or (rule["above"] is not None and value > rule["above"])
+
+def _window_sums(conn, source: str, symbol: str, lo: int, hi: int) -> tuple[float, float]:
+    """Sum of rates with a known interval, and of those intervals, over (lo, hi]."""
+    row = conn.execute('''
+        SELECT SUM(CASE WHEN interval_hours IS NOT NULL THEN funding_rate END), SUM(interval_hours)
+        FROM funding_rates WHERE source = ? AND symbol = ? AND funding_time > ? AND funding_time <= ?
+    ''', (source, symbol, lo, hi)).fetchone()
+    return row[0] or 0.0, row[1] or 0.0
+
+def _update_window(conn, source: str, symbol: str, window_ms: int, rows: list[tuple],
+                   previous_tail: int | None, version: str) -> tuple[int, float | None]:
+    """
+    Moves the running sums of the trailing window to the newest stored row and
+    returns (end_time, p.a. %). New rows past the old end are added from `rows`,
+    and only the rows that fell out of the window are read back, so a store costs
+    O(new rows). The window is rebuilt instead when it doesn't end at the tail
+    stored before this write (rows were stored while its rule was missing, invalid
+    or different), when the rules file changed, or when rows land inside it.
+    """
+    newest = max(t for t, _, _ in rows)
+    state = conn.execute('''
+        SELECT end_time, sum_rate, sum_hours, rules_version FROM alert_windows
+        WHERE source = ? AND symbol = ? AND window_ms = ?
+    ''', (source, symbol, window_ms)).fetchone()
+    end = max(newest, state[0]) if state else newest
+    start = end - window_ms
+    if (state is None or state[3] != version or state[0] != previous_tail
+            or any(start < t <= state[0] for t, _, _ in rows)):
+        sum_rate, sum_hours = _window_sums(conn, source, symbol, start, end)
+    else:
+        old_end, sum_rate, sum_hours, _ = state
+        if start > old_end - window_ms:
+            gone_rate, gone_hours = _window_sums(conn, source, symbol, old_end - window_ms, min(start, old_end))
+            sum_rate -= gone_rate
+            sum_hours -= gone_hours
+        for t, rate, hours in rows:
+            if t > max(start, old_end) and hours:
+                sum_rate += rate
+                sum_hours += hours
+    conn.execute('''
+        INSERT OR REPLACE INTO alert_windows (source, symbol, window_ms, rules_version, end_time, sum_rate, sum_hours)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', (source, symbol, window_ms, version, end, sum_rate, sum_hours))
+    # Subtraction leaves float dust; no hours left means an empty window.
+    return end, sum_rate / sum_hours * HOURS_PER_YEAR * 100 if sum_hours > 1e-9 else None
+
+def _alert(rule: dict, source: str, symbol: str, funding_time: int, value: float | None, message: str) -> dict:
+    return {
+        "rule": rule["name"], "metric": rule["metric"], "source": source, "symbol": symbol,
+        "funding_time": funding_time, "value": round(value, 4) if value is not None else None,
+        "below": rule["below"], "above": rule["above"], "message": message,
+        "time": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ"),
+    }
+
+def _threshold_text(rule: dict, value: float) -> str:
+    if rule["below"] is not None and value < rule["below"]:
+        return f"below {rule['below']}%"
+    return f"above {rule['above']}%"
+
+def evaluate(conn, source: str, symbol: str, rows: list[tuple], previous_tail: int | None,
+             now_ms: int | None = None, rules: dict | None = None) -> list[dict]:
+    """
+    Updates the alert state of one symbol with just-stored (funding_time, funding_rate,
+    interval_hours) rows, inside the caller's transaction, and returns the alerts raised.
+    previous_tail is the symbol's newest funding_time before the store (None if it had
+    none); only rows after it, and no older than MAX_ALERT_AGE_MS, raise alerts.
+    """
+    rules = rules if rules is not None else load_rules()
+    if not rules or not rows:
+        return []
+    matching = [rule for rule in rules["rules"] if _applies(rule, source, symbol)]
+    if not matching:
+        return []
+    now_ms = now_ms or int(time.time() * 1000)
+
+    def alertable(t: int) -> bool:
+        return previous_tail is not None and t > previous_tail and t >= now_ms - MAX_ALERT_AGE_MS
+
+    rows = sorted(rows)
+    windows = {
+        window_ms: _update_window(conn, source, symbol, window_ms, rows, previous_tail, rules["version"])
+        for window_ms in {rule["window_ms"] for rule in matching if rule["metric"] == "pa"}
+    }
+    states = {
+        r[0]: r for r in conn.execute(
+            'SELECT rule, last_time, last_rate, value, active FROM alert_state WHERE source = ? AND symbol = ?',
+            (source, symbol)
+        )
+    }
+    alerts, updates = [], []
+    for rule in matching:
+        _, last_time, last_rate, value, active = states.get(rule["name"], (None, -1, None, None, 0))
+        active = bool(active)
+        if rule["metric"] == "pa":
+            end, value = windows[rule["window_ms"]]
+            if end <= last_time:
+                continue
+            breached = _breached(rule, value)
+            if breached and not active and alertable(end):
+                alerts.append(_alert(rule, source, symbol, end, value,
+                                     f"{symbol} on {source}: {rule['window_days']:g}d p.a. {value:.2f}% {_threshold_text(rule, value)}"))
+            active, last_time = breached, end
+        else:
+            for t, rate, hours in rows:
+                if t <= last_time:
+                    continue
+                recent = alertable(t)
+                if rule["metric"] == "rate":
+                    value = rate * HOURS_PER_YEAR / hours * 100 if hours else None
+                    breached = _breached(rule, value)
+                    if breached and not active and recent:
+                        alerts.append(_alert(rule, source, symbol, t, value,
+                                             f"{symbol} on {source}: payment at {value:.2f}% p.a. {_threshold_text(rule, value)}"))
+                    active = breached
+                elif rate:
+                    if last_rate and (rate > 0) != (last_rate > 0) and recent:
+                        value = rate * HOURS_PER_YEAR / hours * 100 if hours else None
+                        sign = "positive" if rate > 0 else "negative"
+                        alerts.append(_alert(rule, source, symbol, t, value,
+                                             f"{symbol} on {source}: funding flipped {sign} ({rate * 100:.4f}% per payment)"))
+                    last_rate = rate
+                last_time = t
+        updates.append((rule["name"], source, symbol, last_time, last_rate, value, int(active)))
+    conn.executemany('''
+        INSERT OR REPLACE INTO alert_state (rule, source, symbol, last_time, last_rate, value, active)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', updates)
+    return alerts
+
+def send(alerts: list[dict], sinks: list[dict]):
+    """Delivers alerts to every sink; a failing sink is reported on stderr and skipped."""
+    for sink in sinks:
+        try:
+            if sink["type"] == "stderr":
+                for alert in alerts:
+                    print(f"ALERT [{alert['rule']}] {alert['message']}", file=sys.stderr, flush=True)
+            elif sink["type"] == "jsonl":
+                with open(sink["path"], "a") as f:
+                    for alert in alerts:
+                        f.write(json.dumps(alert) + "\n")
+            else:
+                for alert in alerts:
+                    resp = http_client.post(sink["url"], json=alert, timeout=WEBHOOK_TIMEOUT_S)
+                    resp.raise_for_status()
+        except (OSError, requests.RequestException) as e:
+            print(f"Warning: Could not deliver alerts to {sink['type']} sink: {e}", file=sys.stderr)
+
+def on_stored(conn, source: str, symbol: str, rows: list[tuple], previous_tail: int | None, rules: dict):
+    """Hook run by store_funding_rates after it has committed new rows, with the rules it loaded."""
+    alerts = evaluate(conn, source, symbol, rows, previous_tail, rules=rules)
+    conn.commit()
+    if alerts:
+        send(alerts, rules["sinks"])
+
+def main():
+    """Checks the alert rules file and shows the state of each rule."""
+    parser = argparse.ArgumentParser(description="Check the alert rules evaluated whenever funding rates are stored.")
+    parser.add_argument("--rules", help=f"Rules file. Default: {config.ALERTS_PATH} (FUNDING_ALERTS_FILE)")
+    parser.add_argument("--test", action="store_true", help="Send a test alert to every configured sink.")
+    args = parser.parse_args()
+
+    path = args.rules or config.ALERTS_PATH
+    try:
+        rules = _read_rules(path)
+    except (OSError, ValueError) as e:
+        print(f"Error: Could not load alert rules from {path}: {e}")
+        sys.exit(1)
+
+    from .database import get_db_connection, setup_database
+    setup_database()
+    conn = get_db_connection()
+    try:
+        states = conn.execute(
+            'SELECT rule, source, symbol, last_time, value, active FROM alert_state ORDER BY rule, source, symbol'
+        ).fetchall()
+    finally:
+        conn.close()
+    print(f"{len(rules['rules'])} rule(s) in {path}; sinks: {', '.join(s['type'] for s in rules['sinks'])}")
+    for rule in rules["rules"]:
+        what = [f"{rule['window_days']:g}d pa" if rule["metric"] == "pa" else rule["metric"]]
+        what += [f"{key} {rule[key]}%" for key in ("below", "above") if rule[key] is not None]
+        scope = ", ".join(sorted(rule["symbols"] or ["all symbols"])) + " on " + ", ".join(sorted(rule["sources"] or ["all sources"]))
+        print(f"  {rule['name']}: {' '.join(what)} ({scope})")
+        for name, source, symbol, last_time, value, active in states:
+            if name == rule["name"] and active:
+                checked = datetime.fromtimestamp(last_time / 1000, tz=timezone.utc).strftime('%Y-%m-%d %H:%M')
+                print(f"    ACTIVE {symbol} on {source}: {value:.2f}% (as of {checked} UTC)")
+    if args.test:
+        send([_alert({"name": "test", "metric": "test", "below": None, "above": None}, "test", "TEST", int(time.time() * 1000),
+                     None, "Test alert from funding-alerts")], rules["sinks"])
+
+if __name__ == "__main__":
+    main()
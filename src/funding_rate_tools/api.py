@@ -0,0 +1,254 @@
+import bisect
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from . import config
+from .calculations import annualize_rates
+from .config import Exchange
+from .database import setup_database, store_funding_info, store_funding_rates
+from .exchanges import get_adapter
+from .pagination import PAGE_WORKERS
+from .utils import plan_refresh
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+class FundingError(Exception):
+    """Raised for invalid requests to the library API. Nothing in this module prints or exits."""
+
+@dataclass(frozen=True)
+class FundingRate:
+    funding_time: int
+    funding_rate: float
+    interval_hours: int | None = None
+
+@dataclass(frozen=True)
+class PaRate:
+    symbol: str
+    exchange: str
+    start_time_ms: int
+    end_time_ms: int
+    pa_rate: float | None
+    samples: int
+    interval_hours: int | None
+
+@dataclass(frozen=True)
+class RefreshResult:
+    symbol: str
+    exchange: str
+    fetched: bool
+    stored: int
+    error: str | None = None
+
+def _exchange(value: str | Exchange) -> Exchange:
+    if isinstance(value, Exchange):
+        return value
+    try:
+        return Exchange(value.lower())
+    except ValueError:
+        raise FundingError(f"Unknown exchange '{value}'. Use one of: {', '.join(e.value for e in Exchange)}.") from None
+
+class FundingStore:
+    """
+    The funding database behind one long-lived connection, with funding intervals
+    and recent series cached in memory.
+    Writes made through the store invalidate the affected cache entries; writes by
+    other processes (funding-cli, funding-daemon) are noticed through SQLite's
+    data_version and clear the whole cache. Safe to share between threads.
+    """
+
+    def __init__(self, path: str | None = None, max_cached_series: int = 256):
+        self.conn = sqlite3.connect(path or config.DATABASE_PATH, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        setup_database(self.conn)
+        self.max_cached_series = max_cached_series
+        self._lock = threading.RLock()
+        self._intervals: dict[tuple[str, str], int | None] = {}
+        # (source, symbol) -> (loaded_from_ms, times, rates); each entry holds every
+        # stored row from loaded_from_ms on, so any later window is a slice of it.
+        self._series: OrderedDict[tuple[str, str], tuple[int, list[int], list[FundingRate]]] = OrderedDict()
+        self._data_version = self._read_data_version()
+
+    def _read_data_version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _check_external_writes(self):
+        version = self._read_data_version()
+        if version != self._data_version:
+            self._data_version = version
+            self._intervals.clear()
+            self._series.clear()
+
+    def interval_hours(self, symbol: str, exchange: str | Exchange) -> int | None:
+        key = (_exchange(exchange).value, symbol.upper())
+        with self._lock:
+            self._check_external_writes()
+            if key not in self._intervals:
+                row = self.conn.execute(
+                    'SELECT interval_hours FROM funding_info WHERE symbol = ? AND source = ?', (key[1], key[0])
+                ).fetchone()
+                self._intervals[key] = row['interval_hours'] if row else None
+            return self._intervals[key]
+
+    def rates(self, symbol: str, exchange: str | Exchange, start_time_ms: int,
+              end_time_ms: int | None = None) -> list[FundingRate]:
+        """Stored funding rates with start_time_ms <= funding_time <= end_time_ms, oldest first."""
+        key = (_exchange(exchange).value, symbol.upper())
+        with self._lock:
+            self._check_external_writes()
+            cached = self._series.get(key)
+            if cached is None or cached[0] > start_time_ms:
+                rows = self.conn.execute('''
+                    SELECT funding_time, funding_rate, interval_hours FROM funding_rates
+                    WHERE symbol = ? AND source = ? AND funding_time >= ?
+                    ORDER BY funding_time ASC
+                ''', (key[1], key[0], start_time_ms)).fetchall()
+                rates = [FundingRate(r['funding_time'], r['funding_rate'], r['interval_hours']) for r in rows]
+                cached = (start_time_ms, [r.funding_time for r in rates], rates)
+                self._series[key] = cached
+                while len(self._series) > self.max_cached_series:
+                    self._series.popitem(last=False)
+            self._series.move_to_end(key)
+            _, times, rates = cached
+        lo = bisect.bisect_left(times, start_time_ms)
+        hi = len(times) if end_time_ms is None else bisect.bisect_right(times, end_time_ms)
+        return rates[lo:hi]
+
+    def last_funding_time(self, symbol: str, exchange: str | Exchange) -> int | None:
+        source = _exchange(exchange).value
+        with self._lock:
+            row = self.conn.execute(
+                'SELECT MAX(funding_time) AS last_time FROM funding_rates WHERE symbol = ? AND source = ?',
+                (symbol.upper(), source)
+            ).fetchone()
+        return int(row['last_time']) if row['last_time'] is not None else None
+
+    def store_rates(self, symbol: str, exchange: str | Exchange, rates: list[dict]) -> None:
+        """Stores API-shaped rates ({fundingTime, fundingRate}) and invalidates the cached series."""
+        key = (_exchange(exchange).value, symbol.upper())
+        with self._lock:
+            store_funding_rates(key[1], rates, key[0], self.conn)
+            self._series.pop(key, None)
+
+    def store_interval(self, symbol: str, exchange: str | Exchange, interval_hours: int) -> None:
+        key = (_exchange(exchange).value, symbol.upper())
+        with self._lock:
+            store_funding_info(key[1], interval_hours, key[0], self.conn)
+            self._intervals.pop(key, None)
+
+    def pa_rate(self, symbol: str, exchange: str | Exchange, start_time_ms: int,
+                end_time_ms: int | None = None) -> PaRate:
+        """p.a. rate (short's perspective) over a window; pa_rate is None when it cannot be computed."""
+        source = _exchange(exchange).value
+        end_time_ms = end_time_ms if end_time_ms is not None else int(time.time() * 1000)
+        rates = self.rates(symbol, source, start_time_ms, end_time_ms)
+        interval = self.interval_hours(symbol, source)
+        pa = annualize_rates([{"funding_rate": r.funding_rate, "interval_hours": r.interval_hours} for r in rates], interval)
+        return PaRate(symbol.upper(), source, start_time_ms, end_time_ms, pa, len(rates), interval)
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+class FundingClient:
+    """
+    A FundingStore plus the exchange adapters: refreshes symbols from the venues
+    over the shared HTTP connection pool and answers p.a. queries from the store.
+    """
+
+    def __init__(self, store: FundingStore | None = None, exchange: str | Exchange = Exchange.BINANCE):
+        self.store = store or FundingStore()
+        self.exchange = _exchange(exchange)
+        self._refresh_locks: dict[tuple[str, str], threading.Lock] = {}
+        self._locks_lock = threading.Lock()
+
+    def _refresh_lock(self, key: tuple[str, str]) -> threading.Lock:
+        with self._locks_lock:
+            return self._refresh_locks.setdefault(key, threading.Lock())
+
+    def refresh(self, symbols: list[str], exchange: str | Exchange | None = None,
+                mode: str = "smart") -> list[RefreshResult]:
+        """
+        Fetches new rates for the symbols that `mode` ("smart", "always" or "never")
+        says are due. Concurrent refreshes of the same symbol are serialized, so a
+        burst of callers causes one fetch. Request errors are not raised but reported
+        in each symbol's RefreshResult.error; rates received before the error are kept.
+        """
+        if mode not in ("smart", "always", "never"):
+            raise FundingError(f"Unknown refresh mode '{mode}'. Use smart, always or never.")
+        exchange = _exchange(exchange or self.exchange)
+        adapter = get_adapter(exchange)
+        symbols = [s.upper() for s in symbols]
+        with self.store._lock:
+            plans = plan_refresh(symbols, exchange.value, mode, self.store.conn)
+
+        results = []
+        for plan in plans:
+            symbol = plan["symbol"]
+            if not plan["due"]:
+                results.append(RefreshResult(symbol, exchange.value, False, 0))
+                continue
+            with self._refresh_lock((exchange.value, symbol)):
+                # Another thread may have refreshed it while we waited.
+                last_time = self.store.last_funding_time(symbol, exchange)
+                if mode == "smart" and last_time is not None and last_time != plan["last_time"]:
+                    results.append(RefreshResult(symbol, exchange.value, False, 0))
+                    continue
+                stored = 0
+                try:
+                    hours = self.store.interval_hours(symbol, exchange)
+                    if hours is None:
+                        hours = adapter.fetch_interval(symbol)
+                        if hours:
+                            self.store.store_interval(symbol, exchange, hours)
+                    for page in adapter.iter_history(symbol, last_time + 1 if last_time else None,
+                                                     interval_hours=hours, workers=PAGE_WORKERS):
+                        self.store.store_rates(symbol, exchange, page)
+                        stored += len(page)
+                    results.append(RefreshResult(symbol, exchange.value, True, stored))
+                except Exception as e:
+                    results.append(RefreshResult(symbol, exchange.value, True, stored, str(e)))
+        return results
+
+    def pa_rate(self, symbol: str, exchange: str | Exchange | None = None, days: float | None = None,
+                start_time_ms: int | None = None, end_time_ms: int | None = None,
+                refresh: str = "never") -> PaRate:
+        """p.a. rate over the last `days` days or from start_time_ms, optionally refreshing first."""
+        if (days is None) == (start_time_ms is None):
+            raise FundingError("Pass exactly one of days or start_time_ms.")
+        exchange = _exchange(exchange or self.exchange)
+        if refresh != "never":
+            self.refresh([symbol], exchange, refresh)
+        end_time_ms = end_time_ms if end_time_ms is not None else int(time.time() * 1000)
+        if start_time_ms is None:
+            start_time_ms = end_time_ms - int(days * DAY_MS)
+        return self.store.pa_rate(symbol, exchange, start_time_ms, end_time_ms)
+
+    def pa_rates(self, symbols: list[str], exchange: str | Exchange | None = None, days: float | None = None,
+                 start_time_ms: int | None = None, refresh: str = "never") -> dict[str, PaRate]:
+        """pa_rate for several symbols of one exchange, refreshing them together."""
+        exchange = _exchange(exchange or self.exchange)
+        if refresh != "never":
+            self.refresh(symbols, exchange, refresh)
+        end_time_ms = int(time.time() * 1000)
+        return {
+            s.upper(): self.pa_rate(s, exchange, days, start_time_ms, end_time_ms)
+            for s in symbols
+        }
+
+    def close(self):
+        self.store.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
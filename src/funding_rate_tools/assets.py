@@ -0,0 +1,203 @@
+import hashlib
+import json
+import os
+import requests
+from .config import DATA_DIR
+
+# Pinned third-party assets used by the dashboard, in the order they must be loaded.
+# An asset's pin is its "sha256" here or, where that is None, the hash recorded for
+# its URL in static/manifest.json by `--vendor-assets --record-pins`. Packaged, cached
+# and downloaded copies are only used if they hash to the pin, and an asset without
+# a pin is never used.
+PINNED_ASSETS = [
+    {
+        "name": "chart.js",
+        "url": "https://cdn.jsdelivr.net/npm/chart.js@4.4.1/dist/chart.umd.min.js",
+        "file": "chart.umd.min.js",
+        "kind": "script",
+        "sha256": None,
+    },
+    {
+        "name": "chartjs-adapter-date-fns",
+        "url": "https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns@3.0.0/dist/chartjs-adapter-date-fns.bundle.min.js",
+        "file": "chartjs-adapter-date-fns.bundle.min.js",
+        "kind": "script",
+        "sha256": None,
+    },
+    {
+        "name": "flatpickr.css",
+        "url": "https://cdn.jsdelivr.net/npm/flatpickr@4.6.13/dist/flatpickr.min.css",
+        "file": "flatpickr.min.css",
+        "kind": "style",
+        "sha256": None,
+    },
+    {
+        "name": "flatpickr",
+        "url": "https://cdn.jsdelivr.net/npm/flatpickr@4.6.13/dist/flatpickr.min.js",
+        "file": "flatpickr.min.js",
+        "kind": "script",
+        "sha256": None,
+    },
+]
+
+# Vendored copies shipped as package data, plus a manifest of {file: {url, sha256}}.
+PACKAGE_ASSETS_DIR = os.path.join(os.path.dirname(__file__), "static")
+MANIFEST_FILE = "manifest.json"
+# Content-addressed cache for assets fetched at generation time.
+ASSET_CACHE_DIR = os.path.join(DATA_DIR, "asset_cache")
+
+class AssetUnavailableError(RuntimeError):
+    pass
+
+def _sha256(content: bytes) -> str:
+    return hashlib.sha256(content).hexdigest()
+
+def _read_json(path: str) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def _write_json(path: str, data: dict):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, path)
+
+def _download(url: str) -> bytes:
+    resp = requests.get(url, timeout=30)
+    resp.raise_for_status()
+    return resp.content
+
+def _recorded_pin(asset: dict, manifest: dict) -> str | None:
+    """The hash recorded for the asset's file in a manifest, if it was recorded for the same URL."""
+    entry = manifest.get(asset["file"])
+    if isinstance(entry, dict) and entry.get("url") == asset["url"]:
+        return entry.get("sha256")
+    return None
+
+def pinned_sha256(asset: dict) -> str | None:
+    """The asset's pin: PINNED_ASSETS first, then the hash recorded in the packaged manifest."""
+    return asset["sha256"] or _recorded_pin(asset, _read_json(os.path.join(PACKAGE_ASSETS_DIR, MANIFEST_FILE)))
+
+def _load_packaged(asset: dict, pin: str) -> bytes | None:
+    """Returns the vendored copy of an asset if it is shipped and matches the pin."""
+    path = os.path.join(PACKAGE_ASSETS_DIR, asset["file"])
+    if not os.path.exists(path):
+        return None
+    with open(path, "rb") as f:
+        content = f.read()
+    if _sha256(content) != pin:
+        print(f"Warning: packaged asset {asset['file']} does not match its pinned hash; ignoring it.")
+        return None
+    return content
+
+def _load_cached(asset: dict, pin: str, allow_download: bool) -> bytes | None:
+    """
+    Looks up an asset in the content-hash cache by its pinned URL, downloading
+    and caching it on a miss when allowed.
+    """
+    index_path = os.path.join(ASSET_CACHE_DIR, "index.json")
+    index = _read_json(index_path)
+    digest = index.get(asset["url"])
+    if digest == pin:
+        path = os.path.join(ASSET_CACHE_DIR, digest)
+        if os.path.exists(path):
+            with open(path, "rb") as f:
+                content = f.read()
+            if _sha256(content) == digest:
+                return content
+
+    if not allow_download:
+        return None
+    try:
+        content = _download(asset["url"])
+    except requests.RequestException as e:
+        print(f"Error fetching asset {asset['name']} from {asset['url']}: {e}")
+        return None
+
+    digest = _sha256(content)
+    if digest != pin:
+        print(f"Error: asset {asset['name']} from {asset['url']} does not match its pinned hash; refusing it.")
+        return None
+    os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(ASSET_CACHE_DIR, digest), "wb") as f:
+        f.write(content)
+    index[asset["url"]] = digest
+    _write_json(index_path, index)
+    return content
+
+def load_asset(asset: dict, allow_download: bool = True) -> bytes:
+    pin = pinned_sha256(asset)
+    if not pin:
+        raise AssetUnavailableError(
+            f"Asset {asset['name']} has no pinned sha256; vendor and pin it once with "
+            f"--vendor-assets --record-pins on a networked host before using --bundle."
+        )
+    content = _load_packaged(asset, pin)
+    if content is None:
+        content = _load_cached(asset, pin, allow_download)
+    if content is None:
+        raise AssetUnavailableError(
+            f"Asset {asset['name']} is neither packaged nor cached; "
+            f"run with network access once or vendor it with --vendor-assets."
+        )
+    return content
+
+def cdn_assets_html() -> str:
+    """<script>/<link> tags loading the pinned assets from the CDN."""
+    tags = []
+    for asset in PINNED_ASSETS:
+        if asset["kind"] == "style":
+            tags.append(f'<link rel="stylesheet" href="{asset["url"]}">')
+        else:
+            tags.append(f'<script src="{asset["url"]}"></script>')
+    return "\n        ".join(tags)
+
+def inline_assets_html(allow_download: bool = True) -> str:
+    """<script>/<style> blocks embedding the pinned assets, for a self-contained page."""
+    blocks = []
+    for asset in PINNED_ASSETS:
+        text = load_asset(asset, allow_download).decode("utf-8")
+        if asset["kind"] == "style":
+            blocks.append("<style>" + text.replace("</style", "<\\/style") + "</style>")
+        else:
+            blocks.append("<script>" + text.replace("</script", "<\\/script") + "</script>")
+    return "\n        ".join(blocks)
+
+def vendor_assets(record_pins: bool = False) -> dict:
+    """
+    Downloads the pinned assets into the package assets directory and records
+    them in the manifest. Run on a networked host before packaging. Every download
+    must match its pin; with record_pins, the explicit confirmation that the
+    downloads are trusted, assets without one are pinned to the hash downloaded.
+    Raises AssetUnavailableError, before writing anything, if an asset is unpinned
+    (without record_pins) or doesn't match its pin; the message has the hash found.
+    Returns {file: sha256}.
+    """
+    manifest_path = os.path.join(PACKAGE_ASSETS_DIR, MANIFEST_FILE)
+    recorded = _read_json(manifest_path)
+    downloads = []
+    for asset in PINNED_ASSETS:
+        pin = asset["sha256"] or _recorded_pin(asset, recorded)
+        content = _download(asset["url"])
+        digest = _sha256(content)
+        if pin is None and not record_pins:
+            raise AssetUnavailableError(
+                f"Asset {asset['name']} has no pinned sha256; {asset['url']} hashes to {digest}. "
+                f"Verify it against the upstream release, then pin it with --vendor-assets --record-pins."
+            )
+        if pin is not None and digest != pin:
+            raise AssetUnavailableError(
+                f"Asset {asset['name']} does not match its pin {pin}; {asset['url']} hashes to {digest}."
+            )
+        downloads.append((asset, content, digest))
+    os.makedirs(PACKAGE_ASSETS_DIR, exist_ok=True)
+    manifest = {}
+    for asset, content, digest in downloads:
+        with open(os.path.join(PACKAGE_ASSETS_DIR, asset["file"]), "wb") as f:
+            f.write(content)
+        manifest[asset["file"]] = {"url": asset["url"], "sha256": digest}
+    _write_json(manifest_path, manifest)
+    return {file: entry["sha256"] for file, entry in manifest.items()}
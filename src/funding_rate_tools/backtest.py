@@ -0,0 +1,206 @@
+import argparse
+import json
+import sys
+import time
+from bisect import bisect_left, bisect_right
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from itertools import accumulate
+
+from . import config
+from .calculations import DAYS_IN_YEAR
+from .config import Exchange
+from .database import get_funding_interval_hours, get_funding_series
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+def hedged_net_pa_grid(times: list[int], rates: list[float], hours: list[float],
+                       start_times_ms: list[int], holding_days: list[int], yields_pa: list[float]) -> list[dict]:
+    """
+    Net hedged p.a. (%) for every start time x holding period x yield, for one symbol.
+    This is the Python counterpart of the dashboard's calculateHedgedYieldPaSeries,
+    evaluated at the end of each holding period:
+        net = yield + sum(funding rate over the window) / sum(hours accrued) * hours_per_year * 100
+    `hours` holds the hours each payment accrued over (0 where unknown; such payments
+    are left out). Window sums come from one prefix-sum pass over the series, so each
+    grid cell costs two binary searches, and the yield dimension is a plain offset.
+    """
+    annual_factor = 24 * DAYS_IN_YEAR * 100
+    prefix = [0.0, *accumulate(r if h else 0.0 for r, h in zip(rates, hours))]
+    prefix_hours = [0.0, *accumulate(hours)]
+    last_time = times[-1] if times else None
+
+    results = []
+    for start_ms in start_times_ms:
+        i = bisect_left(times, start_ms)
+        for days in holding_days:
+            if days <= 0:
+                continue
+            end_ms = start_ms + days * DAY_MS
+            j = bisect_right(times, end_ms)
+            count = j - i
+            accrued = prefix_hours[j] - prefix_hours[i]
+            if count <= 0 or accrued <= 0:
+                continue
+            funding_pa = (prefix[j] - prefix[i]) / accrued * annual_factor
+            base = {
+                "start": start_ms,
+                "holding_days": days,
+                "intervals": count,
+                "coverage": min(1.0, accrued / (days * 24)),
+                "complete": last_time is not None and end_ms <= last_time,
+                "funding_pa": funding_pa,
+            }
+            for yield_pa in yields_pa:
+                results.append({**base, "yield_pa": yield_pa, "net_pa": yield_pa + funding_pa})
+    return results
+
+def backtest_symbol(symbol: str, source: str, start_times_ms: list[int], holding_days: list[int],
+                    yields_pa: list[float]) -> list[dict]:
+    """Loads one symbol's history and evaluates the full grid for it. Runs in a worker process."""
+    end_ms = max(start_times_ms) + max(holding_days) * DAY_MS
+    series = get_funding_series(symbol, source, min(start_times_ms), end_ms)
+    hours = series.hours
+    if 0 in hours:
+        # Payments without an inferred interval fall back to the stored one.
+        interval = get_funding_interval_hours(symbol, source) or 0
+        hours = [h or interval for h in hours]
+    rows = hedged_net_pa_grid(series.times, series.rates, hours, start_times_ms, holding_days, yields_pa)
+    for row in rows:
+        row["symbol"] = symbol
+    return rows
+
+def run_backtest(symbols: list[str], source: str, start_times_ms: list[int], holding_days: list[int],
+                 yields_pa: list[float], workers: int | None = None) -> list[dict]:
+    """Spreads symbols across a process pool and returns all grid rows."""
+    if not symbols or not start_times_ms or not holding_days or not yields_pa:
+        return []
+    n = len(symbols)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        per_symbol = pool.map(
+            backtest_symbol, symbols, [source] * n, [start_times_ms] * n, [holding_days] * n, [yields_pa] * n
+        )
+        return [row for rows in per_symbol for row in rows]
+
+def _parse_date_ms(value: str) -> int:
+    return int(datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+
+def _start_times_from_args(args) -> list[int]:
+    starts = [_parse_date_ms(d) for d in (args.start_dates or [])]
+    if args.start_range:
+        first, last, step = args.start_range
+        current, last_ms = _parse_date_ms(first), _parse_date_ms(last)
+        step_days = int(step)
+        if step_days <= 0:
+            raise ValueError("Step of --start-range must be a positive number of days.")
+        while current <= last_ms:
+            starts.append(current)
+            current += step_days * DAY_MS
+    return sorted(set(starts))
+
+def _format_table(rows: list[dict]) -> str:
+    header = f"{'SYMBOL':<14} {'START':<10} {'DAYS':>5} {'YIELD %':>8} {'FUNDING %':>10} {'NET P.A. %':>11} {'COVER':>6}"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        start = datetime.fromtimestamp(r['start'] / 1000, tz=timezone.utc).strftime("%Y-%m-%d")
+        flag = "" if r['complete'] else " *"
+        lines.append(
+            f"{r['symbol']:<14} {start:<10} {r['holding_days']:>5} {r['yield_pa']:>8.2f} "
+            f"{r['funding_pa']:>10.2f} {r['net_pa']:>11.2f} {r['coverage']:>6.0%}{flag}"
+        )
+    return "\n".join(lines)
+
+def main():
+    """Main function for the hedged-yield backtest."""
+    parser = argparse.ArgumentParser(description="Backtest net hedged p.a. (yield + funding) over parameter grids.")
+    parser.add_argument(
+        "--symbols",
+        nargs="+",
+        default=config.DEFAULT_SYMBOLS,
+        help=f"Space-separated list of symbols (e.g., BTCUSDT ETHUSDT). Default: {' '.join(config.DEFAULT_SYMBOLS)}",
+        metavar="SYMBOL"
+    )
+    parser.add_argument(
+        "--exchange",
+        choices=["binance", "hyperliquid", "bybit"],
+        default="binance",
+        help="Exchange whose stored funding rates are used. Default: binance"
+    )
+    parser.add_argument(
+        "--yields",
+        nargs="+",
+        type=float,
+        required=True,
+        help="Yield(s) of the hedged token in %% p.a. (e.g., 5 10 20).",
+        metavar="PCT"
+    )
+    parser.add_argument(
+        "--holding-days",
+        nargs="+",
+        type=int,
+        required=True,
+        help="Holding period(s) in days (e.g., 30 90 180).",
+        metavar="DAYS"
+    )
+    parser.add_argument(
+        "--start-dates",
+        nargs="+",
+        help="Hedge open date(s) (YYYY-MM-DD).",
+        metavar="YYYY-MM-DD"
+    )
+    parser.add_argument(
+        "--start-range",
+        nargs=3,
+        help="Generate open dates from FROM to TO every STEP days.",
+        metavar=("FROM", "TO", "STEP")
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Number of worker processes. Default: number of CPUs."
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=None,
+        help="Only show the N best results by net p.a."
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Output results as a JSON list."
+    )
+    args = parser.parse_args()
+    exchange = Exchange(args.exchange)
+
+    try:
+        start_times_ms = _start_times_from_args(args)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    if not start_times_ms:
+        print("Error: Provide --start-dates and/or --start-range.")
+        sys.exit(1)
+    if any(days <= 0 for days in args.holding_days):
+        print("Error: --holding-days must be positive numbers of days.")
+        sys.exit(1)
+
+    symbols = [s.upper() for s in args.symbols]
+    t0 = time.time()
+    rows = run_backtest(symbols, exchange.value, start_times_ms, args.holding_days, args.yields, args.workers)
+    rows.sort(key=lambda r: r['net_pa'], reverse=True)
+    if args.top:
+        rows = rows[:args.top]
+
+    if args.json:
+        print(json.dumps(rows))
+    else:
+        if not rows:
+            print("No results: no stored funding data for the requested symbols and dates.")
+            sys.exit(1)
+        print(_format_table(rows))
+        print(f"\n{len(rows)} result(s) in {time.time() - t0:.2f}s; * = holding period extends past stored data.")
+
+if __name__ == "__main__":
+    main()
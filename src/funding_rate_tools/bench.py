@@ -0,0 +1,293 @@
+import argparse
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from contextlib import redirect_stdout
+from datetime import datetime, timezone
+
+from . import calculations, cli_tool, config, dashboard_generator, database
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+# Funding intervals used for the synthetic symbols of each source, cycled per symbol.
+SOURCE_INTERVALS = {
+    "binance": [8, 8, 8, 4],
+    "bybit": [8, 4, 8, 1],
+    "hyperliquid": [1],
+}
+# Timings that grew by more than this fraction against the baseline are regressions.
+DEFAULT_TOLERANCE = 0.25
+
+def _symbol(n: int) -> str:
+    return f"SYN{n:04d}USDT"
+
+def build_database(path: str, symbols_per_source: int, years: float, end_ms: int, seed: int = 42) -> int:
+    """
+    Fills a fresh database at `path` with deterministic synthetic funding history:
+    every source in SOURCE_INTERVALS x symbols_per_source symbols x `years` years.
+    Rates follow a slowly mean-reverting random walk around a small positive level.
+    Returns the number of rows.
+    """
+    if os.path.exists(path):
+        os.remove(path)
+    config.set_database_path(path)
+    database.setup_database()
+    rng = random.Random(seed)
+    start_ms = end_ms - int(years * 365 * DAY_MS)
+    conn = database.get_db_connection()
+    total = 0
+    try:
+        for source, intervals in SOURCE_INTERVALS.items():
+            infos = {}
+            for n in range(symbols_per_source):
+                symbol = _symbol(n)
+                interval = intervals[n % len(intervals)]
+                infos[symbol] = interval
+                step = interval * HOUR_MS
+                rate = 0.0001 * interval / 8
+                rows = []
+                for t in range(start_ms - start_ms % step + step, end_ms, step):
+                    rate += 0.05 * (0.0001 * interval / 8 - rate) + rng.gauss(0, 0.00002)
+                    rows.append((symbol, t, rate, source))
+                database.bulk_insert_funding_rates(rows, conn)
+                total += len(rows)
+            conn.commit()
+            database.store_funding_infos(infos, source, conn)
+    finally:
+        conn.close()
+    return total
+
+def _timed(fn, repeat: int, setup=None) -> dict:
+    """Runs fn `repeat` times, after an untimed setup() each; returns the median and best wall time in seconds."""
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        t0 = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - t0)
+    return {"seconds": statistics.median(times), "best_seconds": min(times), "runs": repeat}
+
+def _run_main(main, argv: list[str]) -> str:
+    """Runs a console-script main() in-process with argv, returning its stdout."""
+    out = io.StringIO()
+    saved = sys.argv
+    sys.argv = argv
+    try:
+        with redirect_stdout(out):
+            main()
+    except SystemExit:
+        pass
+    finally:
+        sys.argv = saved
+    return out.getvalue()
+
+def run_benchmarks(symbols_per_source: int, sample_symbols: int, repeat: int, end_ms: int) -> dict:
+    """Times the key read, calculation, CLI, dashboard and ingest paths on the current database."""
+    results = {}
+    sample = [_symbol(n) for n in range(min(sample_symbols, symbols_per_source))]
+    month_start = end_ms - 30 * DAY_MS
+
+    def read_full_histories():
+        for source in SOURCE_INTERVALS:
+            for symbol in sample:
+                database.get_funding_rates(symbol, 0, end_ms, source)
+    results["get_funding_rates_full"] = _timed(read_full_histories, repeat)
+
+    def read_full_series():
+        for source in SOURCE_INTERVALS:
+            for symbol in sample:
+                database.get_funding_series(symbol, source, 0, end_ms)
+    results["get_funding_series_full"] = _timed(read_full_series, repeat)
+
+    month_rates = {
+        (source, symbol): database.get_funding_rates(symbol, month_start, end_ms, source)
+        for source in SOURCE_INTERVALS for symbol in sample
+    }
+
+    def calculate_month():
+        for (source, symbol), rates in month_rates.items():
+            calculations.calculate_pa_rate(symbol, rates, source)
+    results["calculate_pa_rate_30d"] = _timed(calculate_month, repeat)
+
+    # Every repeat starts from an empty pa_cache, so it times the calculation, not the memo.
+    for source in SOURCE_INTERVALS:
+        argv = ["funding-cli", "--no-refresh", "--json", "--last-month", "--exchange", source, "--symbols", *sample]
+        results[f"cli_last_month_{source}"] = _timed(lambda: _run_main(cli_tool.main, argv), repeat, _clear_pa_cache)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        output = os.path.join(tmp, "dashboard.html")
+        # Bybit needs no price requests, so the run stays offline.
+        argv = ["funding-dashboard", "--no-refresh", "--exchange", "bybit", "--output", output,
+                "--symbols", *sample[:4]]
+        results["dashboard_bybit"] = _timed(lambda: _run_main(dashboard_generator.main, argv), repeat)
+        results["dashboard_bybit"]["html_bytes"] = os.path.getsize(output) if os.path.exists(output) else None
+
+    # Ingest: API-sized pages of 1000 rows through store_funding_rates, into a scratch source.
+    rng = random.Random(7)
+    pages = [
+        [{"fundingTime": end_ms + (p * 1000 + i) * HOUR_MS, "fundingRate": rng.gauss(0.0001, 0.00005)} for i in range(1000)]
+        for p in range(20)
+    ]
+    t0 = time.perf_counter()
+    for n, page in enumerate(pages):
+        database.store_funding_rates(f"INGEST{n % 4}USDT", page, "bench")
+    elapsed = time.perf_counter() - t0
+    results["store_funding_rates_ingest"] = {
+        "seconds": elapsed, "runs": 1, "rows_per_second": sum(len(p) for p in pages) / elapsed,
+    }
+    return results
+
+def _clear_pa_cache():
+    conn = database.get_db_connection()
+    try:
+        conn.execute("DELETE FROM pa_cache")
+        conn.commit()
+    finally:
+        conn.close()
+
+def _clear_scratch(conn):
+    """Drops the ingest benchmark's scratch source and everything derived from it, so every run starts empty."""
+    for table in ("funding_rates", "funding_info", "pa_cache", "alert_windows", "alert_state", "funding_stats", "series_meta"):
+        conn.execute(f"DELETE FROM {table} WHERE source = 'bench'")
+    conn.commit()
+    shutil.rmtree(os.path.join(config.SERIES_CACHE_DIR, "bench"), ignore_errors=True)
+
+def compare(current: dict, baseline: dict, tolerance: float) -> list[str]:
+    """Names the benchmarks whose median time grew by more than `tolerance` against the baseline."""
+    regressions = []
+    for name, result in current["results"].items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("seconds"):
+            continue
+        ratio = result["seconds"] / old["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(f"{name}: {old['seconds']:.4f}s -> {result['seconds']:.4f}s ({ratio:.2f}x)")
+    return regressions
+
+def _format_results(results: dict, baseline: dict | None) -> str:
+    lines = [f"{'BENCHMARK':<30} {'MEDIAN S':>10} {'BEST S':>10} {'VS BASE':>8}"]
+    for name, r in results.items():
+        base = (baseline or {}).get("results", {}).get(name)
+        change = f"{r['seconds'] / base['seconds']:.2f}x" if base and base.get("seconds") else ""
+        best = f"{r['best_seconds']:.4f}" if "best_seconds" in r else ""
+        lines.append(f"{name:<30} {r['seconds']:>10.4f} {best:>10} {change:>8}")
+    return "\n".join(lines)
+
+def main():
+    """Main function for the benchmark harness."""
+    parser = argparse.ArgumentParser(description="Benchmark the funding tools on a synthetic database.")
+    parser.add_argument(
+        "--symbols-per-source",
+        type=int,
+        default=50,
+        help="Synthetic symbols per source (binance, bybit, hyperliquid). Default: 50; 500 for full scale."
+    )
+    parser.add_argument(
+        "--years",
+        type=float,
+        default=5,
+        help="Years of history per symbol. Default: 5"
+    )
+    parser.add_argument(
+        "--sample-symbols",
+        type=int,
+        default=10,
+        help="Symbols per source used by the read, CLI and calculation benchmarks. Default: 10"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=5,
+        help="Runs per benchmark; the median is reported. Default: 5"
+    )
+    parser.add_argument(
+        "--db",
+        help="Synthetic database path. Default: data/bench/bench_<symbols>x<years>y.db"
+    )
+    parser.add_argument(
+        "--rebuild",
+        action="store_true",
+        help="Rebuild the synthetic database even if it already exists."
+    )
+    parser.add_argument(
+        "--output",
+        help="Write the results as a JSON baseline to this file."
+    )
+    parser.add_argument(
+        "--compare",
+        help="Baseline JSON to compare against; exits with status 1 on regressions.",
+        metavar="BASELINE"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=DEFAULT_TOLERANCE,
+        help=f"Allowed slowdown as a fraction before a benchmark counts as regressed. Default: {DEFAULT_TOLERANCE}"
+    )
+    args = parser.parse_args()
+
+    path = args.db or os.path.join(config.DATA_DIR, "bench", f"bench_{args.symbols_per_source}x{args.years:g}y.db")
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    # Synthetic history ends at midnight UTC today so rebuilt databases match across runs of a day.
+    end_ms = int(datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0).timestamp() * 1000)
+
+    build = None
+    if args.rebuild or not os.path.exists(path):
+        t0 = time.perf_counter()
+        rows = build_database(path, args.symbols_per_source, args.years, end_ms)
+        elapsed = time.perf_counter() - t0
+        build = {"seconds": elapsed, "runs": 1, "rows": rows, "rows_per_second": rows / elapsed}
+        print(f"Built {path}: {rows} rows in {elapsed:.1f}s")
+    config.set_database_path(path)
+    database.setup_database()
+
+    conn = database.get_db_connection()
+    data_end_ms = conn.execute("SELECT MAX(funding_time) FROM funding_rates WHERE source != 'bench'").fetchone()[0] or end_ms
+    _clear_scratch(conn)
+    conn.close()
+
+    results = run_benchmarks(args.symbols_per_source, args.sample_symbols, args.repeat, data_end_ms)
+    if build:
+        results["build_database"] = build
+
+    report = {
+        "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "params": {
+            "symbols_per_source": args.symbols_per_source,
+            "years": args.years,
+            "sample_symbols": args.sample_symbols,
+            "repeat": args.repeat,
+            "database_bytes": os.path.getsize(path),
+        },
+        "results": results,
+    }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    print(_format_results(results, baseline))
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+
+    if baseline:
+        regressions = compare(report, baseline, args.tolerance)
+        if regressions:
+            print(f"Regressions (>{args.tolerance:.0%} slower):")
+            for line in regressions:
+                print(f"  {line}")
+            sys.exit(1)
+        print("No regressions.")
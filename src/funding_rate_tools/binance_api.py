@@ -1,91 +1,103 @@
-import requests
-import time
-from .config import BINANCE_API_BASE_URL, FUNDING_RATE_HISTORY_ENDPOINT, TICKER_PRICE_ENDPOINT, FUNDING_INFO_ENDPOINT
+from . import http_client
+from .config import (BINANCE_API_BASE_URL, FUNDING_RATE_HISTORY_ENDPOINT, TICKER_PRICE_ENDPOINT, FUNDING_INFO_ENDPOINT,
+                     EXCHANGE_INFO_ENDPOINT, PREMIUM_INDEX_ENDPOINT)
 
 MAX_RESULTS_PER_REQUEST = 1000
+# Symbols not listed by fundingInfo use Binance's standard interval.
+DEFAULT_FUNDING_INTERVAL_HOURS = 8
 
-def fetch_funding_rate_history(symbol: str, start_time_ms: int | None = None) -> list[dict]:
+def fetch_funding_rate_page(symbol: str, start_time_ms: int | None = None, end_time_ms: int | None = None) -> list[dict]:
     """
-    Fetches historical funding rates for a symbol from Binance.
-    If start_time_ms is provided, fetches rates after that time.
-    Handles pagination to retrieve all available new rates.
+    One fundingRate request: up to MAX_RESULTS_PER_REQUEST rates with
+    start_time_ms <= fundingTime <= end_time_ms, oldest first. Without a start time
+    Binance returns the newest page. Raises requests.RequestException on failure.
     """
-    all_rates = []
-    url = f"{BINANCE_API_BASE_URL}{FUNDING_RATE_HISTORY_ENDPOINT}"
+    params = {"symbol": symbol.upper(), "limit": MAX_RESULTS_PER_REQUEST}
+    if start_time_ms is not None:
+        params["startTime"] = start_time_ms
+    if end_time_ms is not None:
+        params["endTime"] = end_time_ms
+    response = http_client.get(f"{BINANCE_API_BASE_URL}{FUNDING_RATE_HISTORY_ENDPOINT}", params=params, timeout=10)
+    response.raise_for_status()
+    return [
+        {"fundingTime": int(item["fundingTime"]), "fundingRate": float(item["fundingRate"])}
+        for item in response.json()
+    ]
 
-    current_start_time = start_time_ms + 1 if start_time_ms else None
-
-    while True:
-        params = {
-            "symbol": symbol.upper(),
-            "limit": MAX_RESULTS_PER_REQUEST
-        }
-        if current_start_time:
-            params["startTime"] = current_start_time
-
-        try:
-            response = requests.get(url, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-        except requests.RequestException as e:
-            print(f"Error fetching funding rates for {symbol}: {e}")
-            return all_rates
-
-        if not data:
-            break
-
-        all_rates.extend(data)
-
-        if len(data) < MAX_RESULTS_PER_REQUEST:
-            break
-
-        current_start_time = int(data[-1]['fundingTime']) + 1
-        time.sleep(0.2)
-
-    return all_rates
-
-def fetch_current_price(symbol: str) -> float | None:
-    """Fetches the current market price for a given symbol."""
+def fetch_current_price(symbol: str) -> float:
+    """
+    Fetches the current market price for a given symbol.
+    Raises requests.RequestException, KeyError or ValueError on failure.
+    """
     url = f"{BINANCE_API_BASE_URL}{TICKER_PRICE_ENDPOINT}"
     params = {"symbol": symbol.upper()}
-    try:
-        response = requests.get(url, params=params, timeout=5)
-        response.raise_for_status()
-        data = response.json()
-        return float(data['price'])
-    except requests.RequestException as e:
-        print(f"Error fetching current price for {symbol}: {e}")
-        return None
-    except (KeyError, ValueError) as e:
-        print(f"Error parsing price data for {symbol}: {e}")
-        return None
+    response = http_client.get(url, params=params, timeout=5)
+    response.raise_for_status()
+    return float(response.json()['price'])
 
 def fetch_funding_info(symbol: str) -> int | None:
-    """Fetches funding-interval hours for a symbol."""
+    """
+    Fetches funding-interval hours for a symbol; None if Binance doesn't list it.
+    Raises requests.RequestException on failure.
+    """
     url = f"{BINANCE_API_BASE_URL}{FUNDING_INFO_ENDPOINT}"
     params = {"symbol": symbol.upper()}
-    try:
-        resp = requests.get(url, params=params, timeout=5)
-        resp.raise_for_status()
-        data = resp.json()
-        sym_u = symbol.upper()
-        # Binance returns a list; for invalid symbols, it may return many items.
-        # Find the exact symbol match; if not found, return None.
-        if isinstance(data, list) and data:
-            for item in data:
-                try:
-                    if item.get("symbol") == sym_u:
-                        return int(item.get("fundingIntervalHours", 0)) or None
-                except Exception:
-                    continue
-            return None
-        # Some edge cases might return a single dict
-        if isinstance(data, dict) and data.get("symbol") == sym_u:
+    resp = http_client.get(url, params=params, timeout=5)
+    resp.raise_for_status()
+    data = resp.json()
+    sym_u = symbol.upper()
+    # Binance returns a list; for invalid symbols, it may return many items.
+    # Find the exact symbol match; if not found, return None.
+    if isinstance(data, list) and data:
+        for item in data:
             try:
-                val = int(data.get("fundingIntervalHours", 0))
-                return val or None
+                if item.get("symbol") == sym_u:
+                    return int(item.get("fundingIntervalHours", 0)) or None
             except Exception:
-                return None
-    except requests.RequestException:
-        pass
+                continue
+        return None
+    # Some edge cases might return a single dict
+    if isinstance(data, dict) and data.get("symbol") == sym_u:
+        try:
+            val = int(data.get("fundingIntervalHours", 0))
+            return val or None
+        except Exception:
+            return None
     return None
+
+def fetch_all_funding_info() -> dict[str, int]:
+    """
+    Lists every trading perpetual with its funding-interval hours in two requests.
+    Raises requests.RequestException or ValueError if the listing cannot be fetched.
+    """
+    resp = http_client.get(f"{BINANCE_API_BASE_URL}{EXCHANGE_INFO_ENDPOINT}", timeout=10)
+    resp.raise_for_status()
+    symbols = [
+        s["symbol"] for s in resp.json().get("symbols", [])
+        if s.get("contractType") == "PERPETUAL" and s.get("status") == "TRADING"
+    ]
+    resp = http_client.get(f"{BINANCE_API_BASE_URL}{FUNDING_INFO_ENDPOINT}", timeout=10)
+    resp.raise_for_status()
+    adjusted = {
+        item["symbol"]: int(item["fundingIntervalHours"])
+        for item in resp.json() if item.get("fundingIntervalHours")
+    }
+    return {s: adjusted.get(s, DEFAULT_FUNDING_INTERVAL_HOURS) for s in symbols}
+
+def fetch_predicted_funding() -> dict[str, dict]:
+    """
+    The current (predicted) funding rate of every perpetual in one premiumIndex request:
+    {symbol: {'fundingRate', 'nextFundingTime', 'markPrice'}}.
+    Raises requests.RequestException on failure.
+    """
+    resp = http_client.get(f"{BINANCE_API_BASE_URL}{PREMIUM_INDEX_ENDPOINT}", timeout=10)
+    resp.raise_for_status()
+    return {
+        item["symbol"]: {
+            "fundingRate": float(item["lastFundingRate"]),
+            "nextFundingTime": int(item["nextFundingTime"]),
+            "markPrice": float(item["markPrice"]) if item.get("markPrice") else None,
+        }
+        # Delivery contracts are listed too, without funding.
+        for item in resp.json() if item.get("lastFundingRate") not in (None, "") and int(item.get("nextFundingTime") or 0)
+    }
@@ -1,124 +1,103 @@
-import requests
 import time
+from . import http_client
+from .config import BYBIT_URL
 
-BYBIT_URL = "https://api.bybit.com"
+MAX_RESULTS_PER_REQUEST = 200
 
-def fetch_funding_rate_history(symbol: str, start_time_ms: int | None = None, end_time_ms: int | None = None) -> list[dict]:
+def fetch_funding_rate_page(symbol: str, start_time_ms: int | None = None, end_time_ms: int | None = None) -> list[dict]:
     """
-    Fetches historical funding rates for a symbol from Bybit.
-    Returns list of {'fundingTime': ..., 'fundingRate': ...}.
+    One funding/history request: up to MAX_RESULTS_PER_REQUEST rates with
+    start_time_ms <= fundingTime <= end_time_ms. Bybit returns the newest ones in
+    the range, newest first. Raises requests.RequestException or ValueError on failure.
     """
-    all_rates = []
-
-    # For forward-fill (getting newer data), we use startTime
-    # For backfill (getting older data), we use endTime
-    if start_time_ms:
-        # Forward-fill mode: get data from start_time_ms onwards.
-        # Bybit requires endTime when startTime is provided; otherwise it may return "Time Is Invalid".
+    params = {"category": "linear", "symbol": symbol.upper(), "limit": MAX_RESULTS_PER_REQUEST}
+    if start_time_ms is not None:
+        # Bybit requires endTime when startTime is provided; otherwise it returns "Time Is Invalid".
         now_ms = int(time.time() * 1000)
-        end_time_ms = now_ms if now_ms > start_time_ms else (start_time_ms + 1)
-        params = {
-            "category": "linear",
-            "symbol": symbol.upper(),
-            "limit": 200,
-            "startTime": start_time_ms,
-            "endTime": end_time_ms,
-        }
-
-        try:
-            resp = requests.get(
-                f"{BYBIT_URL}/v5/market/funding/history",
-                params=params,
-                timeout=10
-            )
-            resp.raise_for_status()
-            data = resp.json()
-        except requests.RequestException:
-            return all_rates
-
-        if data.get("retCode") != 0 or not data.get("result", {}).get("list"):
-            return all_rates
-
-        rates_batch = data["result"]["list"]
-
-        # Filter to only include rates newer than start_time_ms
-        for item in rates_batch:
-            timestamp = int(item["fundingRateTimestamp"])
-            if timestamp > start_time_ms:
-                all_rates.append({
-                    "fundingTime": timestamp,
-                    "fundingRate": float(item["fundingRate"])
-                })
-    else:
-        # Backfill mode: get recent data and paginate backwards
-        # If end_time_ms is provided, start from there; otherwise start from latest.
-        provided_end_time = end_time_ms is not None
-        end_time_ms = end_time_ms
-
-        while True:
-            params = {
-                "category": "linear",
-                "symbol": symbol.upper(),
-                "limit": 200
-            }
-            if end_time_ms:
-                params["endTime"] = end_time_ms
-
-            try:
-                resp = requests.get(
-                    f"{BYBIT_URL}/v5/market/funding/history",
-                    params=params,
-                    timeout=10
-                )
-                resp.raise_for_status()
-                data = resp.json()
-            except requests.RequestException:
-                return all_rates
-
-            if data.get("retCode") != 0 or not data.get("result", {}).get("list"):
-                break
-
-            rates_batch = data["result"]["list"]
-
-            for item in rates_batch:
-                all_rates.append({
-                    "fundingTime": int(item["fundingRateTimestamp"]),
-                    "fundingRate": float(item["fundingRate"])
-                })
-
-            # If caller provided a specific end_time_ms, return only this page to avoid fetching excessive history.
-            if provided_end_time:
-                break
-
-            if len(rates_batch) < 200:
-                break
-
-            # Get older data by setting endTime to the oldest timestamp we just fetched
-            end_time_ms = int(rates_batch[-1]["fundingRateTimestamp"]) - 1
-            time.sleep(0.2)
-
-    return all_rates
+        params["startTime"] = start_time_ms
+        params["endTime"] = end_time_ms if end_time_ms is not None else max(now_ms, start_time_ms + 1)
+    elif end_time_ms is not None:
+        params["endTime"] = end_time_ms
+    resp = http_client.get(f"{BYBIT_URL}/v5/market/funding/history", params=params, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("retCode") != 0:
+        raise ValueError(f"Bybit error {data.get('retCode')}: {data.get('retMsg')}")
+    return [
+        {"fundingTime": int(item["fundingRateTimestamp"]), "fundingRate": float(item["fundingRate"])}
+        for item in data.get("result", {}).get("list", [])
+    ]
 
 def fetch_funding_info(symbol: str) -> int | None:
-    """Fetches funding interval hours for a Bybit symbol."""
+    """
+    Fetches funding interval hours for a Bybit symbol; None if Bybit doesn't list it.
+    Raises requests.RequestException on failure.
+    """
     params = {
         "category": "linear",
         "symbol": symbol.upper()
     }
-    try:
-        resp = requests.get(
-            f"{BYBIT_URL}/v5/market/instruments-info",
-            params=params,
-            timeout=5
-        )
+    resp = http_client.get(
+        f"{BYBIT_URL}/v5/market/instruments-info",
+        params=params,
+        timeout=5
+    )
+    resp.raise_for_status()
+    data = resp.json()
+
+    # Unknown symbols come back as a params error or an empty list.
+    if (data.get("retCode") == 0 and
+        data.get("result", {}).get("list")):
+        interval_minutes = data["result"]["list"][0].get("fundingInterval")
+        if interval_minutes:
+            return int(interval_minutes) // 60  # Convert minutes to hours
+    return None
+
+def fetch_all_funding_info() -> dict[str, int]:
+    """
+    Lists every trading linear perpetual with its funding-interval hours,
+    paging through instruments-info 1000 at a time.
+    Raises requests.RequestException or ValueError on failure.
+    """
+    result = {}
+    cursor = None
+    while True:
+        params = {"category": "linear", "limit": 1000}
+        if cursor:
+            params["cursor"] = cursor
+        resp = http_client.get(f"{BYBIT_URL}/v5/market/instruments-info", params=params, timeout=10)
         resp.raise_for_status()
         data = resp.json()
+        if data.get("retCode") != 0:
+            raise ValueError(f"Bybit error {data.get('retCode')}: {data.get('retMsg')}")
 
-        if (data.get("retCode") == 0 and
-            data.get("result", {}).get("list")):
-            interval_minutes = data["result"]["list"][0].get("fundingInterval")
-            if interval_minutes:
-                return int(interval_minutes) // 60  # Convert minutes to hours
-    except requests.RequestException:
-        pass
-    return None
+        for item in data.get("result", {}).get("list", []):
+            if (item.get("contractType") == "LinearPerpetual" and item.get("status") == "Trading"
+                    and item.get("fundingInterval")):
+                result[item["symbol"]] = int(item["fundingInterval"]) // 60
+
+        cursor = data.get("result", {}).get("nextPageCursor")
+        if not cursor:
+            break
+    return result
+
+def fetch_predicted_funding() -> dict[str, dict]:
+    """
+    The current (predicted) funding rate of every linear contract in one tickers request:
+    {symbol: {'fundingRate', 'nextFundingTime', 'markPrice'}}.
+    Raises requests.RequestException or ValueError on failure.
+    """
+    resp = http_client.get(f"{BYBIT_URL}/v5/market/tickers", params={"category": "linear"}, timeout=10)
+    resp.raise_for_status()
+    data = resp.json()
+    if data.get("retCode") != 0:
+        raise ValueError(f"Bybit error {data.get('retCode')}: {data.get('retMsg')}")
+    return {
+        item["symbol"]: {
+            "fundingRate": float(item["fundingRate"]),
+            "nextFundingTime": int(item["nextFundingTime"]),
+            "markPrice": float(item["markPrice"]) if item.get("markPrice") else None,
+        }
+        # Dated futures share the category but have no funding.
+        for item in data.get("result", {}).get("list", []) if item.get("fundingRate") and int(item.get("nextFundingTime") or 0)
+    }
@@ -2,28 +2,69 @@ import time
 from datetime import datetime, timedelta, timezone
 from .database import get_funding_rates
 from .database import get_funding_interval_hours
+from .database import get_cached_pa_rate, get_funding_series, store_cached_pa_rate
+from .series import FundingSeries
 
 DAYS_IN_YEAR = 365
 
-def calculate_pa_rate(symbol: str, rates_data: list[dict], source: str = None) -> float | None:
+def calculate_pa_rate(symbol: str, rates_data: list[dict] | FundingSeries, source: str = None, conn=None) -> float | None:
     """
-    Calculates the per annum (p.a.) funding rate from a list of funding rate data.
+    Calculates the per annum (p.a.) funding rate from a list of funding rate data or a FundingSeries.
     The rate is from the perspective of a short position (positive if shorts are paid).
+    Rows whose own interval is unknown count the stored funding interval, which is
+    only looked up when there are such rows.
     """
     if not rates_data:
         return None
 
-    interval = get_funding_interval_hours(symbol, source)
-    if not interval:
+    if isinstance(rates_data, FundingSeries):
+        unknown = 0 in rates_data.hours
+    else:
+        unknown = any(not item.get('interval_hours') for item in rates_data)
+    return annualize_rates(rates_data, get_funding_interval_hours(symbol, source, conn) if unknown else None)
+
+def annualize_rates(rates_data: list[dict] | FundingSeries, interval: int | None = None) -> float | None:
+    """
+    Annualizes funding payments into a p.a. % rate, from the perspective of a short
+    position. Each payment is weighted by the hours it accrued over (its
+    interval_hours), so history spanning an interval change is annualized correctly;
+    `interval` stands in for payments without one.
+    """
+    if not rates_data:
         return None
 
-    total = sum(item['funding_rate'] for item in rates_data)
-    avg_per_interval = total / len(rates_data)
+    if isinstance(rates_data, FundingSeries):
+        total, hours = rates_data.accrual(interval)
+    else:
+        total = hours = 0.0
+        for item in rates_data:
+            item_hours = item.get('interval_hours') or interval
+            if item_hours:
+                total += item['funding_rate']
+                hours += item_hours
+    if not hours:
+        return None
 
-    intervals_per_day = 24 / interval
-    pa = avg_per_interval * intervals_per_day * DAYS_IN_YEAR
+    pa = total / hours * 24 * DAYS_IN_YEAR
     return pa * 100
 
+def get_pa_rate_for_range(symbol: str, start_time_ms: int, end_time_ms: int, source: str,
+                          conn=None) -> tuple[float | None, bool]:
+    """
+    p.a. rate over [start_time_ms, end_time_ms], served from pa_cache while no new
+    rows have landed in the window; computed and memoized otherwise.
+    Returns (pa_rate, has_data): pa_rate is None if the window has no data
+    (has_data False) or its funding intervals are unknown (has_data True).
+    """
+    first_time, last_time, pa_rate = get_cached_pa_rate(symbol, source, start_time_ms, end_time_ms, conn)
+    if first_time is None or pa_rate is not None:
+        return pa_rate, first_time is not None
+    rates_data = get_funding_series(symbol, source, first_time, last_time, conn)
+    pa_rate = calculate_pa_rate(symbol, rates_data, source, conn)
+    if pa_rate is not None:
+        store_cached_pa_rate(symbol, source, first_time, last_time, pa_rate, conn)
+    return pa_rate, True
+
 def get_rates_for_period(symbol: str, period_days: int | None = None, since_date_str: str | None = None, source: str = None) -> list[dict]:
     """
     Retrieves funding rates for a specified period (number of days or since a date).
@@ -1,13 +1,200 @@
 import argparse
 import sys
-import time
 from datetime import datetime, timezone
 import json
 
-from . import config, database, binance_api, calculations, hyperliquid_api, bybit_api
-from .database import get_funding_interval_hours, store_funding_info, store_funding_rates
+from . import config, database, calculations, metrics, profiling, snapshots, stats
+from .database import store_funding_info, store_funding_rates
 from .config import Exchange
-from .utils import should_refresh_symbol
+from .exchanges import get_adapter
+from .utils import plan_refresh
+
+PERIOD_FLAGS = ("last_day", "last_week", "last_month")
+
+def refresh_symbols(symbols: list[str], exchange: Exchange, refresh_mode: str, log, conn=None,
+                    done: dict | None = None) -> list[str]:
+    """
+    Fetches and stores new funding rates for the symbols that refresh_mode says are due.
+    `done` maps (source, symbol) to the error of a refresh already attempted in this
+    process (None on success); those symbols are not fetched again, so overlapping
+    batch queries share one refresh. Returns the symbols whose refresh failed.
+    """
+    source = exchange.value
+    adapter = get_adapter(exchange)
+    done = {} if done is None else done
+    failed = [s for s in symbols if done.get((source, s))]
+    pending = [s for s in symbols if (source, s) not in done]
+    if refresh_mode == "never" or not pending:
+        return failed
+
+    log(f"Refresh mode: {refresh_mode}")
+    # One query decides which symbols are due and where each fetch starts.
+    for plan in plan_refresh(pending, source, refresh_mode, conn):
+        symbol = plan["symbol"]
+        metrics.track(source, symbol)
+        if not plan["due"]:
+            log(f"Skipping refresh for {symbol} - not enough time has passed since last funding rate")
+            continue
+
+        log(f"Fetching data for {symbol}...")
+        fetch_start_time = plan["start_time_ms"]
+
+        try:
+            # ensure funding-interval is stored
+            interval_hours = plan["interval_hours"]
+            if interval_hours is None:
+                interval_hours = adapter.fetch_interval(symbol)
+                if interval_hours:
+                    store_funding_info(symbol, interval_hours, source, conn)
+
+            with profiling.span("refresh fetch", symbol):
+                new_rates = adapter.fetch_history(symbol, fetch_start_time, interval_hours=interval_hours)
+
+            if new_rates:
+                store_funding_rates(symbol, new_rates, source, conn)
+                log(f"Stored {len(new_rates)} new rate(s) for {symbol}.")
+            else:
+                log(f"No new rates found for {symbol} since last fetch or API returned no data.")
+            done[(source, symbol)] = None
+        except Exception as e:
+            log(f"Error refreshing data for {symbol}: {e}")
+            metrics.record_error(source, symbol)
+            done[(source, symbol)] = str(e)
+            failed.append(symbol)
+        profiling.sleep(0.5)
+    return failed
+
+def calculate_results(symbols: list[str], exchange: Exchange, start_time_ms: int, end_time_ms: int,
+                      conn=None) -> tuple[dict, dict]:
+    """
+    Calculates the p.a. rate of each symbol over [start_time_ms, end_time_ms].
+    Returns ({symbol: rounded p.a. or None}, {symbol: display string}).
+    """
+    results_numeric = {}
+    results_display = {}
+    for symbol in symbols:
+        # Repeated queries are answered from pa_cache until new rates arrive.
+        with profiling.span("calculate", symbol):
+            pa_rate, has_data = calculations.get_pa_rate_for_range(symbol, start_time_ms, end_time_ms, exchange.value, conn)
+        if pa_rate is not None:
+            results_numeric[symbol] = round(pa_rate, 2)
+            results_display[symbol] = f"{pa_rate:.2f}% p.a." # Added space
+        elif not has_data:
+            results_numeric[symbol] = None
+            results_display[symbol] = "N/A (Insufficient data for period)"
+        else:
+            results_numeric[symbol] = None
+            results_display[symbol] = "N/A (Calculation error)"
+    return results_numeric, results_display
+
+def predicted_results(symbols: list[str], exchange: Exchange, refresh_mode: str, conn=None,
+                      sampled: set | None = None) -> dict[str, dict | None]:
+    """
+    The predicted p.a. rate and next funding time of each symbol, from a fresh snapshot
+    of the whole exchange (one request) unless refresh_mode is "never", in which case
+    the newest stored one is used. `sampled` holds the exchanges already sampled in this
+    process, so a batch takes one snapshot per exchange.
+    Returns {symbol: {"predicted_pa": rounded p.a. or None, "next_funding_time": ms} or None}.
+    """
+    sampled = set() if sampled is None else sampled
+    if refresh_mode != "never" and exchange not in sampled:
+        snapshots.ingest(exchange, conn)
+        sampled.add(exchange)
+    results = {}
+    for symbol, prediction in snapshots.get_predicted(symbols, exchange, conn).items():
+        if prediction is None:
+            results[symbol] = None
+            continue
+        pa = prediction["predicted_pa"]
+        results[symbol] = {
+            "predicted_pa": round(pa, 2) if pa is not None else None,
+            "next_funding_time": prediction["next_funding_time"],
+        }
+    return results
+
+def _stats_display(summary: dict | None) -> str:
+    if summary is None or summary["mean_pa"] is None:
+        return "stats N/A"
+    since = datetime.fromtimestamp(summary["first_time"] / 1000, timezone.utc)
+    return (f"since {since:%Y-%m-%d}: mean {summary['mean_pa']:.2f}%, vol {summary['stdev_pa']:.2f}%,"
+            f" p5/p50/p95 {summary['p5']:.2f}/{summary['median']:.2f}/{summary['p95']:.2f}% p.a.,"
+            f" {summary['negative_pct']:.1f}% of {summary['payments']} payments negative")
+
+def _batch_period(spec: dict) -> argparse.Namespace:
+    """Turns a batch spec's period ("last-day", "last-week", "last-month" or "since") into CLI-style args."""
+    period = spec.get("period")
+    since = spec.get("since")
+    if period is None and since is None:
+        raise ValueError("Query needs a 'period' (last-day, last-week, last-month) or 'since' (YYYY-MM-DD).")
+    if period is not None and (not isinstance(period, str) or period.replace("-", "_") not in PERIOD_FLAGS):
+        raise ValueError(f"Unknown period '{period}'. Use last-day, last-week or last-month.")
+    if period is None:
+        # Checked here: get_start_time_for_cli_period reports a bad date on stdout,
+        # which would land in the middle of the result lines.
+        try:
+            datetime.strptime(since, "%Y-%m-%d")
+        except (TypeError, ValueError):
+            raise ValueError("Invalid date format for 'since'. Use YYYY-MM-DD.") from None
+    flags = {flag: period is not None and period.replace("-", "_") == flag for flag in PERIOD_FLAGS}
+    return argparse.Namespace(since=since if period is None else None, **flags)
+
+def run_batch(lines, out, default_exchange: Exchange, default_symbols: list[str], default_refresh_mode: str,
+              log) -> bool:
+    """
+    Answers JSON-line query specs from `lines`, writing one JSON line per query to `out`
+    as soon as it is answered. All queries share one database connection, and each
+    (exchange, symbol) is refreshed at most once per batch.
+    A spec looks like {"id": ..., "symbols": [...], "exchange": "binance",
+    "period": "last-week" | "since": "YYYY-MM-DD", "refresh": "smart"}; everything but the
+    period is optional and defaults come from the command line. With "predicted": true the
+    response also carries each symbol's predicted p.a. rate and next funding time, and
+    with "stats": true its all-time statistics (see stats.py).
+    Returns True if every query was answered without errors.
+    """
+    conn = database.get_db_connection()
+    refreshed = {}
+    sampled = set()
+    ok = True
+    try:
+        for line_no, line in enumerate(lines, 1):
+            line = line.strip()
+            if not line:
+                continue
+            response = {"id": line_no}
+            try:
+                spec = json.loads(line)
+                if not isinstance(spec, dict):
+                    raise ValueError("Query must be a JSON object.")
+                response["id"] = spec.get("id", line_no)
+                exchange = Exchange(spec.get("exchange", default_exchange.value))
+                refresh_mode = spec.get("refresh", default_refresh_mode)
+                if refresh_mode not in ("smart", "always", "never"):
+                    raise ValueError(f"Unknown refresh mode '{refresh_mode}'. Use smart, always or never.")
+                symbols = spec.get("symbols", default_symbols)
+                if not isinstance(symbols, list) or not all(isinstance(s, str) for s in symbols):
+                    raise ValueError("'symbols' must be a list of strings.")
+                symbols = [s.upper() for s in symbols]
+                period_args = _batch_period(spec)
+                start_time_ms = calculations.get_start_time_for_cli_period(period_args)
+
+                failed = refresh_symbols(symbols, exchange, refresh_mode, log, conn, refreshed)
+                end_time_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
+                response["results"], _ = calculate_results(symbols, exchange, start_time_ms, end_time_ms, conn)
+                if spec.get("predicted"):
+                    response["predicted"] = predicted_results(symbols, exchange, refresh_mode, conn, sampled)
+                if spec.get("stats"):
+                    response["stats"] = stats.get_stats(symbols, exchange.value, conn)
+                if failed:
+                    response["refresh_errors"] = {s: refreshed[(exchange.value, s)] for s in failed}
+                    ok = False
+            except (ValueError, TypeError, AttributeError) as e:
+                response["error"] = str(e)
+                ok = False
+            out.write(json.dumps(response) + "\n")
+            out.flush()
+    finally:
+        conn.close()
+    return ok
 
 def main():
     """Main function for the CLI tool."""
@@ -53,14 +240,37 @@ def main():
         default="binance",
         help="Exchange to fetch funding rates from. Default: binance"
     )
+    parser.add_argument(
+        "--predicted",
+        action="store_true",
+        help="Also show the predicted p.a. rate for the upcoming settlement and when it is due."
+    )
+    parser.add_argument(
+        "--stats",
+        action="store_true",
+        help="Also show all-time statistics: volatility, p.a. percentiles and the share of negative payments."
+    )
+    parser.add_argument(
+        "--batch",
+        action="store_true",
+        help="Read query specs as JSON lines from stdin and write one JSON result line per query."
+    )
 
-    period_group = parser.add_mutually_exclusive_group(required=True)
+    period_group = parser.add_mutually_exclusive_group()
     period_group.add_argument("--last-day", action="store_true", help="Calculate P.A. rate for the last 24 hours.")
     period_group.add_argument("--last-week", action="store_true", help="Calculate P.A. rate for the last 7 days.")
     period_group.add_argument("--last-month", action="store_true", help="Calculate P.A. rate for the last 30 days.")
     period_group.add_argument("--since", type=str, help="Calculate P.A. rate since a specific date (YYYY-MM-DD).", metavar="YYYY-MM-DD")
+    profiling.add_arguments(parser)
 
     args = parser.parse_args()
+    if not args.batch and not (args.last_day or args.last_week or args.last_month or args.since):
+        parser.error("one of the arguments --last-day --last-week --last-month --since is required")
+
+    with metrics.run("funding-cli"), profiling.session(args):
+        _run(args)
+
+def _run(args):
     exchange = Exchange(args.exchange)
 
     # Determine refresh behavior - smart refresh is default
@@ -76,60 +286,18 @@ def main():
         if args.verbose:
             print(message)
 
-    symbols = [s.upper() for s in args.symbols]
-    refresh_failed_for_any = False
-
-    if refresh_mode != "never":
-        v_print(f"Refresh mode: {refresh_mode}")
-        for symbol in symbols:
-            # Determine if this symbol should be refreshed
-            should_refresh = (refresh_mode == "always" or
-                            (refresh_mode == "smart" and should_refresh_symbol(symbol, exchange.value)))
-
-            if refresh_mode == "smart" and not should_refresh:
-                v_print(f"Skipping refresh for {symbol} - not enough time has passed since last funding rate")
-                continue
-
-            # ensure funding-interval is stored
-            if get_funding_interval_hours(symbol, exchange.value) is None:
-                source = exchange.value
-                if exchange == Exchange.HYPERLIQUID:
-                    store_funding_info(symbol, 8, source)
-                elif exchange == Exchange.BYBIT:
-                    hrs = bybit_api.fetch_funding_info(symbol)
-                    if hrs:
-                        store_funding_info(symbol, hrs, source)
-                else:  # BINANCE
-                    hrs = binance_api.fetch_funding_info(symbol)
-                    if hrs:
-                        store_funding_info(symbol, hrs, source)
-
-            v_print(f"Fetching data for {symbol}...")
-            last_time_ms = database.get_last_funding_time(symbol, exchange.value)
-            fetch_start_time = last_time_ms + 1 if last_time_ms else None
+    if args.batch:
+        # Progress goes to stderr; stdout carries only result lines.
+        def batch_log(message):
+            if args.verbose:
+                print(message, file=sys.stderr)
 
-            try:
-                source = exchange.value
-                if exchange == Exchange.HYPERLIQUID:
-                    new_rates = hyperliquid_api.fetch_funding_rate_history(symbol, start_time_ms=fetch_start_time)
-                elif exchange == Exchange.BYBIT:
-                    new_rates = bybit_api.fetch_funding_rate_history(symbol, start_time_ms=fetch_start_time)
-                else:  # BINANCE
-                    new_rates = binance_api.fetch_funding_rate_history(symbol, start_time_ms=fetch_start_time)
-
-                if new_rates:
-                    store_funding_rates(symbol, new_rates, source)
-                    v_print(f"Stored {len(new_rates)} new rate(s) for {symbol}.")
-                else:
-                    v_print(f"No new rates found for {symbol} since last fetch or API returned no data.")
-            except Exception as e:
-                v_print(f"Error refreshing data for {symbol}: {e}")
-                refresh_failed_for_any = True
-            time.sleep(0.5)
+        ok = run_batch(sys.stdin, sys.stdout, exchange, args.symbols, refresh_mode, batch_log)
+        sys.exit(0 if ok else 1)
 
-    results_numeric = {}
-    results_display = {}
-    calculation_possible_for_any = False
+    symbols = [s.upper() for s in args.symbols]
+    with profiling.span("refresh"):
+        refresh_failed_for_any = bool(refresh_symbols(symbols, exchange, refresh_mode, v_print))
 
     start_time_ms = calculations.get_start_time_for_cli_period(args)
     if start_time_ms is None and args.since:
@@ -141,24 +309,38 @@ def main():
 
     end_time_ms = int(datetime.now(timezone.utc).timestamp() * 1000)
 
-    for symbol in symbols:
-        rates_data = database.get_funding_rates(symbol, start_time_ms, end_time_ms, exchange.value)
-        if not rates_data:
-            results_numeric[symbol] = None
-            results_display[symbol] = "N/A (Insufficient data for period)"
-            continue
+    with profiling.span("calculate"):
+        results_numeric, results_display = calculate_results(symbols, exchange, start_time_ms, end_time_ms)
+    calculation_possible_for_any = any(v is not None for v in results_numeric.values())
 
-        # pass symbol into pa calculation
-        pa_rate = calculations.calculate_pa_rate(symbol, rates_data, exchange.value)
-        if pa_rate is not None:
-            results_numeric[symbol] = round(pa_rate, 2)
-            results_display[symbol] = f"{pa_rate:.2f}% p.a." # Added space
-            calculation_possible_for_any = True
+    if args.predicted or args.stats:
+        # Extra columns per symbol: nested under the symbol in JSON, "|"-separated in text.
+        extras = {symbol: {"pa": results_numeric[symbol]} for symbol in symbols}
+        displays = {symbol: [results_display[symbol]] for symbol in symbols}
+        if args.predicted:
+            with profiling.span("predicted"):
+                predicted = predicted_results(symbols, exchange, refresh_mode)
+            for symbol in symbols:
+                prediction = predicted[symbol]
+                extras[symbol].update(prediction or {"predicted_pa": None, "next_funding_time": None})
+                if prediction is None or prediction["predicted_pa"] is None:
+                    displays[symbol].append("predicted N/A")
+                else:
+                    next_time = datetime.fromtimestamp(prediction["next_funding_time"] / 1000, timezone.utc)
+                    displays[symbol].append(f"predicted {prediction['predicted_pa']:.2f}% p.a."
+                                            f" (next funding {next_time:%Y-%m-%d %H:%M} UTC)")
+        if args.stats:
+            with profiling.span("stats"):
+                symbol_stats = stats.get_stats(symbols, exchange.value)
+            for symbol in symbols:
+                extras[symbol]["stats"] = symbol_stats[symbol]
+                displays[symbol].append(_stats_display(symbol_stats[symbol]))
+        if args.json:
+            print(json.dumps(extras))
         else:
-            results_numeric[symbol] = None
-            results_display[symbol] = "N/A (Calculation error)"
-
-    if args.json:
+            for symbol in symbols:
+                print(f"{symbol}: {' | '.join(displays[symbol])}")
+    elif args.json:
         output_json = {}
         for symbol in symbols:
             output_json[symbol] = results_numeric[symbol] # Store None if not calculable
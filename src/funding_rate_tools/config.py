@@ -8,12 +8,36 @@ class Exchange(Enum):
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 DATA_DIR = os.path.join(PROJECT_ROOT, "data")
-DATABASE_PATH = os.path.join(DATA_DIR, "funding_rates.db")
+# FUNDING_DB_PATH points every tool at another database file.
+DATABASE_PATH = os.environ.get("FUNDING_DB_PATH") or os.path.join(DATA_DIR, "funding_rates.db")
+# Memory-mapped per-symbol column files mirroring funding_rates; opt in with FUNDING_SERIES_CACHE=1.
+SERIES_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), "series_cache")
+SERIES_CACHE_ENABLED = os.environ.get("FUNDING_SERIES_CACHE", "0") != "0"
+# Prometheus text files written by each tool run (<tool>.prom); FUNDING_METRICS=0 turns them off.
+METRICS_DIR = os.environ.get("FUNDING_METRICS_DIR") or os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), "metrics")
+METRICS_ENABLED = os.environ.get("FUNDING_METRICS", "1") != "0"
+# Alert rules checked whenever funding rates are stored (see alerts.py); no file, no alerts.
+ALERTS_PATH = os.environ.get("FUNDING_ALERTS_FILE") or os.path.join(os.path.dirname(os.path.abspath(DATABASE_PATH)), "alerts.json")
 
-BINANCE_API_BASE_URL = "https://fapi.binance.com"
+def set_database_path(path: str):
+    """Switches this process to another database file, and the series cache, metrics and alert rules next to it."""
+    global DATABASE_PATH, SERIES_CACHE_DIR, METRICS_DIR, ALERTS_PATH
+    DATABASE_PATH = path
+    SERIES_CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(path)), "series_cache")
+    if not os.environ.get("FUNDING_METRICS_DIR"):
+        METRICS_DIR = os.path.join(os.path.dirname(os.path.abspath(path)), "metrics")
+    if not os.environ.get("FUNDING_ALERTS_FILE"):
+        ALERTS_PATH = os.path.join(os.path.dirname(os.path.abspath(path)), "alerts.json")
+
+# Exchange base URLs; the FUNDING_*_URL variables point them elsewhere, e.g. at funding-mock-exchange.
+BINANCE_API_BASE_URL = os.environ.get("FUNDING_BINANCE_URL", "https://fapi.binance.com")
+BYBIT_URL = os.environ.get("FUNDING_BYBIT_URL", "https://api.bybit.com")
+HYPERLIQUID_URL = os.environ.get("FUNDING_HYPERLIQUID_URL", "https://api.hyperliquid.xyz/info")
 FUNDING_RATE_HISTORY_ENDPOINT = "/fapi/v1/fundingRate"
 TICKER_PRICE_ENDPOINT = "/fapi/v1/ticker/price"
 FUNDING_INFO_ENDPOINT = "/fapi/v1/fundingInfo"
+EXCHANGE_INFO_ENDPOINT = "/fapi/v1/exchangeInfo"
+PREMIUM_INDEX_ENDPOINT = "/fapi/v1/premiumIndex"
 
 # Ensure data directory exists
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -0,0 +1,219 @@
+import argparse
+import heapq
+import random
+import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from . import config, metrics, snapshots
+from .config import Exchange
+from .database import (get_funding_intervals, get_last_funding_times, get_refresh_state, get_symbols,
+                       store_funding_info, store_funding_rates)
+from .exchanges import get_adapter
+
+HOUR_MS = 60 * 60 * 1000
+# How long to wait before asking again when a settlement hasn't shown up yet.
+MIN_RETRY_MS = 30 * 1000
+
+def _log(message: str):
+    print(f"{datetime.now(timezone.utc).strftime('%Y-%m-%d %H:%M:%S')} {message}", flush=True)
+
+class RefreshScheduler:
+    """
+    Keeps a priority queue of each (source, symbol)'s next expected settlement,
+    derived from the last stored funding_time plus the funding interval, and
+    refreshes symbols only when they are due.
+    """
+
+    def __init__(self, targets: dict[Exchange, list[str]], jitter_s: float = 5.0, workers: int = 8, verbose: bool = False):
+        self.jitter_ms = int(jitter_s * 1000)
+        self.workers = workers
+        self.verbose = verbose
+        self.stop_event = threading.Event()
+        self.queue = []
+        self.state = {}
+        now_ms = int(time.time() * 1000)
+        for exchange, symbols in targets.items():
+            # Two grouped queries per exchange instead of two per symbol.
+            last_times = get_last_funding_times(exchange.value)
+            intervals = get_funding_intervals(exchange.value)
+            for symbol in symbols:
+                key = (exchange, symbol)
+                metrics.track(exchange.value, symbol)
+                self.state[key] = {
+                    "last_time": last_times.get(symbol),
+                    "interval_hours": intervals.get(symbol),
+                    "retry_ms": MIN_RETRY_MS,
+                }
+                self._schedule(key, self._next_settlement(key) or now_ms)
+
+    def _next_settlement(self, key) -> int | None:
+        st = self.state[key]
+        if st["last_time"] is None or not st["interval_hours"]:
+            return None
+        return st["last_time"] + st["interval_hours"] * HOUR_MS
+
+    def _schedule(self, key, due_ms: int):
+        # Jitter spreads requests out a little after each settlement.
+        jitter = random.randint(0, self.jitter_ms) if self.jitter_ms else 0
+        heapq.heappush(self.queue, (due_ms + jitter, key[0].value, key[1]))
+
+    def _refresh(self, key) -> int:
+        exchange, symbol = key
+        st = self.state[key]
+        if not st["interval_hours"]:
+            st["interval_hours"] = get_adapter(exchange).fetch_interval(symbol)
+            if not st["interval_hours"]:
+                raise RuntimeError(f"Could not determine funding interval for {symbol} on {exchange.value}")
+            store_funding_info(symbol, st["interval_hours"], exchange.value)
+        start = st["last_time"] + 1 if st["last_time"] else None
+        rates = get_adapter(exchange).fetch_history(symbol, start, interval_hours=st["interval_hours"])
+        if rates:
+            store_funding_rates(symbol, rates, exchange.value)
+            st["last_time"] = max(st["last_time"] or 0, max(int(r['fundingTime']) for r in rates))
+            # Pick up an interval change from the newest stored rate before the next settlement is computed.
+            refreshed = get_refresh_state([symbol], exchange.value).get(symbol, {})
+            st["interval_hours"] = refreshed.get("interval_hours") or st["interval_hours"]
+        return len(rates)
+
+    def _reschedule(self, key, stored: int, now_ms: int):
+        st = self.state[key]
+        next_due = self._next_settlement(key)
+        if stored and next_due and next_due > now_ms:
+            st["retry_ms"] = MIN_RETRY_MS
+            self._schedule(key, next_due)
+        else:
+            # Settlement not published yet (or fetch failed): back off, capped at one interval.
+            # The first retry waits MIN_RETRY_MS; each one after waits twice as long.
+            cap = (st["interval_hours"] or 1) * HOUR_MS
+            retry_ms = min(st["retry_ms"], cap)
+            self._schedule(key, now_ms + retry_ms)
+            st["retry_ms"] = min(retry_ms * 2, cap)
+
+    def run(self):
+        """Sleeps until the next settlement is due and refreshes everything due by then."""
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while self.queue and not self.stop_event.is_set():
+                due_ms = self.queue[0][0]
+                wait_s = (due_ms - int(time.time() * 1000)) / 1000
+                if wait_s > 0:
+                    if self.verbose:
+                        _log(f"Next refresh in {wait_s:.0f}s ({self.queue[0][2]} on {self.queue[0][1]})")
+                    if self.stop_event.wait(wait_s):
+                        break
+
+                now_ms = int(time.time() * 1000)
+                batch = []
+                while self.queue and self.queue[0][0] <= now_ms:
+                    _, source, symbol = heapq.heappop(self.queue)
+                    batch.append((Exchange(source), symbol))
+
+                futures = {key: pool.submit(self._refresh, key) for key in batch}
+                for key, future in futures.items():
+                    try:
+                        stored = future.result()
+                        if stored or self.verbose:
+                            _log(f"Stored {stored} new rate(s) for {key[1]} on {key[0].value}.")
+                    except Exception as e:
+                        stored = 0
+                        _log(f"Error refreshing {key[1]} on {key[0].value}: {e}")
+                        metrics.record_error(key[0].value, key[1])
+                    self._reschedule(key, stored, int(time.time() * 1000))
+                try:
+                    metrics.write_file()
+                except OSError as e:
+                    _log(f"Could not write metrics file: {e}")
+
+    def stop(self):
+        self.stop_event.set()
+
+def sample_predicted(exchanges: list[Exchange], interval_s: float, stop_event: threading.Event):
+    """Snapshots predicted funding on every exchange each interval_s seconds until stop_event is set."""
+    while True:
+        for exchange in exchanges:
+            snapshots.ingest(exchange)
+        if stop_event.wait(interval_s):
+            return
+
+def main():
+    """Main function for the refresh daemon."""
+    parser = argparse.ArgumentParser(description="Keep funding rates fresh by refreshing each symbol right after it settles.")
+    parser.add_argument(
+        "--symbols",
+        nargs="+",
+        default=config.DEFAULT_SYMBOLS,
+        help=f"Space-separated list of symbols (e.g., BTCUSDT ETHUSDT). Default: {' '.join(config.DEFAULT_SYMBOLS)}",
+        metavar="SYMBOL"
+    )
+    parser.add_argument(
+        "--all-symbols",
+        action="store_true",
+        help="Track every symbol already stored for the selected exchange(s) instead of --symbols."
+    )
+    parser.add_argument(
+        "--exchange",
+        nargs="+",
+        choices=["binance", "hyperliquid", "bybit"],
+        default=["binance"],
+        help="Exchange(s) to track. Default: binance"
+    )
+    parser.add_argument(
+        "--jitter",
+        type=float,
+        default=5.0,
+        help="Maximum random delay in seconds added after each expected settlement. Default: 5"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Concurrent fetches when several symbols settle at once. Default: 8"
+    )
+    parser.add_argument(
+        "--snapshot-interval",
+        type=float,
+        help="Also sample the predicted funding of every symbol on the selected exchange(s) this often, in seconds (one request per exchange)."
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        help="Serve Prometheus metrics on this port at /metrics. The metrics file is written after every refresh either way."
+    )
+    parser.add_argument(
+        "--metrics-host",
+        default="127.0.0.1",
+        help="Address to serve metrics on, e.g. 0.0.0.0 for a remote Prometheus. Default: 127.0.0.1"
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print scheduling details."
+    )
+    args = parser.parse_args()
+    exchanges = list(dict.fromkeys(Exchange(e) for e in args.exchange))
+
+    targets = {}
+    for exchange in exchanges:
+        targets[exchange] = get_symbols(exchange.value) if args.all_symbols else [s.upper() for s in args.symbols]
+
+    with metrics.run("funding-daemon"):
+        scheduler = RefreshScheduler(targets, jitter_s=args.jitter, workers=args.workers, verbose=args.verbose)
+        signal.signal(signal.SIGTERM, lambda *_: scheduler.stop())
+        if args.metrics_port:
+            metrics.serve(args.metrics_port, args.metrics_host)
+            _log(f"Serving metrics on {args.metrics_host}:{args.metrics_port} at /metrics.")
+        _log(f"Tracking {sum(len(s) for s in targets.values())} symbol(s) on {', '.join(e.value for e in exchanges)}.")
+        if args.snapshot_interval:
+            threading.Thread(
+                target=sample_predicted, args=(exchanges, args.snapshot_interval, scheduler.stop_event), daemon=True
+            ).start()
+        try:
+            scheduler.run()
+        except KeyboardInterrupt:
+            pass
+        _log("Stopped.")
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,148 @@
 import argparse
+import sys
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
 import os
 
-from . import config, database, binance_api, calculations, hyperliquid_api, bybit_api
-from .html_template import get_html_content
+import requests
+
+from . import config, database, calculations, assets, heatmap, metrics, profiling, resample, snapshots, stats
+from .html_template import write_html_file, write_heatmap_file
 from .database import get_funding_interval_hours, store_funding_info, store_funding_rates
 from .config import Exchange
-from .utils import should_refresh_symbol
+from .exchanges import FETCH_ERRORS, get_adapter
+from .utils import plan_refresh, base_asset
+
+DAY_MS = 24 * 60 * 60 * 1000
+
+def _validate_symbol(sym: str, exchange: Exchange) -> bool:
+    try:
+        return get_adapter(exchange).fetch_interval(sym) is not None
+    except FETCH_ERRORS as e:
+        raise SystemExit(f"Error: Could not look up {sym} on {exchange.value}: {e}") from None
+
+def _current_price(adapter, symbol: str) -> str:
+    if not adapter.capabilities.prices:
+        return "N/A"
+    try:
+        return f"{adapter.fetch_price(symbol):.2f}"
+    except FETCH_ERRORS as e:
+        print(f"Error fetching current price for {symbol}: {e}")
+        return "N/A"
+
+def _refresh_exchange(exchange: Exchange, symbols: list[str], refresh_mode: str):
+    """Refreshes stored funding data for the given symbols on one exchange."""
+    adapter = get_adapter(exchange)
+    # One query decides which symbols are due and where each fetch starts.
+    for plan in plan_refresh(symbols, exchange.value, refresh_mode):
+        symbol = plan["symbol"]
+        metrics.track(exchange.value, symbol)
+        if not plan["due"]:
+            print(f"Skipping refresh for {symbol} on {exchange.value} - not enough time has passed since last funding rate")
+            continue
+
+        interval_hours = plan["interval_hours"]
+        if interval_hours is None:
+            source = exchange.value
+            interval_hours = adapter.fetch_interval(symbol)
+            if interval_hours:
+                store_funding_info(symbol, interval_hours, source)
+            else:
+                raise RuntimeError(f"Could not determine funding interval for {symbol} on {source}. Aborting refresh.")
+
+        print(f"Fetching data for {symbol} on {exchange.value}...")
+        fetch_start_time = plan["start_time_ms"]
+
+        try:
+            source = exchange.value
+            with profiling.span("refresh fetch", symbol):
+                new_rates = adapter.fetch_history(symbol, fetch_start_time, interval_hours=interval_hours)
+            if new_rates:
+                store_funding_rates(symbol, new_rates, source)
+                print(f"Stored {len(new_rates)} new rate(s) for {symbol} on {source}.")
+            else:
+                print(f"No new rates found for {symbol} on {source} or API returned no data.")
+        except Exception as e:
+            print(f"Warning: Error refreshing data for {symbol} on {exchange.value}: {e}. Dashboard will use existing data.")
+            metrics.record_error(exchange.value, symbol)
+        profiling.sleep(0.5)
+
+def _prepare_pairs(exchange: Exchange, symbols: list[str], now_ms: int, label_exchange: bool) -> list[dict]:
+    """Builds the per-symbol dashboard entries for one exchange."""
+    adapter = get_adapter(exchange)
+    predicted = snapshots.get_predicted(symbols, exchange, now_ms=now_ms)
+    symbol_stats = stats.get_stats(symbols, exchange.value)
+    pairs_data = []
+    for symbol in symbols:
+        interval = get_funding_interval_hours(symbol, exchange.value)
+        if interval is None:
+            raise RuntimeError(f"Missing funding interval for {symbol} on {exchange.value} (should have been stored earlier).")
+        current_price_str = _current_price(adapter, symbol)
+
+        # Data for the 7-day and 14-day P.A. rate summaries (one read, sliced)
+        with profiling.span("summaries", symbol):
+            rates_14d = database.get_funding_series(symbol, exchange.value, now_ms - 14 * DAY_MS, now_ms)
+            pa_rate_7d = calculations.calculate_pa_rate(symbol, rates_14d.between(now_ms - 7 * DAY_MS), exchange.value)
+            pa_rate_14d = calculations.calculate_pa_rate(symbol, rates_14d, exchange.value)
+
+        # ALL historical rates for the chart are loaded lazily, one symbol at a time,
+        # while the page is streamed to disk.
+        def load_rates_for_js(symbol=symbol):
+            return database.get_funding_series(symbol, exchange.value, 0, now_ms)
+
+        pairs_data.append({
+            # With several exchanges the same symbol appears once per venue, so label it.
+            "symbol": f"{symbol}@{exchange.value}" if label_exchange else symbol,
+            "base_asset": base_asset(symbol),
+            "exchange": exchange.value,
+            "current_price": current_price_str,
+            "pa_rate_7d": pa_rate_7d, # For summary text
+            "pa_rate_14d": pa_rate_14d, # For summary text
+            "predicted_pa": predicted[symbol]["predicted_pa"] if predicted[symbol] else None,
+            "next_funding_time": predicted[symbol]["next_funding_time"] if predicted[symbol] else None,
+            "stats": symbol_stats[symbol], # All-time statistics for the summary
+            "interval_hours": interval,
+            "all_rates_data": load_rates_for_js # All data for dynamic JS charts, loaded on write
+        })
+        if adapter.capabilities.prices:
+            profiling.sleep(0.2) # Small delay if fetching prices for multiple symbols
+    return pairs_data
+
+def _build_comparisons(symbols_by_exchange: dict[Exchange, list[str]], now_ms: int) -> list[dict]:
+    """
+    For every base asset listed on more than one exchange with stored rates, returns
+    {base_asset, data}. data loads and resamples the venues' funding onto a shared
+    daily grid when called, so they can be overlaid on one chart, and adds the spread
+    of every other venue against the first one. Like the per-symbol histories, it is
+    called while the page is streamed, so one asset's grid is held at a time.
+    """
+    venues_by_asset = {}
+    for exchange, symbols in symbols_by_exchange.items():
+        last_times = database.get_last_funding_times(exchange.value)
+        for symbol in symbols:
+            if symbol in last_times:
+                venues_by_asset.setdefault(base_asset(symbol), []).append((exchange, symbol))
+
+    def load_comparison(venues):
+        cells_by_venue = {}
+        for exchange, symbol in venues:
+            cells = resample.load_resampled(symbol, exchange.value, "day", 0, now_ms)
+            if cells:
+                cells_by_venue[exchange.value] = cells
+        grid, values = resample.to_pa_grid(cells_by_venue, "day")
+        venue_names = list(values)
+        for other in venue_names[1:]:
+            values[f"{venue_names[0]} - {other} spread"] = [
+                a - b if a is not None and b is not None else None
+                for a, b in zip(values[venue_names[0]], values[other])
+            ]
+        return {"times": grid, "series": values}
+
+    return [
+        {"base_asset": asset, "data": lambda venues=venues: load_comparison(venues)}
+        for asset, venues in venues_by_asset.items() if len(venues) >= 2
+    ]
 
 def main():
     """Main function for the dashboard generator."""
@@ -45,27 +180,72 @@ def main():
     )
     parser.add_argument(
         "--exchange",
+        nargs="+",
         choices=["binance", "hyperliquid", "bybit"],
-        default="binance",
-        help="Exchange to fetch funding rates from. Default: binance"
+        default=["binance"],
+        help="Exchange(s) to fetch funding rates from. Several exchanges are refreshed concurrently and overlaid per base asset. Default: binance"
+    )
+    parser.add_argument(
+        "--view",
+        choices=["charts", "heatmap"],
+        default="charts",
+        help="Page to generate: per-symbol charts, or one symbols x time heatmap of p.a. funding. Default: charts"
+    )
+    parser.add_argument(
+        "--bucket",
+        choices=sorted(heatmap.BUCKET_MS),
+        default="day",
+        help="Time bucket for the heatmap view. Default: day"
     )
+    parser.add_argument(
+        "--all-symbols",
+        action="store_true",
+        help="Use every symbol already stored for the selected exchange(s) instead of --symbols."
+    )
+    parser.add_argument(
+        "--bundle",
+        action="store_true",
+        help="Inline pinned copies of Chart.js, the date-fns adapter and flatpickr so the dashboard renders without network access."
+    )
+    parser.add_argument(
+        "--vendor-assets",
+        action="store_true",
+        help="Download the pinned dashboard assets into the package data directory and exit."
+    )
+    parser.add_argument(
+        "--record-pins",
+        action="store_true",
+        help="With --vendor-assets: confirm the downloads are trusted and pin assets that have no sha256 yet to them."
+    )
+    profiling.add_arguments(parser)
 
     args = parser.parse_args()
-    exchange = Exchange(args.exchange)
-    symbols = [s.upper() for s in args.symbols]
+    with metrics.run("funding-dashboard"), profiling.session(args):
+        _run(args)
+
+def _run(args):
+    exchanges = list(dict.fromkeys(Exchange(e) for e in args.exchange))
+    multi_exchange = len(exchanges) > 1
 
-    # Preflight: validate symbols for the selected exchange to avoid inserting unknowns
-    def _validate_symbol(sym: str) -> bool:
-        if exchange == Exchange.HYPERLIQUID:
-            return hyperliquid_api.fetch_funding_info(sym) is not None
-        elif exchange == Exchange.BYBIT:
-            return bybit_api.fetch_funding_info(sym) is not None
-        else:  # BINANCE
-            return binance_api.fetch_funding_info(sym) is not None
+    if args.record_pins and not args.vendor_assets:
+        raise SystemExit("Error: --record-pins only applies to --vendor-assets.")
+    if args.vendor_assets:
+        try:
+            manifest = assets.vendor_assets(record_pins=args.record_pins)
+        except (assets.AssetUnavailableError, requests.RequestException) as e:
+            raise SystemExit(f"Error: {e}")
+        for name, digest in manifest.items():
+            print(f"Vendored {name} (sha256 {digest})")
+        return
 
-    invalid = [s for s in symbols if not _validate_symbol(s)]
-    if invalid:
-        raise SystemExit(f"Unknown/unsupported symbol(s) for {exchange.value}: {', '.join(invalid)}. Aborting.")
+    # Resolve bundled assets before refreshing so a missing asset fails fast.
+    assets_html = None
+    if args.bundle:
+        try:
+            assets_html = assets.inline_assets_html()
+        except assets.AssetUnavailableError as e:
+            raise SystemExit(f"Error: {e}")
+    symbols = [s.upper() for s in args.symbols]
 
     # Determine refresh behavior - smart refresh is default
     if args.no_refresh:
@@ -77,95 +257,76 @@ def main():
 
     if refresh_mode != "never":
         print(f"Refreshing data for dashboard (mode: {refresh_mode})...")
-        for symbol in symbols:
-            # Determine if this symbol should be refreshed
-            should_refresh = (refresh_mode == "always" or
-                            (refresh_mode == "smart" and should_refresh_symbol(symbol, exchange.value)))
-
-            if refresh_mode == "smart" and not should_refresh:
-                print(f"Skipping refresh for {symbol} - not enough time has passed since last funding rate")
-                continue
-
-            if get_funding_interval_hours(symbol, exchange.value) is None:
-                source = exchange.value
-                hrs = None
-                if exchange == Exchange.HYPERLIQUID:
-                    hrs = hyperliquid_api.fetch_funding_info(symbol)
-                elif exchange == Exchange.BYBIT:
-                    hrs = bybit_api.fetch_funding_info(symbol)
-                else:  # BINANCE
-                    hrs = binance_api.fetch_funding_info(symbol)
-
-                if hrs:
-                    store_funding_info(symbol, hrs, source)
-                else:
-                    raise RuntimeError(f"Could not determine funding interval for {symbol} on {source}. Aborting refresh.")
-
-            print(f"Fetching data for {symbol}...")
-            last_time_ms = database.get_last_funding_time(symbol, exchange.value)
-            fetch_start_time = last_time_ms + 1 if last_time_ms else None
-
-            try:
-                source = exchange.value
-                if exchange == Exchange.HYPERLIQUID:
-                    new_rates = hyperliquid_api.fetch_funding_rate_history(symbol, start_time_ms=fetch_start_time)
-                elif exchange == Exchange.BYBIT:
-                    new_rates = bybit_api.fetch_funding_rate_history(symbol, start_time_ms=fetch_start_time)
-                else:  # BINANCE
-                    new_rates = binance_api.fetch_funding_rate_history(symbol, start_time_ms=fetch_start_time)
-                if new_rates:
-                    store_funding_rates(symbol, new_rates, source)
-                    print(f"Stored {len(new_rates)} new rate(s) for {symbol}.")
-                else:
-                    print(f"No new rates found for {symbol} or API returned no data.")
-            except Exception as e:
-                print(f"Warning: Error refreshing data for {symbol}: {e}. Dashboard will use existing data.")
-            time.sleep(0.5)
 
-    dashboard_pairs_data = []
     now_ms = int(time.time() * 1000)
 
-    for symbol in symbols:
-        interval = get_funding_interval_hours(symbol, exchange.value)
-        if interval is None:
-            raise RuntimeError(f"Missing funding interval for {symbol} on {exchange.value} (should have been stored earlier).")
-        current_price_str = "N/A" if exchange != Exchange.BINANCE else (
-            f"{(val:=binance_api.fetch_current_price(symbol)):.2f}" if (val:=binance_api.fetch_current_price(symbol)) is not None else "N/A"
-        )
-
-        # Data for 7-day P.A. rate summary
-        rates_7d = calculations.get_rates_for_period(symbol, period_days=7, source=exchange.value)
-        pa_rate_7d = calculations.calculate_pa_rate(symbol, rates_7d)
-
-        # Data for 14-day P.A. rate summary
-        rates_14d = calculations.get_rates_for_period(symbol, period_days=14, source=exchange.value)
-        pa_rate_14d = calculations.calculate_pa_rate(symbol, rates_14d)
-
-        # Fetch ALL historical rates for the chart
-        all_rates_db = database.get_funding_rates(symbol, start_time_ms=0, end_time_ms=now_ms, source=exchange.value)
-
-        # Prepare all rates for JavaScript (timestamps and rates)
-        # Ensure rates are sorted by time, which get_funding_rates should already do.
-        all_rates_for_js = [
-            {"time": r['funding_time'], "rate": r['funding_rate']}
-            for r in all_rates_db
-        ]
-
-        dashboard_pairs_data.append({
-            "symbol": symbol,
-            "current_price": current_price_str,
-            "pa_rate_7d": pa_rate_7d, # For summary text
-            "pa_rate_14d": pa_rate_14d, # For summary text
-            "interval_hours": interval,
-            "all_rates_data": all_rates_for_js # All data for dynamic JS charts
-        })
-        time.sleep(0.2) # Small delay if fetching prices for multiple symbols
+    def run_exchange(exchange: Exchange) -> tuple[list[str], list[str], list[dict]]:
+        if args.all_symbols:
+            # Stored symbols were validated when they were first fetched.
+            valid, invalid = database.get_symbols(exchange.value), []
+        elif refresh_mode == "never":
+            # Nothing will be fetched, so only stored symbols can be shown.
+            stored = database.get_funding_intervals(exchange.value)
+            valid = [s for s in symbols if s in stored]
+            invalid = [s for s in symbols if s not in stored]
+        else:
+            # Preflight: validate symbols for the exchange to avoid inserting unknowns
+            valid = [s for s in symbols if _validate_symbol(s, exchange)]
+            invalid = [s for s in symbols if s not in valid]
+            if invalid and not multi_exchange:
+                return valid, invalid, []
+        if refresh_mode != "never":
+            with profiling.span(f"refresh {exchange.value}"):
+                _refresh_exchange(exchange, valid, refresh_mode)
+            # One request samples the predicted funding of the whole exchange.
+            snapshots.ingest(exchange)
+        if args.view == "heatmap":
+            return valid, invalid, []
+        with profiling.span(f"prepare {exchange.value}"):
+            return valid, invalid, _prepare_pairs(exchange, valid, now_ms, multi_exchange)
+
+    # Each exchange has its own rate limits, so they are processed concurrently.
+    with ThreadPoolExecutor(max_workers=len(exchanges)) as pool:
+        results = dict(zip(exchanges, pool.map(run_exchange, exchanges)))
+
+    dashboard_pairs_data = []
+    symbols_by_exchange = {}
+    for exchange in exchanges:
+        valid, invalid, pairs_data = results[exchange]
+        if invalid:
+            if not multi_exchange:
+                raise SystemExit(f"Unknown/unsupported symbol(s) for {exchange.value}: {', '.join(invalid)}. Aborting.")
+            print(f"Skipping symbol(s) not listed on {exchange.value}: {', '.join(invalid)}")
+        symbols_by_exchange[exchange] = valid
+        dashboard_pairs_data.extend(pairs_data)
+
+    if multi_exchange and not args.all_symbols:
+        unknown = [s for s in symbols if not any(s in valid for valid in symbols_by_exchange.values())]
+        if unknown:
+            raise SystemExit(f"Unknown/unsupported symbol(s) on all selected exchanges: {', '.join(unknown)}. Aborting.")
+
+    if args.view == "heatmap":
+        with profiling.span("heatmap"):
+            matrix = heatmap.compute_heatmap(
+                {exchange.value: syms for exchange, syms in symbols_by_exchange.items()},
+                bucket=args.bucket,
+                label_source=multi_exchange,
+            )
+        try:
+            with profiling.span("write heatmap"):
+                write_heatmap_file(args.output, matrix)
+            print(f"Heatmap generated successfully: {os.path.abspath(args.output)}")
+        except IOError as e:
+            print(f"Error writing heatmap file: {e}")
+            sys.exit(1)
+        return
 
-    html_content = get_html_content(dashboard_pairs_data)
+    with profiling.span("comparisons"):
+        comparisons = _build_comparisons(symbols_by_exchange, now_ms) if multi_exchange else []
 
     try:
-        with open(args.output, "w", encoding="utf-8") as f:
-            f.write(html_content)
+        with profiling.span("write html"):
+            write_html_file(args.output, dashboard_pairs_data, assets_html, comparisons)
         print(f"Dashboard generated successfully: {os.path.abspath(args.output)}")
     except IOError as e:
         print(f"Error writing dashboard file: {e}")
@@ -1,76 +1,297 @@
 import sqlite3
 import time
-from .config import DATABASE_PATH
+from contextlib import contextmanager
+from . import alerts, config, metrics, profiling, series_cache, stats
+from .config import SERIES_CACHE_ENABLED
+from .series import FundingSeries
+
+# Intervals (hours) that venues settle funding on. A gap between consecutive stored
+# rates of any other length means settlements are missing from the store.
+SETTLEMENT_INTERVALS_HOURS = (1, 2, 4, 8)
 
 def get_db_connection():
     """Establishes a connection to the SQLite database."""
-    conn = sqlite3.connect(DATABASE_PATH)
+    profiling.count("db.connections")
+    with profiling.span("db connect"):
+        conn = sqlite3.connect(config.DATABASE_PATH)
     conn.row_factory = sqlite3.Row
     return conn
 
-def setup_database():
-    """Creates the funding_rates table if it doesn't exist."""
+@contextmanager
+def _connection(conn: sqlite3.Connection | None = None):
+    """
+    Yields the caller's connection if one is given (left open), otherwise a new
+    connection that is closed afterwards. Lets long-running callers reuse one
+    connection across many calls.
+    """
+    if conn is not None:
+        yield conn
+        return
     conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS funding_rates (
-            symbol TEXT NOT NULL,
-            funding_time INTEGER NOT NULL,
-            funding_rate REAL NOT NULL,
-            source TEXT NOT NULL,
-            PRIMARY KEY (symbol, funding_time, source)
-        )
-    ''')
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS funding_info (
-            symbol TEXT NOT NULL,
-            interval_hours INTEGER NOT NULL,
-            source TEXT NOT NULL,
-            PRIMARY KEY (symbol, source)
-        )
-    ''')
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+def setup_database(conn: sqlite3.Connection | None = None):
+    """Creates the funding_rates table if it doesn't exist."""
+    with _connection(conn) as conn:
+        cursor = conn.cursor()
+        # interval_hours is the number of hours a payment accrued over, inferred on
+        # write by _infer_intervals; annualizing is then a weighted sum.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS funding_rates (
+                symbol TEXT NOT NULL,
+                funding_time INTEGER NOT NULL,
+                funding_rate REAL NOT NULL,
+                source TEXT NOT NULL,
+                interval_hours INTEGER,
+                PRIMARY KEY (symbol, funding_time, source)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS funding_info (
+                symbol TEXT NOT NULL,
+                interval_hours INTEGER NOT NULL,
+                source TEXT NOT NULL,
+                PRIMARY KEY (symbol, source)
+            )
+        ''')
+        # Memoized p.a. results. A window is identified by the first and last stored
+        # funding_time inside it, so rolling periods ("last week") keep hitting the
+        # same entry until a new settlement lands. Cleared by _after_store().
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pa_cache (
+                source TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                first_time INTEGER NOT NULL,
+                last_time INTEGER NOT NULL,
+                pa_rate REAL NOT NULL,
+                PRIMARY KEY (source, symbol, first_time, last_time)
+            )
+        ''')
+        # Live predicted-funding samples, one row per symbol and ingest. Samples of an
+        # interval are folded into funding_snapshot_intervals once it has settled.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS funding_snapshots (
+                source TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                sample_time INTEGER NOT NULL,
+                funding_rate REAL NOT NULL,
+                next_funding_time INTEGER NOT NULL,
+                mark_price REAL,
+                PRIMARY KEY (source, symbol, sample_time)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS funding_snapshot_intervals (
+                source TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                funding_time INTEGER NOT NULL,
+                samples INTEGER NOT NULL,
+                first_sample_time INTEGER NOT NULL,
+                last_sample_time INTEGER NOT NULL,
+                mean_rate REAL NOT NULL,
+                min_rate REAL NOT NULL,
+                max_rate REAL NOT NULL,
+                last_rate REAL NOT NULL,
+                PRIMARY KEY (source, symbol, funding_time)
+            )
+        ''')
+        # Incremental state of the alert engine (alerts.py): running sums of each
+        # rolling window, and what each rule last saw per symbol. A window's sums cover
+        # every stored row up to end_time and were built under rules_version (a hash of
+        # the rules file); windows from before that column are dropped and rebuilt.
+        columns = {row['name'] for row in conn.execute('PRAGMA table_info(alert_windows)')}
+        if columns and 'rules_version' not in columns:
+            cursor.execute('DROP TABLE alert_windows')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alert_windows (
+                source TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                window_ms INTEGER NOT NULL,
+                rules_version TEXT NOT NULL,
+                end_time INTEGER NOT NULL,
+                sum_rate REAL NOT NULL,
+                sum_hours REAL NOT NULL,
+                PRIMARY KEY (source, symbol, window_ms)
+            )
+        ''')
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS alert_state (
+                rule TEXT NOT NULL,
+                source TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                last_time INTEGER NOT NULL,
+                last_rate REAL,
+                value REAL,
+                active INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (rule, source, symbol)
+            )
+        ''')
+        # All-time running statistics per symbol (stats.py): weighted Welford moments
+        # and a t-digest of per-payment p.a. rates, plus sign counts.
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS funding_stats (
+                source TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                first_time INTEGER NOT NULL,
+                last_time INTEGER NOT NULL,
+                payments INTEGER NOT NULL,
+                negative INTEGER NOT NULL,
+                positive INTEGER NOT NULL,
+                hours REAL NOT NULL,
+                mean REAL NOT NULL,
+                m2 REAL NOT NULL,
+                min_pa REAL,
+                max_pa REAL,
+                sketch TEXT NOT NULL,
+                PRIMARY KEY (source, symbol)
+            )
+        ''')
+        # Row count and last funding_time of each stored series, kept by every writer
+        # so the series cache can check itself without counting rows. A missing entry
+        # is counted once by series_cache.load().
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS series_meta (
+                source TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                row_count INTEGER NOT NULL,
+                last_time INTEGER,
+                PRIMARY KEY (source, symbol)
+            )
+        ''')
+        conn.commit()
+        _migrate_interval_hours(conn)
+
+def _migrate_interval_hours(conn: sqlite3.Connection):
+    """Adds funding_rates.interval_hours to databases created before it and fills it in."""
+    columns = {row['name'] for row in conn.execute('PRAGMA table_info(funding_rates)')}
+    if 'interval_hours' in columns:
+        return
+    conn.execute('ALTER TABLE funding_rates ADD COLUMN interval_hours INTEGER')
+    ranges = conn.execute(
+        'SELECT source, symbol, MIN(funding_time) AS first_time, MAX(funding_time) AS last_time '
+        'FROM funding_rates GROUP BY source, symbol'
+    ).fetchall()
+    for r in ranges:
+        _infer_intervals(conn, r['source'], r['symbol'], r['first_time'], r['last_time'])
+    # p.a. rates memoized with a single interval per symbol may no longer match.
+    conn.execute('DELETE FROM pa_cache')
     conn.commit()
-    conn.close()
 
-def get_last_funding_time(symbol: str, source: str = None) -> int | None:
+def _infer_intervals(conn: sqlite3.Connection, source: str, symbol: str, start_time_ms: int, end_time_ms: int):
+    """
+    Sets interval_hours of the rows in [start_time_ms, end_time_ms], and of the first
+    row after them, whose gap shrinks when rows are inserted before it. A row's interval
+    is the gap since the previous row when that is a settlement interval; after missing
+    rows (or for the first row) it is the symbol's funding_info interval, failing that
+    the gap to the next row. Runs inside the writer's transaction.
+    """
+    bounds = conn.execute('''
+        SELECT (SELECT MAX(funding_time) FROM funding_rates
+                WHERE symbol = ? AND source = ? AND funding_time < ?) AS prev_time,
+               (SELECT MIN(funding_time) FROM funding_rates
+                WHERE symbol = ? AND source = ? AND funding_time > ?) AS next_time
+    ''', (symbol, source, start_time_ms, symbol, source, end_time_ms)).fetchone()
+    lo = bounds['prev_time'] if bounds['prev_time'] is not None else start_time_ms
+    hi = bounds['next_time'] if bounds['next_time'] is not None else end_time_ms
+    valid = ",".join(str(h) for h in SETTLEMENT_INTERVALS_HOURS)
+    conn.execute(f'''
+        UPDATE funding_rates AS r SET interval_hours = g.hours
+        FROM (
+            SELECT funding_time,
+                   COALESCE(CASE WHEN gap_before IN ({valid}) THEN gap_before END,
+                            (SELECT interval_hours FROM funding_info WHERE symbol = ? AND source = ?),
+                            CASE WHEN gap_after IN ({valid}) THEN gap_after END) AS hours
+            FROM (
+                SELECT funding_time,
+                       ROUND((funding_time - LAG(funding_time) OVER w) / 3600000.0) AS gap_before,
+                       ROUND((LEAD(funding_time) OVER w - funding_time) / 3600000.0) AS gap_after
+                FROM funding_rates
+                WHERE symbol = ? AND source = ? AND funding_time >= ? AND funding_time <= ?
+                WINDOW w AS (ORDER BY funding_time)
+            )
+        ) AS g
+        WHERE r.symbol = ? AND r.source = ? AND r.funding_time = g.funding_time AND r.funding_time >= ?
+    ''', (symbol, source, symbol, source, lo, hi, symbol, source, start_time_ms))
+
+def _count_stored(conn: sqlite3.Connection, source: str, symbol: str, inserted: int, last_time: int):
+    """Adds newly inserted rows to the symbol's series_meta entry, inside the writer's transaction."""
+    conn.execute('''
+        UPDATE series_meta SET row_count = row_count + ?, last_time = MAX(COALESCE(last_time, ?), ?)
+        WHERE source = ? AND symbol = ?
+    ''', (inserted, last_time, last_time, source, symbol))
+
+def _after_store(conn: sqlite3.Connection, source: str, symbols: list[str]):
+    """
+    Runs after every write to funding_rates or funding_info, inside the writer's
+    transaction, to drop derived data that may no longer match.
+    """
+    conn.executemany('DELETE FROM pa_cache WHERE source = ? AND symbol = ?', [(source, s) for s in symbols])
+
+def get_last_funding_time(symbol: str, source: str = None, conn: sqlite3.Connection | None = None) -> int | None:
     """
     Retrieves the timestamp of the most recent funding rate stored for a given symbol.
     Returns None if no data exists for the symbol.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    if source:
-        cursor.execute('''
-            SELECT MAX(funding_time) AS last_time FROM funding_rates WHERE symbol = ? AND source = ?
-        ''', (symbol, source))
-    else:
-        cursor.execute('''
-            SELECT MAX(funding_time) AS last_time FROM funding_rates WHERE symbol = ?
-        ''', (symbol,))
-    row = cursor.fetchone()
-    conn.close()
+    with _connection(conn) as conn:
+        cursor = conn.cursor()
+        if source:
+            cursor.execute('''
+                SELECT MAX(funding_time) AS last_time FROM funding_rates WHERE symbol = ? AND source = ?
+            ''', (symbol, source))
+        else:
+            cursor.execute('''
+                SELECT MAX(funding_time) AS last_time FROM funding_rates WHERE symbol = ?
+            ''', (symbol,))
+        row = cursor.fetchone()
     if row and row['last_time'] is not None:
         return int(row['last_time'])
     return None
 
-def store_funding_rates(symbol: str, rates_data: list[dict], source: str):
+def store_funding_rates(symbol: str, rates_data: list[dict], source: str, conn: sqlite3.Connection | None = None):
     """
     Stores new funding rates in the database.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
     prepared_data = [
         (symbol, int(item['fundingTime']), float(item['fundingRate']), source)
         for item in rates_data
     ]
-    cursor.executemany('''
-        INSERT OR IGNORE INTO funding_rates (symbol, funding_time, funding_rate, source)
-        VALUES (?, ?, ?, ?)
-    ''', prepared_data)
-    conn.commit()
-    conn.close()
+    with profiling.span("db store_funding_rates"):
+        with _connection(conn) as conn:
+            # Alerts only fire for rows past the tail stored before this write.
+            alert_rules = alerts.load_rules()
+            previous_tail = get_last_funding_time(symbol, source, conn) if alert_rules else None
+            before = conn.total_changes
+            conn.executemany('''
+                INSERT OR IGNORE INTO funding_rates (symbol, funding_time, funding_rate, source)
+                VALUES (?, ?, ?, ?)
+            ''', prepared_data)
+            stored = conn.total_changes - before
+            profiling.count("db.rows_received", len(prepared_data))
+            profiling.count("db.rows_stored", stored)
+            metrics.record_stored(source, symbol, stored)
+            stored_rows = []
+            if stored:
+                times = [row[1] for row in prepared_data]
+                _count_stored(conn, source, symbol, stored, max(times))
+                _infer_intervals(conn, source, symbol, min(times), max(times))
+                stored_rows = conn.execute('''
+                    SELECT funding_time, funding_rate, interval_hours FROM funding_rates
+                    WHERE symbol = ? AND source = ? AND funding_time >= ? AND funding_time <= ?
+                ''', (symbol, source, min(times), max(times))).fetchall()
+                stats.update(conn, source, symbol, [tuple(row) for row in stored_rows], stored)
+            _after_store(conn, source, [symbol])
+            conn.commit()
+            if stored_rows and alert_rules:
+                alerts.on_stored(conn, source, symbol, [tuple(row) for row in stored_rows], previous_tail, alert_rules)
+        if SERIES_CACHE_ENABLED and stored_rows:
+            # After the commit, so readers never see cached rows SQLite doesn't have yet.
+            series_cache.append(symbol, source, [tuple(row) for row in stored_rows])
 
-def get_funding_rates(symbol: str, start_time_ms: int, end_time_ms: int = None, source: str = None) -> list[dict]:
+def get_funding_rates(symbol: str, start_time_ms: int, end_time_ms: int = None, source: str = None,
+                      conn: sqlite3.Connection | None = None) -> list[dict]:
     """
     Retrieves funding rates for a symbol within a given time range.
     Timestamps are in milliseconds.
@@ -78,45 +299,100 @@ def get_funding_rates(symbol: str, start_time_ms: int, end_time_ms: int = None,
     if end_time_ms is None:
         end_time_ms = int(time.time() * 1000)
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    if source:
-        cursor.execute('''
-            SELECT funding_time, funding_rate FROM funding_rates
-            WHERE symbol = ? AND funding_time >= ? AND funding_time <= ? AND source = ?
-            ORDER BY funding_time ASC
-        ''', (symbol, start_time_ms, end_time_ms, source))
-    else:
+    with _connection(conn) as conn:
+        cursor = conn.cursor()
+        if source:
+            cursor.execute('''
+                SELECT funding_time, funding_rate, interval_hours FROM funding_rates
+                WHERE symbol = ? AND funding_time >= ? AND funding_time <= ? AND source = ?
+                ORDER BY funding_time ASC
+            ''', (symbol, start_time_ms, end_time_ms, source))
+        else:
+            cursor.execute('''
+                SELECT funding_time, funding_rate, interval_hours FROM funding_rates
+                WHERE symbol = ? AND funding_time >= ? AND funding_time <= ?
+                ORDER BY funding_time ASC
+            ''', (symbol, start_time_ms, end_time_ms))
+        rows = cursor.fetchall()
+    return [
+        {"funding_time": r['funding_time'], "funding_rate": r['funding_rate'], "interval_hours": r['interval_hours']}
+        for r in rows
+    ]
+
+def get_funding_series(symbol: str, source: str, start_time_ms: int = 0, end_time_ms: int | None = None,
+                       conn: sqlite3.Connection | None = None) -> FundingSeries:
+    """
+    Like get_funding_rates, but streams the rows straight from the cursor into a
+    compact FundingSeries without building a Row or dict per payment. With the
+    series cache enabled, the columns are memory-mapped from disk instead.
+    """
+    if end_time_ms is None:
+        end_time_ms = int(time.time() * 1000)
+    with profiling.span("db get_funding_series"), _connection(conn) as conn:
+        if SERIES_CACHE_ENABLED:
+            return series_cache.load(symbol, source, conn).between(start_time_ms, end_time_ms)
+        cursor = conn.cursor()
+        cursor.row_factory = None
         cursor.execute('''
-            SELECT funding_time, funding_rate FROM funding_rates
-            WHERE symbol = ? AND funding_time >= ? AND funding_time <= ?
+            SELECT funding_time, funding_rate, interval_hours FROM funding_rates
+            WHERE symbol = ? AND source = ? AND funding_time >= ? AND funding_time <= ?
             ORDER BY funding_time ASC
-        ''', (symbol, start_time_ms, end_time_ms))
-    rows = cursor.fetchall()
-    conn.close()
-    return [{"funding_time": r['funding_time'], "funding_rate": r['funding_rate']} for r in rows]
+        ''', (symbol, source, start_time_ms, end_time_ms))
+        return FundingSeries.from_cursor(cursor)
 
-def get_funding_interval_hours(symbol: str, source: str = None) -> int | None:
-    conn = get_db_connection()
-    if source:
-        row = conn.execute(
-            'SELECT interval_hours FROM funding_info WHERE symbol = ? AND source = ?', (symbol, source)
-        ).fetchone()
-    else:
-        row = conn.execute(
-            'SELECT interval_hours FROM funding_info WHERE symbol = ?', (symbol,)
-        ).fetchone()
-    conn.close()
+def get_funding_interval_hours(symbol: str, source: str = None, conn: sqlite3.Connection | None = None) -> int | None:
+    with _connection(conn) as conn:
+        if source:
+            row = conn.execute(
+                'SELECT interval_hours FROM funding_info WHERE symbol = ? AND source = ?', (symbol, source)
+            ).fetchone()
+        else:
+            row = conn.execute(
+                'SELECT interval_hours FROM funding_info WHERE symbol = ?', (symbol,)
+            ).fetchone()
     return row['interval_hours'] if row else None
 
-def store_funding_info(symbol: str, interval_hours: int, source: str):
-    conn = get_db_connection()
-    conn.execute(
-        'INSERT OR IGNORE INTO funding_info (symbol, interval_hours, source) VALUES (?, ?, ?)',
-        (symbol, interval_hours, source)
-    )
-    conn.commit()
-    conn.close()
+def store_funding_info(symbol: str, interval_hours: int, source: str, conn: sqlite3.Connection | None = None):
+    """Stores a symbol's current funding interval, replacing the one stored before."""
+    with _connection(conn) as conn:
+        conn.execute('''
+            INSERT INTO funding_info (symbol, interval_hours, source) VALUES (?, ?, ?)
+            ON CONFLICT (symbol, source) DO UPDATE SET interval_hours = excluded.interval_hours
+        ''', (symbol, interval_hours, source))
+        _after_store(conn, source, [symbol])
+        conn.commit()
+
+def get_cached_pa_rate(symbol: str, source: str, start_time_ms: int, end_time_ms: int,
+                       conn: sqlite3.Connection | None = None) -> tuple[int | None, int | None, float | None]:
+    """
+    Looks up a memoized p.a. rate for a window with one statement: two index seeks
+    find the first and last stored funding_time in the window, which are joined
+    against pa_cache. Returns (first_time, last_time, pa_rate); first_time is None
+    if the window holds no data and pa_rate is None on a cache miss.
+    """
+    with _connection(conn) as conn:
+        row = conn.execute('''
+            SELECT w.first_time AS first_time, w.last_time AS last_time, c.pa_rate AS pa_rate
+            FROM (
+                SELECT (SELECT MIN(funding_time) FROM funding_rates
+                        WHERE symbol = ? AND source = ? AND funding_time >= ? AND funding_time <= ?) AS first_time,
+                       (SELECT MAX(funding_time) FROM funding_rates
+                        WHERE symbol = ? AND source = ? AND funding_time >= ? AND funding_time <= ?) AS last_time
+            ) w
+            LEFT JOIN pa_cache c
+              ON c.source = ? AND c.symbol = ? AND c.first_time = w.first_time AND c.last_time = w.last_time
+        ''', (symbol, source, start_time_ms, end_time_ms, symbol, source, start_time_ms, end_time_ms,
+              source, symbol)).fetchone()
+    return row['first_time'], row['last_time'], row['pa_rate']
+
+def store_cached_pa_rate(symbol: str, source: str, first_time: int, last_time: int, pa_rate: float,
+                         conn: sqlite3.Connection | None = None):
+    with _connection(conn) as conn:
+        conn.execute(
+            'INSERT OR REPLACE INTO pa_cache (source, symbol, first_time, last_time, pa_rate) VALUES (?, ?, ?, ?, ?)',
+            (source, symbol, first_time, last_time, pa_rate)
+        )
+        conn.commit()
 
 def get_first_funding_time(symbol: str, source: str = None) -> int | None:
     """
@@ -136,5 +412,261 @@ def get_first_funding_time(symbol: str, source: str = None) -> int | None:
     conn.close()
     return int(row['first_time']) if row and row['first_time'] is not None else None
 
+def get_symbols(source: str) -> list[str]:
+    """Returns every symbol with stored funding rates for a source."""
+    conn = get_db_connection()
+    rows = conn.execute(
+        'SELECT DISTINCT symbol FROM funding_rates WHERE source = ? ORDER BY symbol', (source,)
+    ).fetchall()
+    conn.close()
+    return [r['symbol'] for r in rows]
+
+def get_bucketed_pa_rates(symbols: list[str], source: str, bucket_ms: int, start_time_ms: int = 0) -> list[dict]:
+    """
+    Aggregates funding rates into fixed time buckets for many symbols in one pass.
+    Each bucket's value is the annualized (p.a. %) rate implied by the payments in it,
+    weighted by the hours each payment accrued over. Returns rows of
+    {symbol, bucket, pa_rate}, where bucket is funding_time // bucket_ms.
+    """
+    if not symbols:
+        return []
+    conn = get_db_connection()
+    placeholders = ",".join("?" * len(symbols))
+    rows = conn.execute(f'''
+        SELECT r.symbol AS symbol, r.funding_time / ? AS bucket,
+               SUM(CASE WHEN r.interval_hours IS NOT NULL THEN r.funding_rate END) * 24.0 * 365 * 100
+                   / SUM(r.interval_hours) AS pa_rate
+        FROM funding_rates r
+        WHERE r.source = ? AND r.funding_time >= ? AND r.symbol IN ({placeholders})
+        GROUP BY r.symbol, bucket
+        HAVING SUM(r.interval_hours) > 0
+    ''', (bucket_ms, source, start_time_ms, *symbols)).fetchall()
+    conn.close()
+    return [{"symbol": r['symbol'], "bucket": r['bucket'], "pa_rate": r['pa_rate']} for r in rows]
+
+def store_funding_infos(intervals: dict[str, int], source: str, conn: sqlite3.Connection | None = None):
+    """Stores the current funding intervals of many symbols in one transaction, replacing stored ones."""
+    with _connection(conn) as conn:
+        bulk_store_funding_infos(intervals, source, conn)
+        conn.commit()
+
+def bulk_store_funding_infos(intervals: dict[str, int], source: str, conn: sqlite3.Connection):
+    """Like store_funding_infos, but inside the caller's transaction, for bulk loads; the caller commits."""
+    conn.executemany('''
+        INSERT INTO funding_info (symbol, interval_hours, source) VALUES (?, ?, ?)
+        ON CONFLICT (symbol, source) DO UPDATE SET interval_hours = excluded.interval_hours
+    ''', [(symbol, interval_hours, source) for symbol, interval_hours in intervals.items()])
+    _after_store(conn, source, list(intervals))
+
+def bulk_insert_funding_rates(rows: list[tuple], conn: sqlite3.Connection) -> int:
+    """
+    Inserts (symbol, funding_time, funding_rate, source) rows with INSERT OR IGNORE
+    inside the caller's transaction, for bulk loads; the caller commits.
+    Rows may belong to any history position, so the touched series caches are
+    dropped rather than appended to. Returns the number of rows actually inserted.
+    """
+    before = conn.total_changes
+    conn.executemany(
+        'INSERT OR IGNORE INTO funding_rates (symbol, funding_time, funding_rate, source) VALUES (?, ?, ?, ?)',
+        rows
+    )
+    inserted = conn.total_changes - before
+    profiling.count("db.rows_received", len(rows))
+    profiling.count("db.rows_stored", inserted)
+    ranges = {}
+    for symbol, t, _, source in rows:
+        lo, hi = ranges.get((source, symbol), (t, t))
+        ranges[(source, symbol)] = (min(lo, t), max(hi, t))
+    if inserted:
+        for (source, symbol), (lo, hi) in ranges.items():
+            _infer_intervals(conn, source, symbol, lo, hi)
+    touched = {}
+    for source, symbol in ranges:
+        touched.setdefault(source, set()).add(symbol)
+    for source, symbols in touched.items():
+        _after_store(conn, source, sorted(symbols))
+        # Bulk loads don't raise alerts; their window sums, the symbols' statistics and
+        # their series_meta counts are rebuilt on the next store or read.
+        conn.executemany('DELETE FROM alert_windows WHERE source = ? AND symbol = ?', [(source, s) for s in symbols])
+        conn.executemany('DELETE FROM funding_stats WHERE source = ? AND symbol = ?', [(source, s) for s in symbols])
+        conn.executemany('DELETE FROM series_meta WHERE source = ? AND symbol = ?', [(source, s) for s in symbols])
+        if SERIES_CACHE_ENABLED:
+            for symbol in symbols:
+                series_cache.invalidate(symbol, source)
+    return inserted
+
+def store_funding_snapshots(source: str, sample_time_ms: int, snapshots: dict[str, dict],
+                            conn: sqlite3.Connection | None = None) -> int:
+    """
+    Stores one predicted-funding sample per symbol, as returned by an adapter's
+    fetch_predicted(), taken at sample_time_ms. Returns the number of rows stored.
+    """
+    rows = [
+        (source, symbol, sample_time_ms, float(s['fundingRate']), int(s['nextFundingTime']), s.get('markPrice'))
+        for symbol, s in snapshots.items()
+    ]
+    with _connection(conn) as conn:
+        before = conn.total_changes
+        conn.executemany('''
+            INSERT OR IGNORE INTO funding_snapshots
+                (source, symbol, sample_time, funding_rate, next_funding_time, mark_price)
+            VALUES (?, ?, ?, ?, ?, ?)
+        ''', rows)
+        stored = conn.total_changes - before
+        conn.commit()
+    return stored
+
+def compact_funding_snapshots(now_ms: int, conn: sqlite3.Connection | None = None) -> int:
+    """
+    Folds the samples of every interval that settled by now_ms into one
+    funding_snapshot_intervals row per (source, symbol, funding_time) and deletes them.
+    Samples arriving for an interval that was already compacted are merged into its row.
+    Returns the number of samples compacted.
+    """
+    with _connection(conn) as conn:
+        conn.execute('''
+            INSERT INTO funding_snapshot_intervals
+                (source, symbol, funding_time, samples, first_sample_time, last_sample_time,
+                 mean_rate, min_rate, max_rate, last_rate)
+            SELECT s.source, s.symbol, s.next_funding_time, COUNT(*), MIN(s.sample_time), MAX(s.sample_time),
+                   AVG(s.funding_rate), MIN(s.funding_rate), MAX(s.funding_rate),
+                   (SELECT l.funding_rate FROM funding_snapshots l
+                    WHERE l.source = s.source AND l.symbol = s.symbol AND l.next_funding_time = s.next_funding_time
+                    ORDER BY l.sample_time DESC LIMIT 1)
+            FROM funding_snapshots s
+            WHERE s.next_funding_time <= ?
+            GROUP BY s.source, s.symbol, s.next_funding_time
+            ON CONFLICT (source, symbol, funding_time) DO UPDATE SET
+                mean_rate = (mean_rate * samples + excluded.mean_rate * excluded.samples) / (samples + excluded.samples),
+                samples = samples + excluded.samples,
+                first_sample_time = MIN(first_sample_time, excluded.first_sample_time),
+                last_rate = CASE WHEN excluded.last_sample_time >= last_sample_time THEN excluded.last_rate ELSE last_rate END,
+                last_sample_time = MAX(last_sample_time, excluded.last_sample_time),
+                min_rate = MIN(min_rate, excluded.min_rate),
+                max_rate = MAX(max_rate, excluded.max_rate)
+        ''', (now_ms,))
+        compacted = conn.execute('DELETE FROM funding_snapshots WHERE next_funding_time <= ?', (now_ms,)).rowcount
+        conn.commit()
+    return compacted
+
+def get_latest_funding_snapshots(source: str, symbols: list[str] | None = None,
+                                 conn: sqlite3.Connection | None = None) -> dict[str, dict]:
+    """
+    Returns {symbol: {"funding_rate", "next_funding_time", "sample_time", "mark_price"}}
+    from the newest stored sample of each symbol (all symbols of the source if None).
+    """
+    symbol_filter = ""
+    params = [source]
+    if symbols is not None:
+        if not symbols:
+            return {}
+        symbol_filter = f" AND symbol IN ({','.join('?' * len(symbols))})"
+        params.extend(symbols)
+    with _connection(conn) as conn:
+        rows = conn.execute(f'''
+            SELECT symbol, funding_rate, next_funding_time, sample_time, mark_price
+            FROM funding_snapshots s
+            WHERE source = ?{symbol_filter}
+              AND sample_time = (SELECT MAX(sample_time) FROM funding_snapshots
+                                 WHERE source = s.source AND symbol = s.symbol)
+        ''', params).fetchall()
+    return {
+        r['symbol']: {
+            "funding_rate": r['funding_rate'],
+            "next_funding_time": r['next_funding_time'],
+            "sample_time": r['sample_time'],
+            "mark_price": r['mark_price'],
+        }
+        for r in rows
+    }
+
+def get_last_funding_times(source: str) -> dict[str, int]:
+    """Returns {symbol: latest funding_time} for every stored symbol of a source in one query."""
+    conn = get_db_connection()
+    rows = conn.execute(
+        'SELECT symbol, MAX(funding_time) AS last_time FROM funding_rates WHERE source = ? GROUP BY symbol',
+        (source,)
+    ).fetchall()
+    conn.close()
+    return {r['symbol']: int(r['last_time']) for r in rows}
+
+def get_refresh_state(symbols: list[str], source: str, conn: sqlite3.Connection | None = None) -> dict[str, dict]:
+    """
+    Fetches the last stored funding_time and the funding interval of many symbols
+    with a single statement joining funding_rates and funding_info.
+    The interval is the shorter of the stored one and that of the last stored rate,
+    so a symbol moved to a shorter interval is not refreshed too late; it is None
+    when funding_info has no entry.
+    Returns {symbol: {"last_time": int | None, "interval_hours": int | None}}.
+    """
+    if not symbols:
+        return {}
+    values = ",".join(["(?)"] * len(symbols))
+    with _connection(conn) as conn:
+        rows = conn.execute(f'''
+            WITH requested(symbol) AS (VALUES {values})
+            SELECT q.symbol AS symbol, last.funding_time AS last_time, last.interval_hours AS last_hours,
+                   i.interval_hours AS interval_hours
+            FROM requested q
+            LEFT JOIN funding_rates last ON last.symbol = q.symbol AND last.source = ?
+                AND last.funding_time = (SELECT MAX(r.funding_time) FROM funding_rates r
+                                         WHERE r.symbol = q.symbol AND r.source = ?)
+            LEFT JOIN funding_info i ON i.symbol = q.symbol AND i.source = ?
+        ''', (*symbols, source, source, source)).fetchall()
+    return {
+        r['symbol']: {
+            "last_time": int(r['last_time']) if r['last_time'] is not None else None,
+            "interval_hours": (min(r['interval_hours'], r['last_hours'])
+                               if r['interval_hours'] and r['last_hours'] else r['interval_hours']),
+        }
+        for r in rows
+    }
+
+def get_funding_intervals(source: str) -> dict[str, int]:
+    """Returns {symbol: interval_hours} for every symbol of a source in one query."""
+    conn = get_db_connection()
+    rows = conn.execute(
+        'SELECT symbol, interval_hours FROM funding_info WHERE source = ?', (source,)
+    ).fetchall()
+    conn.close()
+    return {r['symbol']: r['interval_hours'] for r in rows}
+
+def get_window_pa_rates(sources: list[str], window_starts: dict[str, int]) -> list[dict]:
+    """
+    Computes p.a. rates over several trailing windows for every stored symbol of
+    the given sources in a single aggregate pass over funding_rates.
+    window_starts maps a window label to its start timestamp (ms).
+    Returns rows of {source, symbol, interval_hours, <label>: p.a. % or None, ...}.
+    """
+    if not sources or not window_starts:
+        return []
+    labels = list(window_starts)
+    columns = ",\n".join(
+        f"SUM(CASE WHEN r.funding_time >= ? AND r.interval_hours IS NOT NULL THEN r.funding_rate END) * 24.0 * 365 * 100"
+        f" / SUM(CASE WHEN r.funding_time >= ? THEN r.interval_hours END) AS w{n}"
+        for n in range(len(labels))
+    )
+    params = []
+    for label in labels:
+        params.extend([window_starts[label], window_starts[label]])
+    placeholders = ",".join("?" * len(sources))
+    conn = get_db_connection()
+    rows = conn.execute(f'''
+        SELECT r.source AS source, r.symbol AS symbol, i.interval_hours AS interval_hours,
+               {columns}
+        FROM funding_rates r
+        JOIN funding_info i ON i.symbol = r.symbol AND i.source = r.source
+        WHERE r.source IN ({placeholders}) AND r.funding_time >= ?
+        GROUP BY r.source, r.symbol
+    ''', (*params, *sources, min(window_starts.values()))).fetchall()
+    conn.close()
+    results = []
+    for r in rows:
+        row = {"source": r['source'], "symbol": r['symbol'], "interval_hours": r['interval_hours']}
+        for n, label in enumerate(labels):
+            row[label] = r[f"w{n}"]
+        results.append(row)
+    return results
+
 # Initialize database on import
 setup_database()
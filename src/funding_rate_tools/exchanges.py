@@ -0,0 +1,169 @@
+from dataclasses import dataclass
+
+import requests
+
+from . import binance_api, bybit_api, hyperliquid_api, pagination
+from .config import Exchange
+
+# What adapter requests raise: transport failures and malformed or error responses.
+FETCH_ERRORS = (requests.RequestException, ValueError, KeyError, TypeError)
+
+@dataclass(frozen=True)
+class Capabilities:
+    """
+    What the pagination planner needs to know about a venue's funding history endpoint.
+      page_size:       most rates one request returns.
+      ordering:        which end of a range a full page covers: "asc" (oldest first, so
+                       the next page starts after it) or "desc" (newest first, so the
+                       next page ends before it).
+      interval_source: where funding intervals come from: "api" (a per-symbol endpoint)
+                       or "history" (inferred from recent settlement gaps).
+      prices:          whether fetch_price is available.
+    Every adapter's fetch_page accepts an inclusive start and end bound, either optional.
+    """
+    page_size: int
+    ordering: str
+    interval_source: str
+    prices: bool = False
+
+class ExchangeAdapter:
+    """
+    One venue behind a common interface. Subclasses implement the single-request
+    primitives; fetch_history and iter_history page through any range with the
+    smallest number of requests, using the shared planner in pagination.py.
+    """
+    exchange: Exchange
+    capabilities: Capabilities
+
+    @property
+    def name(self) -> str:
+        return self.exchange.value
+
+    @property
+    def base_url(self) -> str:
+        """URL whose host the shared rate limiter keys on."""
+        raise NotImplementedError
+
+    def fetch_page(self, symbol: str, start_time_ms: int | None, end_time_ms: int | None) -> list[dict]:
+        """One history request for [start_time_ms, end_time_ms]; rates in any order. Raises on failure."""
+        raise NotImplementedError
+
+    def fetch_interval(self, symbol: str) -> int | None:
+        """Funding interval in hours, or None if the symbol is unknown to the venue. Raises on failure."""
+        raise NotImplementedError
+
+    def fetch_all_intervals(self) -> dict[str, int]:
+        """{symbol: interval hours} for every listed perpetual. Raises on failure."""
+        raise NotImplementedError
+
+    def fetch_price(self, symbol: str) -> float | None:
+        """Current price, where capabilities.prices says the venue provides one. Raises on failure."""
+        return None
+
+    def fetch_predicted(self) -> dict[str, dict]:
+        """
+        Current predicted funding of every listed perpetual in one request, keyed by
+        market_symbol(): {'fundingRate', 'nextFundingTime', 'markPrice'}. Raises on failure.
+        """
+        raise NotImplementedError
+
+    def market_symbol(self, symbol: str) -> str:
+        """The venue's own name for `symbol`, as used in fetch_predicted() results."""
+        return symbol.upper()
+
+    def iter_history(self, symbol: str, start_time_ms: int | None = None, end_time_ms: int | None = None,
+                     interval_hours: int | None = None, workers: int = 1):
+        """
+        Yields pages of rates in [start_time_ms, end_time_ms] (None: from the first / up to now).
+        One request at a time by default, so callers can pace themselves between pages.
+        """
+        return pagination.iter_pages(self, symbol, start_time_ms, end_time_ms, interval_hours, workers)
+
+    def fetch_history(self, symbol: str, start_time_ms: int | None = None, end_time_ms: int | None = None,
+                      interval_hours: int | None = None, workers: int = pagination.PAGE_WORKERS) -> list[dict]:
+        """
+        All rates in [start_time_ms, end_time_ms] as {'fundingTime', 'fundingRate'} dicts,
+        oldest first. Knowing interval_hours lets the planner split the range into the
+        fewest windowed requests, fetched `workers` at a time, so a symbol that is weeks
+        behind catches up in one call. Raises on a request error; callers that want to
+        keep what arrived before the error page through iter_history instead.
+        """
+        rates = {}
+        for page in self.iter_history(symbol, start_time_ms, end_time_ms, interval_hours, workers):
+            for rate in page:
+                rates[rate["fundingTime"]] = rate
+        return [rates[t] for t in sorted(rates)]
+
+class BinanceAdapter(ExchangeAdapter):
+    exchange = Exchange.BINANCE
+    capabilities = Capabilities(
+        page_size=binance_api.MAX_RESULTS_PER_REQUEST, ordering="asc", interval_source="api", prices=True
+    )
+
+    @property
+    def base_url(self) -> str:
+        return binance_api.BINANCE_API_BASE_URL
+
+    def fetch_page(self, symbol, start_time_ms, end_time_ms):
+        # Without a start Binance returns the newest page; 0 makes it page from the first rate.
+        return binance_api.fetch_funding_rate_page(symbol, start_time_ms or 0, end_time_ms)
+
+    def fetch_interval(self, symbol):
+        return binance_api.fetch_funding_info(symbol)
+
+    def fetch_all_intervals(self):
+        return binance_api.fetch_all_funding_info()
+
+    def fetch_predicted(self):
+        return binance_api.fetch_predicted_funding()
+
+    def fetch_price(self, symbol):
+        return binance_api.fetch_current_price(symbol)
+
+class BybitAdapter(ExchangeAdapter):
+    exchange = Exchange.BYBIT
+    capabilities = Capabilities(page_size=bybit_api.MAX_RESULTS_PER_REQUEST, ordering="desc", interval_source="api")
+
+    @property
+    def base_url(self) -> str:
+        return bybit_api.BYBIT_URL
+
+    def fetch_page(self, symbol, start_time_ms, end_time_ms):
+        return bybit_api.fetch_funding_rate_page(symbol, start_time_ms, end_time_ms)
+
+    def fetch_interval(self, symbol):
+        return bybit_api.fetch_funding_info(symbol)
+
+    def fetch_all_intervals(self):
+        return bybit_api.fetch_all_funding_info()
+
+    def fetch_predicted(self):
+        return bybit_api.fetch_predicted_funding()
+
+class HyperliquidAdapter(ExchangeAdapter):
+    exchange = Exchange.HYPERLIQUID
+    capabilities = Capabilities(page_size=hyperliquid_api.MAX_RESULTS_PER_REQUEST, ordering="asc", interval_source="history")
+
+    @property
+    def base_url(self) -> str:
+        return hyperliquid_api.HYPERLIQUID_URL
+
+    def fetch_page(self, symbol, start_time_ms, end_time_ms):
+        return hyperliquid_api.fetch_funding_rate_page(symbol, start_time_ms, end_time_ms)
+
+    def fetch_interval(self, symbol):
+        return hyperliquid_api.fetch_funding_info(symbol)
+
+    def fetch_all_intervals(self):
+        return hyperliquid_api.fetch_all_funding_info()
+
+    def fetch_predicted(self):
+        return hyperliquid_api.fetch_predicted_funding()
+
+    def market_symbol(self, symbol):
+        return hyperliquid_api._hl_coin_from_symbol(symbol)
+
+ADAPTERS = {adapter.exchange: adapter for adapter in (BinanceAdapter(), BybitAdapter(), HyperliquidAdapter())}
+
+def get_adapter(exchange: Exchange | str) -> ExchangeAdapter:
+    return ADAPTERS[Exchange(exchange)]
@@ -1,138 +1,54 @@
 import argparse
-import time
-from . import binance_api, database, hyperliquid_api, bybit_api, config
+import sys
+
+from . import database, config, metrics, profiling
 from .database import get_last_funding_time, get_first_funding_time, store_funding_rates, get_funding_interval_hours, store_funding_info
 from .config import Exchange
+from .exchanges import FETCH_ERRORS, get_adapter
 
 def backfill_symbol(symbol: str, delay: int, exchange: Exchange):
     source = exchange.value
+    adapter = get_adapter(exchange)
+    interval = get_funding_interval_hours(symbol, source)
+    if interval is None:
+        raise RuntimeError(f"Funding interval for {symbol} on {source} not found. Aborting backfill.")
 
-    # last_known_time is the latest timestamp known before this script run for this symbol
+    # last_known_time is the latest timestamp known before this script run for this symbol.
+    # Without one, the forward fill fetches the whole history and the backfill finds nothing older.
     last_known_time = get_last_funding_time(symbol, source)
-    print(f"Forward filling {symbol} from {'after ' + str(last_known_time) if last_known_time else 'latest available'}")
-
-    if exchange == Exchange.HYPERLIQUID:
-        start_for_forward_fill = last_known_time + 1 if last_known_time is not None else None
-    else:
-        start_for_forward_fill = last_known_time
-
-    first_forward_pass = True
-    while True:
-        if exchange == Exchange.HYPERLIQUID:
-            rates = hyperliquid_api.fetch_funding_rate_history(symbol, start_time_ms=start_for_forward_fill)
-        elif exchange == Exchange.BYBIT:
-            rates = bybit_api.fetch_funding_rate_history(symbol, start_time_ms=start_for_forward_fill)
-        else:  # BINANCE
-            rates = binance_api.fetch_funding_rate_history(symbol, start_time_ms=start_for_forward_fill)
-
-        if not rates:
-            if first_forward_pass:
-                 log_msg_ff = f"  No new rates found for {symbol}"
-                 if last_known_time: # This refers to the state *before* this forward-fill attempt
-                     log_msg_ff += f" since {last_known_time}."
-                 else: # last_known_time was None, meaning DB was empty for this symbol
-                     log_msg_ff += " (no prior data, API returned no initial data for forward-fill)."
-                 print(log_msg_ff)
-            break
-
-        first_forward_pass = False # Forward-fill fetched at least one batch
-        store_funding_rates(symbol, rates, source)
-
-        newest_time_in_batch = rates[-1]['fundingTime']
-        print(f"  Fetched {len(rates)} new rates for {symbol}, up to {newest_time_in_batch}. Next start for forward-fill: {newest_time_in_batch + 1}")
-
-        if exchange == Exchange.HYPERLIQUID:
-            start_for_forward_fill = newest_time_in_batch + 1
-        else:
-            start_for_forward_fill = newest_time_in_batch
-        time.sleep(delay)
-
-    # After forward-fill, determine if and from where to backfill
-    first_overall_time_in_db = get_first_funding_time(symbol, source) # Earliest time in DB *after* potential forward-fill
-
-    boundary_for_backfill = 0
-    should_attempt_backfill = False
-
-    if first_overall_time_in_db is not None:
-        # Data exists in DB (either pre-existing or added by forward-fill).
-        # Backfill from the earliest known point.
-        boundary_for_backfill = first_overall_time_in_db
-        print(f"Backfilling {symbol} before {boundary_for_backfill}")
-        should_attempt_backfill = True
-    elif last_known_time is None and first_forward_pass:
-        # DB was initially empty for this symbol AND forward-fill (which looks for recent data) found nothing.
-        # This implies all data is historical. Start backfill from 'now'.
-        boundary_for_backfill = int(time.time() * 1000)
-        print(f"No recent data found by forward-fill for new symbol {symbol}. Initiating backfill from current time ({boundary_for_backfill}).")
-        should_attempt_backfill = True
-    else:
-        # All other cases:
-        # - DB was empty, forward-fill ran and found something (first_overall_time_in_db would not be None, handled above).
-        # - DB had data, forward-fill ran (first_overall_time_in_db would not be None, handled above).
-        # This 'else' means no basis to start backfilling under current logic.
+    print(f"Forward filling {symbol} from {'after ' + str(last_known_time) if last_known_time else 'the first available rate'}")
+    start_for_forward_fill = last_known_time + 1 if last_known_time is not None else None
+
+    fetched_forward = False
+    try:
+        for rates in adapter.iter_history(symbol, start_for_forward_fill, interval_hours=interval):
+            fetched_forward = True
+            store_funding_rates(symbol, rates, source)
+            print(f"  Fetched {len(rates)} new rates for {symbol}, {rates[0]['fundingTime']} to {rates[-1]['fundingTime']}.")
+            profiling.sleep(delay)
+    except FETCH_ERRORS as e:
+        print(f"Error fetching funding rates for {symbol} on {source}: {e}", file=sys.stderr)
+    if not fetched_forward:
+        print(f"  No new rates found for {symbol}" + (f" since {last_known_time}." if last_known_time else "."))
+
+    # After forward-fill, fetch everything older than the earliest stored rate.
+    first_overall_time_in_db = get_first_funding_time(symbol, source)
+    if first_overall_time_in_db is None:
         print(f"No data in database for {symbol} to determine a backfill starting point after forward-fill. Skipping backfill.")
-        # should_attempt_backfill remains False
-
-    if should_attempt_backfill:
-        interval = get_funding_interval_hours(symbol, source)
-        if interval is None:
-            raise RuntimeError(f"Funding interval for {symbol} on {source} not found. Aborting backfill.")
-
-        if exchange == Exchange.HYPERLIQUID:
-            # Hourly funding; fetch ~30 days per chunk (30*24=720 intervals)
-            chunk = 720
-        elif exchange == Exchange.BYBIT:
-            chunk = 175
-        else:  # BINANCE
-            chunk = 900
-        ms_step = interval * 3600 * 1000 * chunk
-
-        current_boundary_for_loop = boundary_for_backfill
-
-        while True:
-            fetch_chunk_start_time = max(0, current_boundary_for_loop - ms_step)
-
-            if fetch_chunk_start_time >= current_boundary_for_loop:
-                 if current_boundary_for_loop == 0 and fetch_chunk_start_time == 0:
-                     pass
-                 else:
-                    print(f"  Backfill for {symbol}: fetch start {fetch_chunk_start_time} is not before current boundary {current_boundary_for_loop}. Stopping.")
-                    break
-
-            if exchange == Exchange.HYPERLIQUID:
-                rates_chunk = hyperliquid_api.fetch_funding_rate_history(symbol, start_time_ms=fetch_chunk_start_time)
-            elif exchange == Exchange.BYBIT:
-                # For Bybit, when specifying a time boundary in backfill, use endTime only (API accepts endTime without startTime).
-                rates_chunk = bybit_api.fetch_funding_rate_history(symbol, end_time_ms=current_boundary_for_loop)
-            else:  # BINANCE
-                rates_chunk = binance_api.fetch_funding_rate_history(symbol, start_time_ms=fetch_chunk_start_time)
-
-            older_rates_in_chunk = [
-                r for r in rates_chunk
-                if r['fundingTime'] < current_boundary_for_loop and r['fundingTime'] >= fetch_chunk_start_time
-            ]
-
-            if not older_rates_in_chunk:
-                print(f"  No older rates found for {symbol} before {current_boundary_for_loop} (queried from {fetch_chunk_start_time}).")
-                if fetch_chunk_start_time == 0:
-                    print(f"  Reached earliest possible data for {symbol} or no data available before {current_boundary_for_loop}.")
-                break
-
-            store_funding_rates(symbol, older_rates_in_chunk, source)
-            oldest_time_in_this_batch = min(r['fundingTime'] for r in older_rates_in_chunk)
-            print(f"  Fetched {len(older_rates_in_chunk)} older rates for {symbol}, back to {oldest_time_in_this_batch}.")
-
-            if oldest_time_in_this_batch == current_boundary_for_loop:
-                print(f"  Backfill for {symbol} made no progress from boundary {current_boundary_for_loop}. Stopping.")
-                break
-
-            current_boundary_for_loop = oldest_time_in_this_batch
-
-            if current_boundary_for_loop == 0:
-                print(f"  Reached timestamp 0 for {symbol}. Stopping backfill.")
-                break
-
-            time.sleep(delay)
+        return
+
+    print(f"Backfilling {symbol} before {first_overall_time_in_db}")
+    fetched_backward = False
+    try:
+        for rates in adapter.iter_history(symbol, None, first_overall_time_in_db - 1, interval):
+            fetched_backward = True
+            store_funding_rates(symbol, rates, source)
+            print(f"  Fetched {len(rates)} older rates for {symbol}, {rates[0]['fundingTime']} to {rates[-1]['fundingTime']}.")
+            profiling.sleep(delay)
+    except FETCH_ERRORS as e:
+        print(f"Error fetching funding rates for {symbol} on {source}: {e}", file=sys.stderr)
+    if not fetched_backward:
+        print(f"  Reached earliest possible data for {symbol} or no data available before {first_overall_time_in_db}.")
 
 def main():
     parser = argparse.ArgumentParser(description="Fill missing funding-rate data.")
@@ -148,19 +64,24 @@ def main():
         default="binance",
         help="Exchange to fill data for. Default: binance"
     )
+    profiling.add_arguments(parser)
     args = parser.parse_args()
+    with metrics.run("fill-data"), profiling.session(args):
+        _run(args)
+
+def _run(args):
     exchange = Exchange(args.exchange)
 
     syms_to_process = [s.upper() for s in (args.symbols or config.DEFAULT_SYMBOLS)]
 
     # Preflight: validate symbols to avoid inserting unknowns for this exchange
+    adapter = get_adapter(exchange)
+
     def _validate_symbol(sym: str) -> bool:
-        if exchange == Exchange.HYPERLIQUID:
-            return hyperliquid_api.fetch_funding_info(sym) is not None
-        elif exchange == Exchange.BYBIT:
-            return bybit_api.fetch_funding_info(sym) is not None
-        else:  # BINANCE
-            return binance_api.fetch_funding_info(sym) is not None
+        try:
+            return adapter.fetch_interval(sym) is not None
+        except FETCH_ERRORS as e:
+            raise SystemExit(f"Error: Could not look up {sym} on {exchange.value}: {e}") from None
 
     invalid = [s for s in syms_to_process if not _validate_symbol(s)]
     if invalid:
@@ -171,23 +92,25 @@ def main():
         if database.get_funding_interval_hours(symbol_info, exchange.value) is None:
             source_for_info = exchange.value
             print(f"  Funding interval missing for {symbol_info} on {source_for_info}; fetching...")
-            fetched_interval = None
-            if exchange == Exchange.HYPERLIQUID:
-                fetched_interval = hyperliquid_api.fetch_funding_info(symbol_info)
-            elif exchange == Exchange.BYBIT:
-                fetched_interval = bybit_api.fetch_funding_info(symbol_info)
-            else: # Binance
-                fetched_interval = binance_api.fetch_funding_info(symbol_info)
+            fetched_interval = adapter.fetch_interval(symbol_info)
 
             if fetched_interval:
                 database.store_funding_info(symbol_info, fetched_interval, source_for_info)
                 print(f"  Stored funding interval for {symbol_info}: {fetched_interval} hours.")
             else:
                 raise RuntimeError(f"Could not determine funding interval for {symbol_info} on {source_for_info}. Aborting.")
-            time.sleep(0.2) # Small delay if fetching info for multiple symbols
+            profiling.sleep(0.2) # Small delay if fetching info for multiple symbols
 
     for s in syms_to_process:
-        backfill_symbol(s, args.delay, exchange)
+        metrics.track(exchange.value, s)
+        try:
+            with profiling.span("backfill_symbol", s):
+                backfill_symbol(s, args.delay, exchange)
+        except Exception:
+            metrics.record_error(exchange.value, s)
+            raise
+        # Backfills run for a long time, so progress is published after every symbol.
+        metrics.write_file()
 
 if __name__ == "__main__":
     main()
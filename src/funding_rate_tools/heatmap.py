@@ -0,0 +1,56 @@
+from .database import get_bucketed_pa_rates
+
+BUCKET_MS = {
+    "day": 24 * 60 * 60 * 1000,
+    "week": 7 * 24 * 60 * 60 * 1000,
+}
+
+def compute_heatmap(symbols_by_source: dict[str, list[str]], bucket: str = "day", start_time_ms: int = 0,
+                    label_source: bool = False) -> dict:
+    """
+    Builds a dense symbols x time-buckets matrix of annualized funding (% p.a.).
+    Aggregation happens in SQLite in one grouped query per source; the result is
+    laid out row-major in a flat list with None for buckets without data.
+    Returns {bucket, bucket_ms, start, rows, cols, labels, values, scale}, where
+    start is the first bucket's timestamp and scale a robust color-scale bound.
+    """
+    bucket_ms = BUCKET_MS[bucket]
+
+    cells = {}
+    labels = []
+    for source, symbols in symbols_by_source.items():
+        for row in get_bucketed_pa_rates(symbols, source, bucket_ms, start_time_ms):
+            label = f"{row['symbol']}@{source}" if label_source else row['symbol']
+            cells[(label, row['bucket'])] = row['pa_rate']
+        labels.extend(f"{s}@{source}" if label_source else s for s in symbols)
+
+    if not cells:
+        return {"bucket": bucket, "bucket_ms": bucket_ms, "start": 0, "rows": 0, "cols": 0,
+                "labels": [], "values": [], "scale": 0}
+
+    first_bucket = min(b for _, b in cells)
+    last_bucket = max(b for _, b in cells)
+    cols = last_bucket - first_bucket + 1
+    present = {label for label, _ in cells}
+    labels = [label for label in dict.fromkeys(labels) if label in present]
+
+    values = [None] * (len(labels) * cols)
+    row_index = {label: i for i, label in enumerate(labels)}
+    for (label, b), pa_rate in cells.items():
+        values[row_index[label] * cols + (b - first_bucket)] = round(pa_rate, 2)
+
+    # Clip the color scale at the 95th percentile of |p.a.| so a few outliers
+    # don't wash out the rest of the map.
+    magnitudes = sorted(abs(v) for v in values if v is not None)
+    scale = magnitudes[min(len(magnitudes) - 1, int(len(magnitudes) * 0.95))] or 1
+
+    return {
+        "bucket": bucket,
+        "bucket_ms": bucket_ms,
+        "start": first_bucket * bucket_ms,
+        "rows": len(labels),
+        "cols": cols,
+        "labels": labels,
+        "values": values,
+        "scale": scale,
+    }
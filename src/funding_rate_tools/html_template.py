@@ -1,25 +1,40 @@
+import os
+import tempfile
+from datetime import datetime, timezone
+from io import StringIO
 from json import dumps
+from .assets import cdn_assets_html
+from .series import FundingSeries
 
-def get_html_content(pairs_data: list[dict]) -> str:
-    """
-    Generates an interactive HTML dashboard with dynamic period and rolling P.A. controls.
-    Expects pairs_data list containing for each symbol:
-      symbol, current_price, pa_rate_7d, pa_rate_14d, all_rates_data (list of {time, rate}).
-    """
-    # Prepare data payload for JavaScript
-    data_js = {pair['symbol']: pair['all_rates_data'] for pair in pairs_data}
-    summaries_js = {pair['symbol']: {'current_price': pair['current_price'], 'pa7': pair['pa_rate_7d'], 'pa14': pair['pa_rate_14d']} for pair in pairs_data}
+def _predicted_html(p: dict) -> str:
+    if p.get('predicted_pa') is None:
+        return "<p>Predicted p.a.: N/A</p>"
+    next_time = datetime.fromtimestamp(p['next_funding_time'] / 1000, timezone.utc)
+    return f"<p>Predicted p.a.: {p['predicted_pa']:.2f}% (next funding {next_time:%Y-%m-%d %H:%M} UTC)</p>"
+
+def _stats_html(p: dict) -> str:
+    s = p.get('stats')
+    if not s or s['mean_pa'] is None:
+        return ""
+    since = datetime.fromtimestamp(s['first_time'] / 1000, timezone.utc)
+    return (f"<p>Since {since:%Y-%m-%d}: vol {s['stdev_pa']:.2f}%, "
+            f"p5 / median / p95 {s['p5']:.2f} / {s['median']:.2f} / {s['p95']:.2f}% p.a., "
+            f"{s['negative_pct']:.1f}% of payments negative</p>")
 
-    data_json = dumps(data_js)
-    summaries_html = ''.join([
+def _summaries_html(pairs_data: list[dict]) -> str:
+    return ''.join([
         f"<div class='summary'><h2>{p['symbol']}</h2>"
         f"<p>Price: ${p['current_price']}</p>"
         f"<p>7D p.a.: {'{:.2f}'.format(p['pa_rate_7d']) if p['pa_rate_7d'] is not None else 'N/A'}%</p>"
         f"<p>14D p.a.: {'{:.2f}'.format(p['pa_rate_14d']) if p['pa_rate_14d'] is not None else 'N/A'}%</p>"
+        f"{_predicted_html(p)}"
+        f"{_stats_html(p)}"
         f"</div>"
         for p in pairs_data
     ])
-    charts_html = ''.join([
+
+def _charts_html(pairs_data: list[dict]) -> str:
+    return ''.join([
         f"<div class='chart-container'><h3>{p['symbol']} Funding Rate & Rolling P.A.</h3>"
         f"<canvas id='chart_{i}'></canvas>"
         f"<div class='yield-input'><label>Yield (P.A. %):"
@@ -32,18 +47,136 @@ def get_html_content(pairs_data: list[dict]) -> str:
         for i, p in enumerate(pairs_data)
     ])
 
+def _write_rates_array(out, rates) -> None:
+    """Writes one symbol's rates as a JSON array without materializing the whole string."""
+    if isinstance(rates, FundingSeries):
+        rates.write_js_array(out)
+        return
+    out.write("[")
+    first = True
+    for r in rates:
+        if not first:
+            out.write(", ")
+        out.write(dumps(r))
+        first = False
+    out.write("]")
+
+def _comparisons_html(comparisons: list[dict]) -> str:
+    return ''.join([
+        f"<div class='chart-container'><h3>{c['base_asset']} Funding P.A. Across Exchanges</h3>"
+        f"<canvas id='compare_chart_{i}'></canvas></div>"
+        for i, c in enumerate(comparisons)
+    ])
+
+def write_html_content(out, pairs_data: list[dict], assets_html: str | None = None, comparisons: list[dict] | None = None) -> None:
+    """
+    Streams the interactive HTML dashboard into the text stream `out`.
+    Expects the same pairs_data as get_html_content, except that all_rates_data
+    may also be a FundingSeries, or a zero-argument callable returning either;
+    it is called only when that symbol's data section is written, so at most one
+    symbol's history needs to be held in memory at a time.
+    assets_html replaces the CDN tags for Chart.js/flatpickr (e.g. inlined copies).
+    comparisons is an optional list of {base_asset, data}, rendered as overlay charts,
+    where data is {times, series: {label: values}} with several venues (and their
+    spreads) on one grid, or a zero-argument callable returning it that is called
+    when that comparison is written, like all_rates_data.
+    """
+    comparisons = comparisons or []
+    out.write(_PAGE_HEAD)
+    out.write(assets_html if assets_html is not None else cdn_assets_html())
+    out.write(_PAGE_HEAD_SCRIPTS)
+    out.write(_summaries_html(pairs_data))
+    out.write(_PAGE_CHARTS)
+    out.write(_charts_html(pairs_data))
+    out.write(_comparisons_html(comparisons))
+    out.write(_PAGE_SCRIPT)
+
+    out.write("            const fundingData = {};\n")
+    for pair in pairs_data:
+        rates = pair['all_rates_data']
+        if callable(rates):
+            rates = rates()
+        out.write(f"            fundingData[{dumps(pair['symbol'])}] = ")
+        _write_rates_array(out, rates)
+        out.write(";\n")
+        del rates
+
     # Create symbol to index mapping for JavaScript
     symbol_to_index = {p['symbol']: i for i, p in enumerate(pairs_data)}
+    out.write("            const comparisonData = [];\n")
+    for comparison in comparisons:
+        data = comparison['data']
+        if callable(data):
+            data = data()
+        out.write("            comparisonData.push(" + dumps({"base_asset": comparison['base_asset'], **data}) + ");\n")
+        del data
+    out.write("            const fundingIntervals = " + dumps({p['symbol']: p['interval_hours'] for p in pairs_data}) + ";\n")
+    out.write("            const symbolToIndex = " + dumps(symbol_to_index))
+    out.write(_PAGE_TAIL)
+
+def get_html_content(pairs_data: list[dict], assets_html: str | None = None, comparisons: list[dict] | None = None) -> str:
+    """
+    Generates an interactive HTML dashboard with dynamic period and rolling P.A. controls.
+    Expects pairs_data list containing for each symbol:
+      symbol, current_price, pa_rate_7d, pa_rate_14d, all_rates_data (list of {time, rate} or a FundingSeries),
+      and optionally predicted_pa, next_funding_time and stats (a stats.get_stats summary).
+    """
+    buf = StringIO()
+    write_html_content(buf, pairs_data, assets_html, comparisons)
+    return buf.getvalue()
 
-    return """
+def _write_atomically(path: str, write) -> None:
+    """
+    Calls write(f) on a temporary file next to `path` and atomically renames it
+    into place, so a failed run never leaves a truncated page. mkstemp creates the
+    file 0600, so it is given the permissions a plain open() would have before the
+    rename, keeping the page readable by a web server as it was before.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=".dashboard-", suffix=".html.tmp", dir=directory)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            write(f)
+        umask = os.umask(0)
+        os.umask(umask)
+        os.chmod(tmp_path, 0o666 & ~umask)
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+        raise
+
+def write_html_file(path: str, pairs_data: list[dict], assets_html: str | None = None, comparisons: list[dict] | None = None) -> None:
+    """Streams the dashboard to `path`, replacing any existing file atomically."""
+    _write_atomically(path, lambda f: write_html_content(f, pairs_data, assets_html, comparisons))
+
+def write_heatmap_content(out, heatmap: dict) -> None:
+    """
+    Writes the heatmap page for a matrix produced by heatmap.compute_heatmap.
+    The matrix is embedded once as a flat array and drawn on a single canvas.
+    """
+    out.write(_HEATMAP_HEAD)
+    out.write(f"{heatmap['bucket'].capitalize()} buckets, {heatmap['rows']} symbols x {heatmap['cols']} buckets")
+    out.write(_HEATMAP_BODY)
+    out.write("        const heatmap = " + dumps(heatmap) + ";")
+    out.write(_HEATMAP_TAIL)
+
+def write_heatmap_file(path: str, heatmap: dict) -> None:
+    """Writes the heatmap page to `path`, replacing any existing file atomically."""
+    _write_atomically(path, lambda f: write_heatmap_content(f, heatmap))
+
+_PAGE_HEAD = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
         <meta charset="UTF-8">
         <meta name="viewport" content="width=device-width, initial-scale=1.0">
         <title>Funding Rate Dashboard</title>
-        <script src="https://cdn.jsdelivr.net/npm/chart.js"></script>
-        <script src="https://cdn.jsdelivr.net/npm/chartjs-adapter-date-fns/dist/chartjs-adapter-date-fns.bundle.min.js"></script>
+        """
+
+_PAGE_HEAD_SCRIPTS = """
         <script>
             Chart.register({
                 id: 'zeroLine',
@@ -62,8 +195,6 @@ def get_html_content(pairs_data: list[dict]) -> str:
                 }
             });
         </script>
-        <link rel="stylesheet" href="https://cdn.jsdelivr.net/npm/flatpickr/dist/flatpickr.min.css">
-        <script src="https://cdn.jsdelivr.net/npm/flatpickr"></script>
         <style>
             body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f4f4f4; color: #333; }
             header { background-color: #0b1e35; color: white; padding: 15px 0; text-align: center; margin-bottom: 20px; }
@@ -166,18 +297,22 @@ def get_html_content(pairs_data: list[dict]) -> str:
                 </label>
             </div>
             <div class="summaries-container">
-                """ + summaries_html + """
+                """
+
+_PAGE_CHARTS = """
             </div>
         </header>
         <div class="container">
             <div class="charts-grid">
-                """ + charts_html + """
+                """
+
+_PAGE_SCRIPT = """
             </div>
         </div>
         <script>
-            const fundingData = """ + data_json + """;
-            const fundingIntervals = """ + dumps({p['symbol']: p['interval_hours'] for p in pairs_data}) + """;
-            const symbolToIndex = """ + dumps(symbol_to_index) + """;
+"""
+
+_PAGE_TAIL = """;
             const periodSelect = document.getElementById('periodSelect');
             const paWindowSelect = document.getElementById('paWindowSelect');
             const showFundingRateCheckbox = document.getElementById('showFundingRate');
@@ -186,32 +321,25 @@ def get_html_content(pairs_data: list[dict]) -> str:
             const showInstantCheckbox = document.getElementById('showInstantNetPa');
             let yieldInputs = [];
             const charts = [];
+            const compareCharts = [];
+
+            // Each payment is weighted by the hours it accrued over (d.hours, inferred
+            // when stored), falling back to the symbol's current interval.
+            const HOURS_PER_YEAR = 24 * 365;
 
             function calculateHedgedYieldPaSeries(data, yieldPa, interval) {
                 if (!data.length || isNaN(yieldPa)) return [];
-                const intervalsPerDay = 24 / interval;
-                const annualFactor = intervalsPerDay * 365;
-                const perInterval = (yieldPa/100) / annualFactor;
-                let sum = 0;
-                return data.map((d, i) => {
-                    sum += perInterval + d.rate;
-                    const avg = sum/(i+1);
-                    return { x: d.time, y: avg * annualFactor * 100 };
+                let sum = 0, hours = 0;
+                return data.map(d => {
+                    sum += d.rate;
+                    hours += d.hours || interval;
+                    return { x: d.time, y: yieldPa + sum / hours * HOURS_PER_YEAR * 100 };
                 });
             }
 
             function calculateInstantHedgedPaSeries(data, yieldPa, interval, windowDays) {
                 if (!data.length || isNaN(yieldPa)) return [];
-                const intervalsPerDay = 24/interval;
-                const yieldPerInterval = (yieldPa/100)/(intervalsPerDay*365);
-                const factor = intervalsPerDay * 365 * 100;
-                return data.map(d => {
-                    const start = d.time - windowDays*24*60*60*1000;
-                    const windowData = data.filter(x => x.time>=start && x.time<=d.time);
-                    const sum = windowData.reduce((acc,x)=>acc + x.rate + yieldPerInterval, 0);
-                    const avg = windowData.length ? sum/windowData.length : 0;
-                    return { x: d.time, y: avg * factor };
-                });
+                return calculatePaSeries(data, windowDays, interval).map(p => ({ x: p.x, y: p.y + yieldPa }));
             }
 
             function filterData(data, days) {
@@ -223,15 +351,13 @@ def get_html_content(pairs_data: list[dict]) -> str:
 
             function calculatePaSeries(data, windowDays, interval) {
                 const result = [];
-                const intervalsPerDay = 24 / interval;
-                const factor = intervalsPerDay * 365 * 100;
                 for (let i = 0; i < data.length; i++) {
                     const end = data[i].time;
                     const start = end - windowDays * 24 * 60 * 60 * 1000;
                     const windowData = data.filter(d => d.time >= start && d.time <= end);
                     const sum = windowData.reduce((acc, d) => acc + d.rate, 0);
-                    const avg = windowData.length ? sum / windowData.length : 0;
-                    result.push({ x: end, y: avg * factor });
+                    const hours = windowData.reduce((acc, d) => acc + (d.hours || interval), 0);
+                    result.push({ x: end, y: hours ? sum / hours * HOURS_PER_YEAR * 100 : 0 });
                 }
                 return result;
             }
@@ -373,6 +499,61 @@ def get_html_content(pairs_data: list[dict]) -> str:
                         });
                     }
                 });
+                createOrUpdateComparisonCharts(periodDays, customRange, paWindow);
+            }
+
+            // Rolling mean over the aligned cross-venue p.a. values (nulls are skipped).
+            function rollingMean(times, values, windowDays) {
+                const windowMs = windowDays * 24 * 60 * 60 * 1000;
+                const result = [];
+                let sum = 0, count = 0, start = 0;
+                for (let i = 0; i < times.length; i++) {
+                    if (values[i] !== null) { sum += values[i]; count++; }
+                    while (times[start] < times[i] - windowMs) {
+                        if (values[start] !== null) { sum -= values[start]; count--; }
+                        start++;
+                    }
+                    result.push(values[i] === null ? null : { x: times[i], y: count ? sum / count : 0 });
+                }
+                return result.filter(p => p !== null);
+            }
+
+            function createOrUpdateComparisonCharts(periodDays, customRange, paWindow) {
+                const venueColors = ['rgb(255,159,64)', 'rgb(75,192,192)', 'rgb(153,102,255)', 'rgb(255,99,132)'];
+                comparisonData.forEach((cmp, idx) => {
+                    let lo = -Infinity, hi = Infinity;
+                    if (customRange) { lo = customRange.start; hi = customRange.end; }
+                    else if (periodDays) { lo = Date.now() - periodDays * 24 * 60 * 60 * 1000; }
+                    const datasets = Object.keys(cmp.series).map((venue, vIdx) => ({
+                        label: cmp.base_asset + ' ' + venue + ' P.A. %',
+                        data: rollingMean(cmp.times, cmp.series[venue], paWindow).filter(p => p.x >= lo && p.x <= hi),
+                        borderColor: venueColors[vIdx % venueColors.length],
+                        tension: 0.1,
+                        fill: false,
+                        spanGaps: true
+                    }));
+                    if (compareCharts[idx]) {
+                        datasets.forEach((ds, i) => { compareCharts[idx].data.datasets[i].data = ds.data; });
+                        compareCharts[idx].update();
+                    } else {
+                        const ctx = document.getElementById(`compare_chart_${idx}`).getContext('2d');
+                        compareCharts[idx] = new Chart(ctx, {
+                            type: 'line',
+                            data: { datasets },
+                            options: {
+                                responsive: true,
+                                maintainAspectRatio: true,
+                                aspectRatio: 1.75,
+                                scales: {
+                                    x: { type: 'time', time: { unit: 'day' } },
+                                    y: { type: 'linear', title: { display: true, text: '% p.a.' } }
+                                },
+                                plugins: { tooltip: { mode: 'index', intersect: false } },
+                                interaction: { mode: 'index', intersect: false }
+                            }
+                        });
+                    }
+                });
             }
 
             // Parse URL parameters and prefill yield inputs
@@ -443,3 +624,121 @@ def get_html_content(pairs_data: list[dict]) -> str:
     </body>
     </html>
     """
+
+_HEATMAP_HEAD = """
+    <!DOCTYPE html>
+    <html lang="en">
+    <head>
+        <meta charset="UTF-8">
+        <meta name="viewport" content="width=device-width, initial-scale=1.0">
+        <title>Funding Rate Heatmap</title>
+        <style>
+            body { font-family: Arial, sans-serif; margin: 0; padding: 20px; background-color: #f4f4f4; color: #333; }
+            header { background-color: #0b1e35; color: white; padding: 15px 0; text-align: center; margin-bottom: 20px; }
+            .controls { display: flex; flex-wrap: wrap; gap: 10px; justify-content: center; align-items: center; }
+            .controls input { width: 70px; padding: 5px; }
+            .heatmap-wrap { position: relative; background-color: #fff; padding: 20px; border-radius: 8px; box-shadow: 0 0 10px rgba(0,0,0,0.05); }
+            #hoverInfo { position: fixed; pointer-events: none; background: #555; color: #fff; padding: 5px 8px; border-radius: 6px; font-size: 12px; display: none; }
+            .legend { display: inline-block; width: 160px; height: 12px; background: linear-gradient(to right, rgb(215,48,39), rgb(255,255,255), rgb(26,150,65)); }
+        </style>
+    </head>
+    <body>
+        <header>
+            <h1>Funding Rate Heatmap</h1>
+            <div class="controls">
+                <span>"""
+
+_HEATMAP_BODY = """</span>
+                <label>Color scale (&plusmn;% p.a.): <input type="number" id="scaleInput"></label>
+                <span>shorts pay</span><span class="legend"></span><span>shorts paid</span>
+            </div>
+        </header>
+        <div class="heatmap-wrap">
+            <canvas id="heatmap"></canvas>
+        </div>
+        <div id="hoverInfo"></div>
+        <script>
+"""
+
+_HEATMAP_TAIL = """
+            (function() {
+                const LABEL_W = 160, AXIS_H = 24;
+                const canvas = document.getElementById('heatmap');
+                const info = document.getElementById('hoverInfo');
+                const scaleInput = document.getElementById('scaleInput');
+                scaleInput.value = heatmap.scale.toFixed(2);
+                let cellW = 1, cellH = 1;
+
+                function color(v, scale) {
+                    if (v === null) return [230, 230, 230];
+                    const t = Math.max(-1, Math.min(1, v / scale));
+                    if (t >= 0) return [255 - t * 229, 255 - t * 105, 255 - t * 190];
+                    return [255 + t * 40, 255 + t * 207, 255 + t * 216];
+                }
+
+                function render() {
+                    const scale = parseFloat(scaleInput.value) || heatmap.scale || 1;
+                    const { rows, cols, values } = heatmap;
+                    if (!rows || !cols) return;
+
+                    // One pixel per cell in an offscreen bitmap, scaled up with a single drawImage.
+                    const bitmap = document.createElement('canvas');
+                    bitmap.width = cols;
+                    bitmap.height = rows;
+                    const bctx = bitmap.getContext('2d');
+                    const img = bctx.createImageData(cols, rows);
+                    for (let i = 0; i < values.length; i++) {
+                        const [r, g, b] = color(values[i], scale);
+                        img.data[i * 4] = r;
+                        img.data[i * 4 + 1] = g;
+                        img.data[i * 4 + 2] = b;
+                        img.data[i * 4 + 3] = 255;
+                    }
+                    bctx.putImageData(img, 0, 0);
+
+                    const width = Math.max(600, canvas.parentElement.clientWidth - 40);
+                    cellW = (width - LABEL_W) / cols;
+                    cellH = rows <= 150 ? 14 : 8;
+                    canvas.width = width;
+                    canvas.height = AXIS_H + rows * cellH;
+                    const ctx = canvas.getContext('2d');
+                    ctx.imageSmoothingEnabled = false;
+                    ctx.drawImage(bitmap, LABEL_W, AXIS_H, cols * cellW, rows * cellH);
+
+                    ctx.fillStyle = '#333';
+                    ctx.font = (cellH - 2) + 'px Arial';
+                    ctx.textBaseline = 'middle';
+                    heatmap.labels.forEach((label, r) => ctx.fillText(label, 4, AXIS_H + r * cellH + cellH / 2));
+
+                    ctx.font = '11px Arial';
+                    const step = Math.max(1, Math.ceil(90 / cellW));
+                    for (let c = 0; c < cols; c += step) {
+                        const day = new Date(heatmap.start + c * heatmap.bucket_ms).toISOString().slice(0, 10);
+                        ctx.fillText(day, LABEL_W + c * cellW, AXIS_H / 2);
+                    }
+                }
+
+                canvas.addEventListener('mousemove', e => {
+                    const rect = canvas.getBoundingClientRect();
+                    const c = Math.floor((e.clientX - rect.left - LABEL_W) / cellW);
+                    const r = Math.floor((e.clientY - rect.top - AXIS_H) / cellH);
+                    if (c < 0 || r < 0 || c >= heatmap.cols || r >= heatmap.rows) {
+                        info.style.display = 'none';
+                        return;
+                    }
+                    const v = heatmap.values[r * heatmap.cols + c];
+                    const day = new Date(heatmap.start + c * heatmap.bucket_ms).toISOString().slice(0, 10);
+                    info.textContent = heatmap.labels[r] + ' ' + day + ': ' + (v === null ? 'N/A' : v.toFixed(2) + '% p.a.');
+                    info.style.left = (e.clientX + 12) + 'px';
+                    info.style.top = (e.clientY + 12) + 'px';
+                    info.style.display = 'block';
+                });
+                canvas.addEventListener('mouseleave', () => { info.style.display = 'none'; });
+                scaleInput.addEventListener('input', render);
+                window.addEventListener('resize', render);
+                render();
+            })();
+        </script>
+    </body>
+    </html>
+    """
@@ -0,0 +1,104 @@
+import threading
+import time
+from urllib.parse import urlsplit
+import requests
+from requests.adapters import HTTPAdapter
+
+from . import metrics, profiling
+
+POOL_SIZE = 32
+# Responses that mean "slow down": retried after Retry-After (or a backoff) up to MAX_RETRIES times.
+RETRY_STATUSES = (418, 429)
+MAX_RETRIES = 3
+MAX_RETRY_WAIT_S = 30.0
+
+class RateLimiter:
+    """Thread-safe token bucket allowing `rate` requests per second with bursts up to `burst`."""
+
+    def __init__(self, rate: float, burst: int | None = None):
+        self.rate = rate
+        self.capacity = burst or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a request may be sent. Returns the time spent waiting, in seconds."""
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+            waited += wait
+
+_session = None
+_session_lock = threading.Lock()
+_rate_limiters: dict[str, RateLimiter] = {}
+
+def get_session() -> requests.Session:
+    """Returns the process-wide session, so all API calls share one connection pool."""
+    global _session
+    with _session_lock:
+        if _session is None:
+            _session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=POOL_SIZE, pool_maxsize=POOL_SIZE)
+            _session.mount("https://", adapter)
+            _session.mount("http://", adapter)
+        return _session
+
+def set_rate_limit(url: str, rate: float, burst: int | None = None):
+    """Limits requests to the host of `url` to `rate` per second (shared by all threads)."""
+    _rate_limiters[urlsplit(url).netloc] = RateLimiter(rate, burst)
+
+def _throttle(url: str):
+    limiter = _rate_limiters.get(urlsplit(url).netloc)
+    if limiter:
+        waited = limiter.acquire()
+        if waited:
+            profiling.count("http.throttle_seconds", waited)
+            metrics.inc("funding_rate_limit_wait_seconds_total", waited, host=urlsplit(url).netloc)
+
+def _retry_wait(resp: requests.Response, attempt: int) -> float:
+    try:
+        wait = float(resp.headers.get("Retry-After", ""))
+    except ValueError:
+        wait = 0.5 * 2 ** attempt
+    return min(max(wait, 0.0), MAX_RETRY_WAIT_S)
+
+def _request(method: str, url: str, **kwargs) -> requests.Response:
+    parts = urlsplit(url)
+    endpoint = f"{method} {parts.path}"
+    for attempt in range(MAX_RETRIES + 1):
+        _throttle(url)
+        t0 = time.perf_counter()
+        try:
+            with profiling.span(f"http {endpoint}"):
+                resp = get_session().request(method, url, **kwargs)
+        except requests.RequestException:
+            metrics.inc("funding_http_requests_total", endpoint=endpoint, status="error")
+            raise
+        finally:
+            metrics.observe("funding_http_request_duration_seconds", time.perf_counter() - t0, endpoint=endpoint)
+        metrics.inc("funding_http_requests_total", endpoint=endpoint, status=str(resp.status_code))
+        profiling.count("http.requests")
+        if profiling.is_enabled():
+            profiling.count("http.bytes", len(resp.content))
+        if resp.status_code not in RETRY_STATUSES or attempt == MAX_RETRIES:
+            return resp
+        wait = _retry_wait(resp, attempt)
+        profiling.count("http.retries")
+        metrics.inc("funding_http_retries_total", endpoint=endpoint)
+        metrics.inc("funding_rate_limit_wait_seconds_total", wait, host=parts.netloc)
+        profiling.sleep(wait)
+
+def get(url: str, **kwargs) -> requests.Response:
+    return _request("GET", url, **kwargs)
+
+def post(url: str, **kwargs) -> requests.Response:
+    return _request("POST", url, **kwargs)
@@ -1,77 +1,68 @@
-import requests
 import time
+from . import http_client
+from .config import HYPERLIQUID_URL
+from .utils import base_asset
 
-HYPERLIQUID_URL = "https://api.hyperliquid.xyz/info"
+# Hyperliquid settles funding every hour for all perps.
+FUNDING_INTERVAL_HOURS = 1
+MAX_RESULTS_PER_REQUEST = 500
 
 def _hl_coin_from_symbol(symbol: str) -> str:
     """
     Hyperliquid expects base coin tickers (e.g., BTC, ETH), not Binance-style pairs like BTCUSDT.
     Map common symbols by stripping stable-coin suffixes if present.
     """
-    s = symbol.upper()
-    for suffix in ("USDT", "USD", "USDC"):
-        if s.endswith(suffix):
-            return s[: -len(suffix)]
-    return s
+    # Coins quoted in thousands keep Hyperliquid's lowercase "k" prefix (e.g. kPEPE).
+    if symbol[:1] == "k" and symbol[1:2].isupper():
+        return "k" + base_asset(symbol[1:])
+    return base_asset(symbol)
 
-def fetch_funding_rate_history(symbol: str, start_time_ms: int | None = None) -> list[dict]:
+def _symbol_from_hl_coin(coin: str) -> str:
     """
-    Fetches historical funding rates for a symbol from Hyperliquid.
-    Returns list of {'fundingTime': ..., 'fundingRate': ...}.
+    Maps a Hyperliquid coin name back to the BTCUSDT-style symbol funding rates are
+    stored under, so listings land on the same rows as --symbols BTCUSDT does.
     """
-    all_rates = []
-    current_start = start_time_ms or 0
-    coin = _hl_coin_from_symbol(symbol)
-
-    while True:
-        # Hyperliquid requires startTime in payload; include it even when 0
-        payload = {"type": "fundingHistory", "coin": coin, "startTime": current_start}
-
-        try:
-            resp = requests.post(
-                HYPERLIQUID_URL,
-                json=payload,
-                headers={"Content-Type": "application/json"},
-                timeout=10
-            )
-            resp.raise_for_status()
-            data = resp.json()  # list of dicts
-        except requests.RequestException:
-            return all_rates
-
-        if not data:
-            break
+    return coin + "USDT"
 
-        for item in data:
-            all_rates.append({
-                "fundingTime": int(item["time"]),
-                "fundingRate": float(item["fundingRate"])
-            })
-
-        current_start = data[-1]["time"] + 1
-        time.sleep(0.2)
-
-    return all_rates
+def fetch_funding_rate_page(symbol: str, start_time_ms: int | None = None, end_time_ms: int | None = None) -> list[dict]:
+    """
+    One fundingHistory request: up to MAX_RESULTS_PER_REQUEST rates with
+    start_time_ms <= fundingTime <= end_time_ms, oldest first.
+    Raises requests.RequestException on failure.
+    """
+    # Hyperliquid requires startTime in payload; include it even when 0
+    payload = {"type": "fundingHistory", "coin": _hl_coin_from_symbol(symbol), "startTime": start_time_ms or 0}
+    if end_time_ms is not None:
+        payload["endTime"] = end_time_ms
+    resp = http_client.post(
+        HYPERLIQUID_URL,
+        json=payload,
+        headers={"Content-Type": "application/json"},
+        timeout=10
+    )
+    resp.raise_for_status()
+    return [
+        {"fundingTime": int(item["time"]), "fundingRate": float(item["fundingRate"])}
+        for item in resp.json() or []
+    ]
 
 def fetch_funding_info(symbol: str) -> int | None:
     """
     Infers Hyperliquid funding interval (in hours) by sampling recent funding history.
-    Returns None if it cannot be determined.
+    Returns None if it cannot be determined, e.g. for an unknown coin.
+    Raises requests.RequestException on failure.
     """
     coin = _hl_coin_from_symbol(symbol)
     now_ms = int(time.time() * 1000)
     start_ms = now_ms - 48 * 3600 * 1000  # last ~2 days
-    try:
-        resp = requests.post(
-            HYPERLIQUID_URL,
-            json={"type": "fundingHistory", "coin": coin, "startTime": start_ms},
-            headers={"Content-Type": "application/json"},
-            timeout=10,
-        )
-        resp.raise_for_status()
-        data = resp.json() or []
-    except requests.RequestException:
-        return None
+    resp = http_client.post(
+        HYPERLIQUID_URL,
+        json={"type": "fundingHistory", "coin": coin, "startTime": start_ms},
+        headers={"Content-Type": "application/json"},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    data = resp.json() or []
 
     if len(data) < 2:
         return None
@@ -90,3 +81,49 @@ def fetch_funding_info(symbol: str) -> int | None:
     delta_ms, _ = Counter(deltas).most_common(1)[0]
     hours = round(delta_ms / (3600 * 1000))
     return hours if hours > 0 else None
+
+def fetch_all_funding_info() -> dict[str, int]:
+    """
+    Lists every listed Hyperliquid perp with its funding interval using a single
+    meta request, keyed by BTCUSDT-style symbol rather than coin name.
+    Raises requests.RequestException or ValueError on failure.
+    """
+    resp = http_client.post(
+        HYPERLIQUID_URL,
+        json={"type": "meta"},
+        headers={"Content-Type": "application/json"},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    universe = resp.json().get("universe", [])
+    return {
+        _symbol_from_hl_coin(asset["name"]): FUNDING_INTERVAL_HOURS
+        for asset in universe if asset.get("name") and not asset.get("isDelisted")
+    }
+
+def fetch_predicted_funding() -> dict[str, dict]:
+    """
+    The current (predicted) funding rate of every listed perp in one metaAndAssetCtxs
+    request, keyed by coin: {coin: {'fundingRate', 'nextFundingTime', 'markPrice'}}.
+    Hyperliquid settles on the hour, so nextFundingTime is the next full hour.
+    Raises requests.RequestException on failure.
+    """
+    resp = http_client.post(
+        HYPERLIQUID_URL,
+        json={"type": "metaAndAssetCtxs"},
+        headers={"Content-Type": "application/json"},
+        timeout=10,
+    )
+    resp.raise_for_status()
+    meta, ctxs = resp.json()
+    step = FUNDING_INTERVAL_HOURS * 3600 * 1000
+    next_funding_time = int(time.time() * 1000) // step * step + step
+    return {
+        asset["name"]: {
+            "fundingRate": float(ctx["funding"]),
+            "nextFundingTime": next_funding_time,
+            "markPrice": float(ctx["markPx"]) if ctx.get("markPx") else None,
+        }
+        for asset, ctx in zip(meta.get("universe", []), ctxs)
+        if asset.get("name") and not asset.get("isDelisted") and ctx.get("funding") is not None
+    }
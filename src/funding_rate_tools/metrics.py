@@ -0,0 +1,173 @@
+import os
+import sys
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import config
+
+# Process-wide ingestion metrics in Prometheus text format. One-shot tools write them
+# to <metrics dir>/<tool>.prom when they finish (for node_exporter's textfile
+# collector); funding-daemon also serves them over HTTP. Every sample carries a
+# tool label, so the files of different tools never clash.
+HTTP_BUCKETS_S = (0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+METRICS = {
+    "funding_last_funding_time_seconds": ("gauge", "Newest stored funding_time per symbol, as a Unix timestamp."),
+    "funding_last_funding_time_lag_seconds": ("gauge", "Seconds between the newest stored funding_time and now."),
+    "funding_rows_ingested_total": ("counter", "Funding rates newly stored in the database."),
+    "funding_fetch_errors_total": ("counter", "Symbol refreshes or backfills that failed."),
+    "funding_http_requests_total": ("counter", "HTTP requests to exchange APIs by response status."),
+    "funding_http_retries_total": ("counter", "HTTP requests retried after a 429 or 418 response."),
+    "funding_http_request_duration_seconds": ("histogram", "Latency of HTTP requests to exchange APIs."),
+    "funding_rate_limit_wait_seconds_total": ("counter", "Time spent waiting on rate limits and Retry-After."),
+    "funding_run_start_timestamp_seconds": ("gauge", "When this run started, as a Unix timestamp."),
+    "funding_run_duration_seconds": ("gauge", "How long this run has taken so far."),
+}
+
+_lock = threading.Lock()
+_tool = "funding-tools"
+_started = time.time()
+_counters = {}
+_histograms = {}
+# (source, symbol) pairs refreshed by this process; their freshness is reported.
+_tracked = set()
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+def inc(name: str, value: float = 1, **labels):
+    with _lock:
+        key = _key(name, labels)
+        _counters[key] = _counters.get(key, 0) + value
+
+def observe(name: str, value: float, **labels):
+    """Adds an observation to a histogram with HTTP_BUCKETS_S buckets."""
+    with _lock:
+        key = _key(name, labels)
+        entry = _histograms.get(key)
+        if entry is None:
+            entry = _histograms[key] = [[0] * (len(HTTP_BUCKETS_S) + 1), 0.0, 0]
+        entry[0][bisect_left(HTTP_BUCKETS_S, value)] += 1
+        entry[1] += value
+        entry[2] += 1
+
+def track(source: str, symbol: str):
+    with _lock:
+        _tracked.add((source, symbol))
+
+def record_stored(source: str, symbol: str, rows: int):
+    track(source, symbol)
+    if rows:
+        inc("funding_rows_ingested_total", rows, source=source, symbol=symbol)
+
+def record_error(source: str, symbol: str):
+    track(source, symbol)
+    inc("funding_fetch_errors_total", source=source, symbol=symbol)
+
+def _freshness(now_s: float) -> list[tuple]:
+    from .database import get_last_funding_times
+    with _lock:
+        tracked = sorted(_tracked)
+    samples = []
+    for source in sorted({source for source, _ in tracked}):
+        try:
+            last_times = get_last_funding_times(source)
+        except Exception:
+            continue  # No database yet; freshness is simply not reported.
+        for src, symbol in tracked:
+            if src == source and symbol in last_times:
+                labels = {"source": source, "symbol": symbol}
+                samples.append(("funding_last_funding_time_seconds", labels, last_times[symbol] / 1000))
+                samples.append(("funding_last_funding_time_lag_seconds", labels, round(max(0.0, now_s - last_times[symbol] / 1000), 3)))
+    return samples
+
+def _format_labels(labels) -> str:
+    pairs = [("tool", _tool)] + list(labels)
+    escaped = (str(v).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"') for _, v in pairs)
+    return "{" + ",".join(f'{k}="{v}"' for (k, _), v in zip(pairs, escaped)) + "}"
+
+def _format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render() -> str:
+    """All metrics of this process in Prometheus text exposition format."""
+    now_s = time.time()
+    samples = {name: [] for name in METRICS}
+    for name, labels, value in _freshness(now_s):
+        samples[name].append(f"{name}{_format_labels(labels.items())} {_format_value(value)}")
+    samples["funding_run_start_timestamp_seconds"].append(f"funding_run_start_timestamp_seconds{_format_labels(())} {_format_value(round(_started, 3))}")
+    samples["funding_run_duration_seconds"].append(f"funding_run_duration_seconds{_format_labels(())} {_format_value(round(now_s - _started, 3))}")
+
+    with _lock:
+        for (name, labels), value in sorted(_counters.items()):
+            samples[name].append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for (name, labels), (buckets, total, count) in sorted(_histograms.items()):
+            cumulative = 0
+            for bound, n in zip(HTTP_BUCKETS_S + (float("inf"),), buckets):
+                cumulative += n
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                samples[name].append(f"{name}_bucket{_format_labels(labels + (('le', le),))} {cumulative}")
+            samples[name].append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+            samples[name].append(f"{name}_count{_format_labels(labels)} {count}")
+
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        if samples[name]:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+            lines.extend(samples[name])
+    return "\n".join(lines) + "\n"
+
+def metrics_path() -> str:
+    return os.path.join(config.METRICS_DIR, f"{_tool}.prom")
+
+def write_file(path: str | None = None) -> str | None:
+    """Atomically writes render() to `path` (default: metrics_path()). Returns the path, or None if disabled."""
+    if not config.METRICS_ENABLED:
+        return None
+    path = path or metrics_path()
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        f.write(render())
+    os.replace(tmp, path)
+    return path
+
+@contextmanager
+def run(tool: str):
+    """Names this process's metrics after `tool` and writes the metrics file on the way out, also after sys.exit()."""
+    global _tool, _started
+    _tool = tool
+    _started = time.time()
+    try:
+        yield
+    finally:
+        try:
+            write_file()
+        except OSError as e:
+            print(f"Warning: Could not write metrics file: {e}", file=sys.stderr)
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    """Serves /metrics on a background thread and returns the server; local-only unless `host` says otherwise."""
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,398 @@
+import argparse
+import json
+import random
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+from .utils import base_asset
+
+HOUR_MS = 60 * 60 * 1000
+DAY_MS = 24 * HOUR_MS
+MINUTE_S = 60
+
+# Real per-request page caps of each venue; --page-limit can only lower them.
+PAGE_LIMITS = {"binance": 1000, "bybit": 200, "hyperliquid": 500}
+# Funding intervals (hours) of the synthetic symbols, cycled per symbol.
+SYNTHETIC_INTERVALS = {"binance": [8, 8, 8, 4], "bybit": [8, 4, 8, 1], "hyperliquid": [1]}
+
+class MockMarket:
+    """
+    Deterministic synthetic market shared by the three venues: a fixed symbol list,
+    per-venue funding intervals, and rates derived from a hash of (venue, symbol,
+    time), so every request for the same settlement returns the same value.
+    Funding times sit on multiples of the interval and run up to the current time.
+    """
+
+    def __init__(self, synthetic_symbols: int = 20, days: int = 365, seed: int = 0):
+        self.days = days
+        self.seed = seed
+        self.symbols = ["BTCUSDT", "ETHUSDT"] + [f"SYN{n:04d}USDT" for n in range(synthetic_symbols)]
+        self.intervals = {venue: {} for venue in SYNTHETIC_INTERVALS}
+        for venue, cycle in SYNTHETIC_INTERVALS.items():
+            for n, symbol in enumerate(self.symbols):
+                # BTC and ETH keep the venues' standard intervals.
+                self.intervals[venue][symbol] = (1 if venue == "hyperliquid" else 8) if n < 2 else cycle[n % len(cycle)]
+        self.coins = {base_asset(s): s for s in self.symbols}
+
+    def rate(self, venue: str, symbol: str, t: int) -> float:
+        h = zlib.crc32(f"{self.seed}:{venue}:{symbol}:{t}".encode())
+        # Between -0.008% and +0.012% per interval, scaled to the interval length.
+        return ((h % 20001) - 8000) / 1e8 * self.intervals[venue][symbol] / 8
+
+    def price(self, symbol: str) -> float:
+        return 10 + zlib.crc32(symbol.encode()) % 100000 / 10
+
+    def funding_times(self, venue: str, symbol: str, start_ms: int | None, end_ms: int | None,
+                      limit: int, newest_first: bool = False) -> list[int]:
+        """Settlement times in [start_ms, end_ms], at most `limit`, oldest (or newest) first."""
+        step = self.intervals[venue][symbol] * HOUR_MS
+        now_ms = int(time.time() * 1000)
+        first = (now_ms - self.days * DAY_MS) // step * step + step
+        last = now_ms // step * step
+        lo = max(first, -(-start_ms // step) * step) if start_ms is not None else first
+        hi = min(last, end_ms // step * step) if end_ms is not None else last
+        if hi < lo:
+            return []
+        if newest_first or start_ms is None:
+            times = list(range(hi, max(lo, hi - (limit - 1) * step) - 1, -step))
+            return times if newest_first else times[::-1]
+        return list(range(lo, min(hi, lo + (limit - 1) * step) + 1, step))
+
+    def next_funding_time(self, venue: str, symbol: str) -> int:
+        step = self.intervals[venue][symbol] * HOUR_MS
+        return int(time.time() * 1000) // step * step + step
+
+class _Limiter:
+    """Fixed one-minute request windows per venue, for rate-limit headers and 429s."""
+
+    def __init__(self, per_minute: int | None):
+        self.per_minute = per_minute
+        self.lock = threading.Lock()
+        self.windows = {}
+
+    def hit(self, venue: str) -> tuple[int, int]:
+        """Counts a request; returns (requests used in this window, seconds until it resets)."""
+        now = time.time()
+        window = int(now // MINUTE_S)
+        with self.lock:
+            start, count = self.windows.get(venue, (window, 0))
+            count = count + 1 if start == window else 1
+            self.windows[venue] = (window, count)
+        return count, int((window + 1) * MINUTE_S - now) + 1
+
+class MockExchangeHandler(BaseHTTPRequestHandler):
+    server_version = "FundingMockExchange/1.0"
+
+    def log_message(self, format, *args):
+        if self.server.options["verbose"]:
+            super().log_message(format, *args)
+
+    # --- plumbing -------------------------------------------------------------
+
+    def _send(self, status: int, body, headers: dict | None = None):
+        payload = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, str(value))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _admit(self, venue: str) -> dict | None:
+        """Applies latency, rate limits and 429 injection. Returns headers, or None if a 429 was sent."""
+        options = self.server.options
+        self.server.count(venue, urlsplit(self.path).path)
+        latency = options["latency_ms"] + (options["rng"].uniform(0, options["jitter_ms"]) if options["jitter_ms"] else 0)
+        if latency:
+            time.sleep(latency / 1000)
+
+        used, reset_s = self.server.limiter.hit(venue)
+        limit = options["rate_limit"]
+        if venue == "binance":
+            headers = {"X-MBX-USED-WEIGHT-1M": used}
+        elif venue == "bybit":
+            headers = {
+                "X-Bapi-Limit": limit or 600,
+                "X-Bapi-Limit-Status": max(0, (limit or 600) - used),
+                "X-Bapi-Limit-Reset-Timestamp": int(time.time() * 1000) + reset_s * 1000,
+            }
+        else:
+            headers = {}
+
+        if limit and used > limit:
+            self.server.count(venue, "429")
+            self._send(429, {"code": -1003, "msg": "Too many requests."}, {**headers, "Retry-After": reset_s})
+            return None
+        if options["error_rate"] and options["rng"].random() < options["error_rate"]:
+            self.server.count(venue, "429")
+            self._send(429, {"code": -1003, "msg": "Too many requests (injected)."}, {**headers, "Retry-After": 1})
+            return None
+        return headers
+
+    def _page_limit(self, venue: str, requested) -> int:
+        cap = PAGE_LIMITS[venue]
+        if self.server.options["page_limit"]:
+            cap = min(cap, self.server.options["page_limit"])
+        try:
+            return max(1, min(cap, int(requested))) if requested else cap
+        except ValueError:
+            return cap
+
+    # --- routing ----------------------------------------------------------------
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/mock/stats":
+            return self._send(200, self.server.stats())
+        if url.path == "/mock/webhook":
+            return self._send(200, self.server.webhooks())
+        if url.path.startswith("/fapi/"):
+            headers = self._admit("binance")
+            if headers is not None:
+                self._binance(url.path, query, headers)
+        elif url.path.startswith("/v5/"):
+            headers = self._admit("bybit")
+            if headers is not None:
+                self._bybit(url.path, query, headers)
+        else:
+            self._send(404, {"msg": f"Unknown endpoint {url.path}"})
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        if url.path not in ("/info", "/mock/webhook"):
+            return self._send(404, {"msg": f"Unknown endpoint {url.path}"})
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            return self._send(400, {"error": "Invalid JSON body"})
+        if url.path == "/mock/webhook":
+            # Stand-in alert receiver: keeps what was posted, GET returns it.
+            self.server.record_webhook(body)
+            return self._send(200, {"ok": True})
+        headers = self._admit("hyperliquid")
+        if headers is not None:
+            self._hyperliquid(body, headers)
+
+    # --- venues -----------------------------------------------------------------
+
+    def _binance(self, path: str, query: dict, headers: dict):
+        market = self.server.market
+        symbol = query.get("symbol", "").upper()
+        known = symbol in market.intervals["binance"]
+        if path == "/fapi/v1/fundingRate":
+            if not known:
+                return self._send(400, {"code": -1121, "msg": "Invalid symbol."}, headers)
+            start = int(query["startTime"]) if "startTime" in query else None
+            end = int(query["endTime"]) if "endTime" in query else None
+            times = market.funding_times("binance", symbol, start, end, self._page_limit("binance", query.get("limit", 100)))
+            return self._send(200, [
+                {"symbol": symbol, "fundingTime": t, "fundingRate": f"{market.rate('binance', symbol, t):.8f}",
+                 "markPrice": f"{market.price(symbol):.2f}"}
+                for t in times
+            ], headers)
+        if path == "/fapi/v1/fundingInfo":
+            return self._send(200, [
+                {"symbol": s, "fundingIntervalHours": h, "adjustedFundingRateCap": "0.02", "adjustedFundingRateFloor": "-0.02"}
+                for s, h in market.intervals["binance"].items()
+            ], headers)
+        if path == "/fapi/v1/exchangeInfo":
+            return self._send(200, {"symbols": [
+                {"symbol": s, "contractType": "PERPETUAL", "status": "TRADING"} for s in market.symbols
+            ]}, headers)
+        if path == "/fapi/v1/ticker/price":
+            if not known:
+                return self._send(400, {"code": -1121, "msg": "Invalid symbol."}, headers)
+            return self._send(200, {"symbol": symbol, "price": f"{market.price(symbol):.2f}"}, headers)
+        if path == "/fapi/v1/premiumIndex":
+            symbols = [symbol] if symbol else market.symbols
+            if symbol and not known:
+                return self._send(400, {"code": -1121, "msg": "Invalid symbol."}, headers)
+            items = [{
+                "symbol": s,
+                "markPrice": f"{market.price(s):.2f}",
+                "lastFundingRate": f"{market.rate('binance', s, market.next_funding_time('binance', s)):.8f}",
+                "nextFundingTime": market.next_funding_time("binance", s),
+                "time": int(time.time() * 1000),
+            } for s in symbols]
+            return self._send(200, items[0] if symbol else items, headers)
+        self._send(404, {"code": -1, "msg": f"Unknown endpoint {path}"}, headers)
+
+    def _bybit_response(self, result: dict, headers: dict, ret_code: int = 0, ret_msg: str = "OK"):
+        self._send(200, {"retCode": ret_code, "retMsg": ret_msg, "result": result, "time": int(time.time() * 1000)}, headers)
+
+    def _bybit(self, path: str, query: dict, headers: dict):
+        market = self.server.market
+        symbol = query.get("symbol", "").upper()
+        intervals = market.intervals["bybit"]
+        if path == "/v5/market/funding/history":
+            if symbol not in intervals:
+                return self._bybit_response({"category": "linear", "list": []}, headers, 10001, "params error: Symbol Is Invalid")
+            start = int(query["startTime"]) if "startTime" in query else None
+            end = int(query["endTime"]) if "endTime" in query else None
+            if start is not None and end is None:
+                return self._bybit_response({}, headers, 10001, "Time Is Invalid")
+            times = market.funding_times("bybit", symbol, start, end, self._page_limit("bybit", query.get("limit")),
+                                         newest_first=True)
+            return self._bybit_response({"category": "linear", "list": [
+                {"symbol": symbol, "fundingRate": f"{market.rate('bybit', symbol, t):.8f}", "fundingRateTimestamp": str(t)}
+                for t in times
+            ]}, headers)
+        if path == "/v5/market/instruments-info":
+            names = [symbol] if symbol else market.symbols
+            names = [s for s in names if s in intervals]
+            offset = int(query.get("cursor") or 0)
+            limit = min(int(query.get("limit") or 500), 1000)
+            page = names[offset:offset + limit]
+            next_cursor = str(offset + limit) if offset + limit < len(names) else ""
+            return self._bybit_response({"category": "linear", "nextPageCursor": next_cursor, "list": [
+                {"symbol": s, "contractType": "LinearPerpetual", "status": "Trading", "fundingInterval": intervals[s] * 60}
+                for s in page
+            ]}, headers)
+        if path == "/v5/market/tickers":
+            names = [symbol] if symbol else market.symbols
+            return self._bybit_response({"category": "linear", "list": [
+                {"symbol": s, "lastPrice": f"{market.price(s):.2f}", "markPrice": f"{market.price(s):.2f}",
+                 "fundingRate": f"{market.rate('bybit', s, market.next_funding_time('bybit', s)):.8f}",
+                 "nextFundingTime": str(market.next_funding_time("bybit", s))}
+                for s in names if s in intervals
+            ]}, headers)
+        self._bybit_response({}, headers, 10001, f"Unknown endpoint {path}")
+
+    def _hyperliquid(self, body: dict, headers: dict):
+        market = self.server.market
+        kind = body.get("type")
+        if kind == "fundingHistory":
+            symbol = market.coins.get(body.get("coin", ""))
+            if symbol is None:
+                return self._send(500, None, headers)
+            times = market.funding_times("hyperliquid", symbol, int(body.get("startTime", 0)), body.get("endTime"),
+                                         self._page_limit("hyperliquid", None))
+            return self._send(200, [
+                {"coin": body["coin"], "fundingRate": f"{market.rate('hyperliquid', symbol, t):.8f}",
+                 "premium": "0.0", "time": t}
+                for t in times
+            ], headers)
+        universe = [{"name": coin, "szDecimals": 3, "maxLeverage": 20} for coin in market.coins]
+        if kind == "meta":
+            return self._send(200, {"universe": universe}, headers)
+        if kind == "metaAndAssetCtxs":
+            ctxs = [{
+                "funding": f"{market.rate('hyperliquid', s, market.next_funding_time('hyperliquid', s)):.8f}",
+                "markPx": f"{market.price(s):.2f}", "premium": "0.0", "openInterest": "1000.0",
+            } for s in market.coins.values()]
+            return self._send(200, [{"universe": universe}, ctxs], headers)
+        self._send(422, {"error": f"Unknown request type {kind!r}"}, headers)
+
+class MockExchangeServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, market: MockMarket, latency_ms: float = 0, jitter_ms: float = 0,
+                 page_limit: int | None = None, rate_limit: int | None = None, error_rate: float = 0.0,
+                 seed: int = 0, verbose: bool = False):
+        super().__init__(address, MockExchangeHandler)
+        self.market = market
+        self.limiter = _Limiter(rate_limit)
+        self.options = {
+            "latency_ms": latency_ms, "jitter_ms": jitter_ms, "page_limit": page_limit,
+            "rate_limit": rate_limit, "error_rate": error_rate, "verbose": verbose,
+            "rng": random.Random(seed),
+        }
+        self._counts = {}
+        self._counts_lock = threading.Lock()
+        self._webhooks = []
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> dict[str, str]:
+        """Environment variables that point the funding tools at this server."""
+        return {
+            "FUNDING_BINANCE_URL": self.base_url,
+            "FUNDING_BYBIT_URL": self.base_url,
+            "FUNDING_HYPERLIQUID_URL": f"{self.base_url}/info",
+        }
+
+    def count(self, venue: str, endpoint: str):
+        with self._counts_lock:
+            key = f"{venue} {endpoint}"
+            self._counts[key] = self._counts.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        with self._counts_lock:
+            return dict(self._counts)
+
+    def record_webhook(self, body):
+        with self._counts_lock:
+            self._webhooks.append(body)
+
+    def webhooks(self) -> list:
+        with self._counts_lock:
+            return list(self._webhooks)
+
+def start_server(host: str = "127.0.0.1", port: int = 0, synthetic_symbols: int = 20, days: int = 365,
+                 **options) -> MockExchangeServer:
+    """Starts a mock exchange on a background thread (port 0 picks a free port) and returns it."""
+    server = MockExchangeServer((host, port), MockMarket(synthetic_symbols, days, options.get("seed", 0)), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+def main():
+    """Main function for the mock exchange server."""
+    parser = argparse.ArgumentParser(description="Serve deterministic synthetic Binance, Bybit and Hyperliquid funding endpoints locally.")
+    parser.add_argument("--host", default="127.0.0.1", help="Address to bind. Default: 127.0.0.1")
+    parser.add_argument("--port", type=int, default=8999, help="Port to listen on. Default: 8999")
+    parser.add_argument(
+        "--symbols",
+        type=int,
+        default=20,
+        help="Synthetic symbols listed besides BTCUSDT and ETHUSDT (SYN0000USDT, ...). Default: 20"
+    )
+    parser.add_argument("--days", type=int, default=365, help="Days of funding history served. Default: 365")
+    parser.add_argument("--latency-ms", type=float, default=0, help="Delay added to every response. Default: 0")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="Random extra delay of up to this much. Default: 0")
+    parser.add_argument(
+        "--page-limit",
+        type=int,
+        help="Lower every venue's page size cap (Binance 1000, Bybit 200, Hyperliquid 500) to this."
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=int,
+        help="Requests per minute per venue; further requests get 429 with Retry-After. Default: unlimited"
+    )
+    parser.add_argument(
+        "--error-rate",
+        type=float,
+        default=0.0,
+        help="Fraction of requests answered with an injected 429. Default: 0"
+    )
+    parser.add_argument("--seed", type=int, default=0, help="Seed for rates, jitter and injected errors. Default: 0")
+    parser.add_argument("--verbose", action="store_true", help="Log every request.")
+    args = parser.parse_args()
+
+    server = MockExchangeServer(
+        (args.host, args.port), MockMarket(args.symbols, args.days, args.seed),
+        latency_ms=args.latency_ms, jitter_ms=args.jitter_ms, page_limit=args.page_limit,
+        rate_limit=args.rate_limit, error_rate=args.error_rate, seed=args.seed, verbose=args.verbose,
+    )
+    print(f"Mock exchange listening on {server.base_url}. Point the tools at it with:")
+    for name, value in server.env().items():
+        print(f"  export {name}={value}")
+    print(f"Alert webhooks posted to {server.base_url}/mock/webhook can be read back with GET.")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
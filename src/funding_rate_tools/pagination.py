@@ -0,0 +1,108 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from . import profiling
+
+HOUR_MS = 60 * 60 * 1000
+# Pause between consecutive requests for one symbol, on top of the shared rate limiter.
+PAGE_DELAY_S = 0.2
+# Windows of one range fetched at once by fetch_history; the rate limiter in http_client still applies.
+PAGE_WORKERS = 4
+
+def plan_windows(start_time_ms: int, end_time_ms: int, interval_ms: int, page_size: int) -> list[tuple[int, int]]:
+    """
+    Splits [start_time_ms, end_time_ms] into the fewest inclusive windows that each
+    hold at most page_size settlements, assuming settlements on multiples of
+    interval_ms. That is ceil(settlements / page_size) windows, the minimum number
+    of requests. Window edges sit halfway between settlements, so timestamps a little
+    off the grid still land in the intended window.
+    """
+    first = -(-start_time_ms // interval_ms) * interval_ms
+    last = end_time_ms // interval_ms * interval_ms
+    if last < first:
+        # No settlement expected; one request still confirms that.
+        return [(start_time_ms, end_time_ms)] if start_time_ms <= end_time_ms else []
+    settlements = (last - first) // interval_ms + 1
+    # Window j owns settlements j*page_size .. (j+1)*page_size - 1.
+    edge = first - interval_ms // 2
+    span = page_size * interval_ms
+    count = -(-settlements // page_size)
+    return [
+        (start_time_ms if j == 0 else edge + j * span, end_time_ms if j == count - 1 else edge + (j + 1) * span - 1)
+        for j in range(count)
+    ]
+
+def _drain(adapter, symbol: str, start_time_ms: int | None, end_time_ms: int, pause: bool,
+           interval_ms: int | None = None):
+    """
+    Pages through [start_time_ms, end_time_ms] one request at a time, continuing
+    after (asc) or before (desc) each page. Without the interval, a short page ends the
+    range. With it, a page of any length is followed up while the range still has
+    room for another settlement, since venues may return fewer rows than their
+    declared page size; a page that leaves no room, or an empty one, ends it.
+    Yields pages sorted oldest first.
+    """
+    caps = adapter.capabilities
+    while True:
+        if pause:
+            profiling.sleep(PAGE_DELAY_S)
+        pause = True
+        page = [
+            rate for rate in adapter.fetch_page(symbol, start_time_ms, end_time_ms)
+            if (start_time_ms is None or rate["fundingTime"] >= start_time_ms) and rate["fundingTime"] <= end_time_ms
+        ]
+        page.sort(key=lambda rate: rate["fundingTime"])
+        if not page:
+            return
+        yield page
+        if len(page) < caps.page_size and not interval_ms:
+            return
+        if caps.ordering == "asc":
+            start_time_ms = page[-1]["fundingTime"] + 1
+            room = end_time_ms - page[-1]["fundingTime"]
+        else:
+            end_time_ms = page[0]["fundingTime"] - 1
+            room = page[0]["fundingTime"] - start_time_ms if start_time_ms is not None else None
+        if room is not None and (room <= 0 or interval_ms and room < interval_ms):
+            return
+
+def iter_pages(adapter, symbol: str, start_time_ms: int | None = None, end_time_ms: int | None = None,
+               interval_hours: int | None = None, workers: int = 1):
+    """
+    Yields pages (lists of {'fundingTime', 'fundingRate'}, oldest first) covering
+    [start_time_ms, end_time_ms] for one symbol of `adapter`'s venue.
+    With a start time and a known interval, the range is split up front by
+    plan_windows into the fewest windows, up to `workers` of which are fetched
+    concurrently; pages are still yielded in order. Otherwise (no start, or no
+    interval), the venue is paged in its natural order from one end. A window that
+    unexpectedly fills a whole page, e.g. after an interval change, is continued page
+    by page. A request error is raised from the iterator, so the pages yielded
+    before it always form a contiguous run from the start of the range.
+    """
+    if end_time_ms is None:
+        end_time_ms = int(time.time() * 1000)
+    interval_ms = interval_hours * HOUR_MS if interval_hours else None
+    if start_time_ms is not None and interval_ms:
+        windows = plan_windows(start_time_ms, end_time_ms, interval_ms, adapter.capabilities.page_size)
+    else:
+        windows = [(start_time_ms, end_time_ms)]
+    if workers > 1 and len(windows) > 1:
+        yield from _drain_concurrently(adapter, symbol, windows, workers, interval_ms)
+    else:
+        for n, (lo, hi) in enumerate(windows):
+            yield from _drain(adapter, symbol, lo, hi, n > 0, interval_ms)
+
+def _drain_concurrently(adapter, symbol: str, windows: list[tuple[int, int]], workers: int,
+                        interval_ms: int | None):
+    """Drains windows on a thread pool and yields their pages in window order; the first error is re-raised."""
+    def drain_window(lo: int, hi: int) -> list[list[dict]]:
+        return list(_drain(adapter, symbol, lo, hi, False, interval_ms))
+
+    with ThreadPoolExecutor(max_workers=min(workers, len(windows))) as pool:
+        futures = [pool.submit(drain_window, lo, hi) for lo, hi in windows]
+        try:
+            for future in futures:
+                yield from future.result()
+        finally:
+            for future in futures:
+                future.cancel()
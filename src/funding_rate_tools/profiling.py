@@ -0,0 +1,143 @@
+import cProfile
+import json
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+# Process-wide instrumentation, off unless a tool is run with --profile, --profile-json
+# or --cprofile. While disabled, span() and count() return immediately.
+#   spans:    (name, symbol) -> [calls, total seconds, max seconds]
+#   counters: name -> value (http.requests, http.bytes, http.retries, db.rows_stored, sleep.seconds, ...)
+_lock = threading.Lock()
+_enabled = False
+_started = None
+_spans = {}
+_counters = {}
+
+def enable():
+    global _enabled, _started
+    with _lock:
+        _enabled = True
+        _started = time.perf_counter()
+
+def disable():
+    global _enabled
+    _enabled = False
+
+def is_enabled() -> bool:
+    return _enabled
+
+def reset():
+    global _started
+    with _lock:
+        _spans.clear()
+        _counters.clear()
+        _started = time.perf_counter() if _enabled else None
+
+@contextmanager
+def span(name: str, symbol: str | None = None):
+    """Times the block under `name`, per symbol if one is given. Spans may nest and overlap across threads."""
+    if not _enabled:
+        yield
+        return
+    t0 = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - t0
+        with _lock:
+            entry = _spans.setdefault((name, symbol), [0, 0.0, 0.0])
+            entry[0] += 1
+            entry[1] += elapsed
+            entry[2] = max(entry[2], elapsed)
+
+def count(name: str, value: float = 1):
+    if not _enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + value
+
+def sleep(seconds: float):
+    """time.sleep that is accounted for under sleep.seconds, so deliberate pauses show up in profiles."""
+    count("sleep.calls")
+    count("sleep.seconds", seconds)
+    time.sleep(seconds)
+
+def snapshot() -> dict:
+    """The recorded spans and counters as a JSON-serializable dict."""
+    with _lock:
+        spans = [
+            {"name": name, "symbol": symbol, "calls": calls, "seconds": total, "max_seconds": longest}
+            for (name, symbol), (calls, total, longest) in _spans.items()
+        ]
+        counters = dict(_counters)
+        wall = time.perf_counter() - _started if _started is not None else 0.0
+    spans.sort(key=lambda s: s["seconds"], reverse=True)
+    return {"wall_seconds": wall, "spans": spans, "counters": counters}
+
+def format_report(report: dict, top_symbols: int = 10) -> str:
+    """Human-readable summary: phases, the slowest symbols, then counters."""
+    lines = [f"Profile ({report['wall_seconds']:.3f}s wall)"]
+    phases = [s for s in report["spans"] if s["symbol"] is None]
+    by_symbol = [s for s in report["spans"] if s["symbol"] is not None]
+    lines.append(f"  {'PHASE':<40} {'CALLS':>7} {'TOTAL S':>9} {'MAX S':>8}")
+    for s in phases:
+        lines.append(f"  {s['name']:<40} {s['calls']:>7} {s['seconds']:>9.3f} {s['max_seconds']:>8.3f}")
+    if by_symbol:
+        lines.append(f"  {'SLOWEST SYMBOLS':<40} {'CALLS':>7} {'TOTAL S':>9} {'MAX S':>8}")
+        for s in by_symbol[:top_symbols]:
+            label = f"{s['name']} {s['symbol']}"
+            lines.append(f"  {label:<40} {s['calls']:>7} {s['seconds']:>9.3f} {s['max_seconds']:>8.3f}")
+    if report["counters"]:
+        lines.append("  COUNTERS")
+        for name, value in sorted(report["counters"].items()):
+            shown = f"{value:.3f}" if isinstance(value, float) else str(value)
+            lines.append(f"  {name:<40} {shown:>17}")
+    return "\n".join(lines)
+
+def add_arguments(parser):
+    """Adds --profile, --profile-json and --cprofile to a tool's argument parser."""
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        help="Print timings per phase and symbol, HTTP/database counters and sleep time to stderr when done."
+    )
+    parser.add_argument(
+        "--profile-json",
+        help="Write the same profile as JSON to this file.",
+        metavar="FILE"
+    )
+    parser.add_argument(
+        "--cprofile",
+        help="Also run under cProfile and write its stats to this file (read with python -m pstats).",
+        metavar="FILE"
+    )
+
+@contextmanager
+def session(args):
+    """
+    Profiles the block if the parsed args ask for it, reporting on the way out, also
+    when the tool ends with sys.exit().
+    """
+    if not (args.profile or args.profile_json or args.cprofile):
+        yield
+        return
+    reset()
+    enable()
+    profiler = cProfile.Profile() if args.cprofile else None
+    if profiler:
+        profiler.enable()
+    try:
+        yield
+    finally:
+        if profiler:
+            profiler.disable()
+            profiler.dump_stats(args.cprofile)
+        disable()
+        report = snapshot()
+        if args.profile:
+            print(format_report(report), file=sys.stderr)
+        if args.profile_json:
+            with open(args.profile_json, "w") as f:
+                json.dump(report, f, indent=2)
@@ -0,0 +1,188 @@
+import argparse
+import json
+import sys
+import time
+from datetime import datetime, timezone
+
+from .calculations import DAYS_IN_YEAR
+from .config import Exchange
+from .database import get_funding_interval_hours, get_funding_series
+
+HOUR_MS = 60 * 60 * 1000
+GRID_HOURS = {"hour": 1, "day": 24}
+HOURS_PER_YEAR = 24 * DAYS_IN_YEAR
+
+def resample_rates(rates_data: list[dict], interval_hours: int | None = None, grid: str = "hour") -> dict[int, tuple[float, int]]:
+    """
+    Maps a venue's funding payments onto a common grid.
+    A payment at funding_time settles the hours before it (its own interval_hours,
+    else the given interval_hours), so it is spread evenly as rate / hours over each
+    of those hours; hours are then summed into grid cells. Payments with no known
+    interval are skipped. Returns {cell index: (accrued funding, hours covered)},
+    where cell index is the cell start in ms divided by the cell length.
+    """
+    cell_hours = GRID_HOURS[grid]
+    cells = {}
+    for item in rates_data:
+        hours = item.get('interval_hours') or interval_hours
+        if not hours:
+            continue
+        # Round to the hour; some venues stamp settlements a few ms after the hour.
+        end_hour = round(item['funding_time'] / HOUR_MS)
+        per_hour = item['funding_rate'] / hours
+        for hour in range(end_hour - hours, end_hour):
+            cell = hour // cell_hours
+            total, covered = cells.get(cell, (0.0, 0))
+            cells[cell] = (total + per_hour, covered + 1)
+    return cells
+
+def load_resampled(symbol: str, source: str, grid: str = "hour", start_time_ms: int = 0,
+                   end_time_ms: int | None = None) -> dict[int, tuple[float, int]]:
+    """
+    Loads a stored (source, symbol) series and resamples it onto the grid, by each
+    payment's own interval (the stored funding interval where that is unknown).
+    """
+    series = get_funding_series(symbol, source, start_time_ms, end_time_ms)
+    interval = get_funding_interval_hours(symbol, source) if 0 in series.hours else None
+    return resample_rates(series, interval, grid)
+
+def to_pa_grid(cells_by_series: dict[str, dict[int, tuple[float, int]]], grid: str = "hour") -> tuple[list[int], dict[str, list[float | None]]]:
+    """
+    Lays several resampled series out on one shared grid.
+    Each value is the cell's mean hourly accrual annualized to % p.a.; cells a
+    series does not cover are None. Returns (cell start timestamps in ms, {key: values}).
+    """
+    cell_ms = GRID_HOURS[grid] * HOUR_MS
+    all_cells = sorted(set().union(*(cells.keys() for cells in cells_by_series.values()))) if cells_by_series else []
+    values = {}
+    for key, cells in cells_by_series.items():
+        column = []
+        for cell in all_cells:
+            entry = cells.get(cell)
+            column.append(entry[0] / entry[1] * HOURS_PER_YEAR * 100 if entry else None)
+        values[key] = column
+    return [cell * cell_ms for cell in all_cells], values
+
+def compute_spread(short_cells: dict[int, tuple[float, int]], long_cells: dict[int, tuple[float, int]],
+                   grid: str = "hour") -> dict:
+    """
+    Funding arbitrage spread: short the perp on one venue (receiving its funding)
+    and long it on another (paying its funding). On every grid cell both venues
+    cover, the hedged position earns short - long per hour.
+    Returns {times, short_pa, long_pa, spread_pa} aligned on the common cells plus
+    summary figures: mean p.a. of each leg and of the spread, and the share of
+    cells in which the spread was positive.
+    """
+    cell_ms = GRID_HOURS[grid] * HOUR_MS
+    common = sorted(short_cells.keys() & long_cells.keys())
+    factor = HOURS_PER_YEAR * 100
+    short_pa = [short_cells[c][0] / short_cells[c][1] * factor for c in common]
+    long_pa = [long_cells[c][0] / long_cells[c][1] * factor for c in common]
+    spread_pa = [s - l for s, l in zip(short_pa, long_pa)]
+    n = len(common)
+    return {
+        "times": [c * cell_ms for c in common],
+        "short_pa": short_pa,
+        "long_pa": long_pa,
+        "spread_pa": spread_pa,
+        "mean_short_pa": sum(short_pa) / n if n else None,
+        "mean_long_pa": sum(long_pa) / n if n else None,
+        "mean_spread_pa": sum(spread_pa) / n if n else None,
+        "positive_share": sum(1 for v in spread_pa if v > 0) / n if n else None,
+    }
+
+def _parse_leg(value: str, default_symbol: str | None) -> tuple[Exchange, str]:
+    exchange, _, symbol = value.partition(":")
+    symbol = (symbol or default_symbol or "").upper()
+    if not symbol:
+        raise ValueError(f"No symbol given for leg '{value}'; use EXCHANGE:SYMBOL or --symbol.")
+    return Exchange(exchange.lower()), symbol
+
+def main():
+    """Main function for the cross-exchange spread calculator."""
+    parser = argparse.ArgumentParser(description="Compare funding across exchanges on a common grid and compute arbitrage spreads.")
+    parser.add_argument(
+        "--short",
+        required=True,
+        help="Leg that is short the perp (receives its funding), as EXCHANGE or EXCHANGE:SYMBOL.",
+        metavar="EXCHANGE[:SYMBOL]"
+    )
+    parser.add_argument(
+        "--long",
+        required=True,
+        help="Leg that is long the perp (pays its funding), as EXCHANGE or EXCHANGE:SYMBOL.",
+        metavar="EXCHANGE[:SYMBOL]"
+    )
+    parser.add_argument(
+        "--symbol",
+        help="Symbol for legs given without one (e.g., BTCUSDT)."
+    )
+    parser.add_argument(
+        "--grid",
+        choices=sorted(GRID_HOURS),
+        default="day",
+        help="Common grid to resample both venues onto. Default: day"
+    )
+    parser.add_argument(
+        "--since",
+        type=str,
+        help="Only use data since a specific date (YYYY-MM-DD).",
+        metavar="YYYY-MM-DD"
+    )
+    parser.add_argument(
+        "--series",
+        action="store_true",
+        help="Print every grid row, not only the summary."
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Output the summary (and series with --series) as JSON."
+    )
+    args = parser.parse_args()
+
+    try:
+        short_exchange, short_symbol = _parse_leg(args.short, args.symbol)
+        long_exchange, long_symbol = _parse_leg(args.long, args.symbol)
+    except ValueError as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+    start_time_ms = 0
+    if args.since:
+        try:
+            start_time_ms = int(datetime.strptime(args.since, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() * 1000)
+        except ValueError:
+            print("Error: Invalid date format for --since. Use YYYY-MM-DD.")
+            sys.exit(1)
+    now_ms = int(time.time() * 1000)
+
+    short_cells = load_resampled(short_symbol, short_exchange.value, args.grid, start_time_ms, now_ms)
+    long_cells = load_resampled(long_symbol, long_exchange.value, args.grid, start_time_ms, now_ms)
+    result = compute_spread(short_cells, long_cells, args.grid)
+
+    if args.json:
+        if not args.series:
+            result = {k: v for k, v in result.items() if k not in ("times", "short_pa", "long_pa", "spread_pa")}
+        print(json.dumps(result))
+        return
+
+    if not result["times"]:
+        print("N/A (No overlapping data for both legs)")
+        sys.exit(1)
+
+    short_label = f"{short_symbol}@{short_exchange.value}"
+    long_label = f"{long_symbol}@{long_exchange.value}"
+    if args.series:
+        print(f"{'TIME':<16} {'SHORT %':>9} {'LONG %':>9} {'SPREAD %':>9}")
+        fmt = "%Y-%m-%d %H:%M" if args.grid == "hour" else "%Y-%m-%d"
+        for t, s, l, sp in zip(result["times"], result["short_pa"], result["long_pa"], result["spread_pa"]):
+            print(f"{datetime.fromtimestamp(t / 1000, tz=timezone.utc).strftime(fmt):<16} {s:>9.2f} {l:>9.2f} {sp:>9.2f}")
+        print()
+    print(f"Short {short_label}: {result['mean_short_pa']:.2f}% p.a.")
+    print(f"Long  {long_label}: {result['mean_long_pa']:.2f}% p.a.")
+    print(f"Spread: {result['mean_spread_pa']:.2f}% p.a. over {len(result['times'])} {args.grid}(s), "
+          f"positive in {result['positive_share']:.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import argparse
+import json
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from . import http_client, metrics
+from .config import Exchange
+from .database import get_last_funding_times, get_window_pa_rates, store_funding_infos, store_funding_rates
+from .exchanges import FETCH_ERRORS, get_adapter
+
+DAY_MS = 24 * 60 * 60 * 1000
+HOUR_MS = 60 * 60 * 1000
+
+# Conservative request rates (per second) that stay well inside each venue's public limits.
+DEFAULT_RATE_LIMITS = {
+    Exchange.BINANCE: 10,
+    Exchange.BYBIT: 10,
+    Exchange.HYPERLIQUID: 5,
+}
+
+def refresh_universe(exchange: Exchange, lookback_ms: int, workers: int, now_ms: int) -> dict:
+    """
+    Lists every perp of an exchange in bulk and fetches the missing recent history
+    of each through a thread pool; requests are throttled by the shared rate limiter.
+    Symbols whose next funding is not due yet are skipped without any request.
+    """
+    source = exchange.value
+    adapter = get_adapter(exchange)
+    try:
+        intervals = adapter.fetch_all_intervals()
+    except FETCH_ERRORS as e:
+        print(f"Warning: Error listing perpetuals on {source}: {e}")
+        return {"source": source, "symbols": 0, "refreshed": 0, "rows": 0, "errors": 1}
+    if not intervals:
+        return {"source": source, "symbols": 0, "refreshed": 0, "rows": 0, "errors": 0}
+    store_funding_infos(intervals, source)
+    last_times = get_last_funding_times(source)
+
+    due = []
+    for symbol, interval in intervals.items():
+        last_time = last_times.get(symbol)
+        if last_time is not None and now_ms < last_time + interval * HOUR_MS:
+            continue
+        start = max(last_time + 1, now_ms - lookback_ms) if last_time is not None else now_ms - lookback_ms
+        due.append((symbol, start))
+
+    def fetch_and_store(symbol: str, start: int) -> int:
+        rates = adapter.fetch_history(symbol, start, interval_hours=intervals[symbol])
+        if rates:
+            store_funding_rates(symbol, rates, source)
+        return len(rates)
+
+    rows = errors = 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(fetch_and_store, symbol, start): symbol for symbol, start in due}
+        for future in as_completed(futures):
+            try:
+                rows += future.result()
+            except Exception as e:
+                errors += 1
+                metrics.record_error(source, futures[future])
+                print(f"Warning: Error refreshing {futures[future]} on {source}: {e}")
+    return {"source": source, "symbols": len(intervals), "refreshed": len(due), "rows": rows, "errors": errors}
+
+def rank_symbols(sources: list[str], windows_days: list[int], sort_days: int, now_ms: int,
+                 ascending: bool = False) -> list[dict]:
+    """Ranks every stored symbol of the sources by p.a. over the sort window (one aggregate query)."""
+    window_starts = {f"{d}d": now_ms - d * DAY_MS for d in windows_days}
+    rows = get_window_pa_rates(sources, window_starts)
+    key = f"{sort_days}d"
+    ranked = [r for r in rows if r.get(key) is not None]
+    ranked.sort(key=lambda r: r[key], reverse=not ascending)
+    return ranked
+
+def _format_table(rows: list[dict], windows_days: list[int]) -> str:
+    header = f"{'EXCHANGE':<12} {'SYMBOL':<18} {'INT':>4}" + "".join(f" {str(d) + 'D P.A. %':>11}" for d in windows_days)
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        cells = "".join(
+            f" {r[f'{d}d']:>11.2f}" if r[f'{d}d'] is not None else f" {'N/A':>11}" for d in windows_days
+        )
+        lines.append(f"{r['source']:<12} {r['symbol']:<18} {str(r['interval_hours']) + 'h':>4}{cells}")
+    return "\n".join(lines)
+
+def main():
+    """Main function for the whole-market funding scanner."""
+    parser = argparse.ArgumentParser(description="Scan and rank funding rates of every listed perpetual.")
+    parser.add_argument(
+        "--exchange",
+        nargs="+",
+        choices=["binance", "hyperliquid", "bybit"],
+        default=["binance", "bybit", "hyperliquid"],
+        help="Exchange(s) to scan. Default: all"
+    )
+    parser.add_argument(
+        "--windows",
+        nargs="+",
+        type=int,
+        default=[1, 7, 30],
+        help="Trailing windows in days to compute p.a. rates over. Default: 1 7 30",
+        metavar="DAYS"
+    )
+    parser.add_argument(
+        "--sort-window",
+        type=int,
+        default=None,
+        help="Window (days) to rank by. Default: the second window, or the only one.",
+        metavar="DAYS"
+    )
+    parser.add_argument(
+        "--ascending",
+        action="store_true",
+        help="Rank from most negative p.a. (shorts pay most) instead of most positive."
+    )
+    parser.add_argument(
+        "--top",
+        type=int,
+        default=30,
+        help="Number of symbols to show. Use 0 for all. Default: 30"
+    )
+    parser.add_argument(
+        "--no-refresh",
+        action="store_true",
+        help="Do not refresh data from API; rank existing data in database."
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="Concurrent fetches per exchange. Default: 8"
+    )
+    parser.add_argument(
+        "--rate-limit",
+        type=float,
+        default=None,
+        help="Maximum requests per second per exchange. Default: per-exchange conservative limit."
+    )
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Print refresh statistics."
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="Output the ranking as a JSON list."
+    )
+    args = parser.parse_args()
+    with metrics.run("funding-scan"):
+        _run(args)
+
+def _run(args):
+    exchanges = list(dict.fromkeys(Exchange(e) for e in args.exchange))
+    windows = sorted(set(args.windows))
+    sort_days = args.sort_window or (windows[1] if len(windows) > 1 else windows[0])
+    if sort_days not in windows:
+        windows = sorted(set(windows + [sort_days]))
+
+    now_ms = int(time.time() * 1000)
+
+    if not args.no_refresh:
+        for exchange in exchanges:
+            http_client.set_rate_limit(get_adapter(exchange).base_url, args.rate_limit or DEFAULT_RATE_LIMITS[exchange])
+        lookback_ms = max(windows) * DAY_MS
+        t0 = time.time()
+        with ThreadPoolExecutor(max_workers=len(exchanges)) as pool:
+            stats = list(pool.map(lambda e: refresh_universe(e, lookback_ms, args.workers, now_ms), exchanges))
+        if args.verbose:
+            for s in stats:
+                print(f"{s['source']}: {s['symbols']} perps, {s['refreshed']} refreshed, "
+                      f"{s['rows']} rows stored, {s['errors']} error(s)")
+            print(f"Refresh took {time.time() - t0:.1f}s")
+        if all(s['symbols'] == 0 for s in stats):
+            print("Error: Could not list perpetuals on any exchange.")
+            sys.exit(1)
+
+    ranked = rank_symbols([e.value for e in exchanges], windows, sort_days, now_ms, args.ascending)
+    if args.top:
+        ranked = ranked[:args.top]
+
+    if args.json:
+        print(json.dumps(ranked))
+    else:
+        print(_format_table(ranked, windows))
+
+if __name__ == "__main__":
+    main()
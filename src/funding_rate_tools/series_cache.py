@@ -0,0 +1,150 @@
+import mmap
+import os
+from array import array
+from bisect import bisect_left
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Not available on Windows; writers are then not serialized across processes.
+    fcntl = None
+
+from . import config
+from .series import FundingSeries
+
+# On-disk layout, per (source, symbol) under config.SERIES_CACHE_DIR/<source>/:
+#   <symbol>.times  native int64 funding times (ms), ascending
+#   <symbol>.rates  native float64 funding rates, same order
+#   <symbol>.hours  native float64 hours each payment accrued over (0 if unknown), same order
+#   <symbol>.lock   taken by writers (appends and rebuilds)
+# The column files are append-only between rebuilds and are memory-mapped on read.
+# SQLite stays the source of truth: a cache whose length or last time disagrees with
+# the series_meta entry its writers keep for funding_rates is rebuilt from it.
+
+def _base_path(symbol: str, source: str) -> str:
+    return os.path.join(config.SERIES_CACHE_DIR, source, symbol.replace(os.sep, "_"))
+
+@contextmanager
+def _locked(base: str):
+    with open(base + ".lock", "a") as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+def _map_column(path: str, typecode: str):
+    """Read-only zero-copy view of a column file, or None if it is missing or torn."""
+    try:
+        size = os.path.getsize(path)
+    except OSError:
+        return None
+    if size % 8:
+        return None
+    if size == 0:
+        return array(typecode)
+    with open(path, "rb") as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    return memoryview(mm).cast(typecode)
+
+def _write_column(path: str, column: array):
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "wb") as f:
+        column.tofile(f)
+    os.replace(tmp, path)
+
+def rebuild(symbol: str, source: str, conn) -> FundingSeries:
+    """Rewrites the cache files of a series from SQLite and returns the series."""
+    base = _base_path(symbol, source)
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    with _locked(base):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute('''
+            SELECT funding_time, funding_rate, interval_hours FROM funding_rates
+            WHERE symbol = ? AND source = ?
+            ORDER BY funding_time ASC
+        ''', (symbol, source))
+        series = FundingSeries.from_cursor(cursor)
+        _write_column(base + ".rates", series.rates)
+        _write_column(base + ".hours", series.hours)
+        _write_column(base + ".times", series.times)
+    return series
+
+def load(symbol: str, source: str, conn) -> FundingSeries:
+    """
+    The full stored series of (source, symbol), memory-mapped from the cache when it
+    matches funding_rates (the row count and last funding_time in series_meta), else
+    rebuilt first. A symbol without a series_meta entry is counted once to create it.
+    """
+    base = _base_path(symbol, source)
+    meta = _read_meta(symbol, source, conn)
+    if meta is None:
+        # One statement, so no write can land between the count and the entry.
+        conn.execute('''
+            INSERT OR IGNORE INTO series_meta (source, symbol, row_count, last_time)
+            SELECT ?, ?, COUNT(*), MAX(funding_time) FROM funding_rates WHERE symbol = ? AND source = ?
+        ''', (source, symbol, symbol, source))
+        conn.commit()
+        meta = _read_meta(symbol, source, conn)
+    count, last_time = meta
+    times = _map_column(base + ".times", "q")
+    rates = _map_column(base + ".rates", "d")
+    hours = _map_column(base + ".hours", "d")
+    if (times is not None and rates is not None and hours is not None and len(times) == len(rates) == len(hours) == count
+            and (count == 0 or times[-1] == last_time)):
+        return FundingSeries(times, rates, hours)
+    return rebuild(symbol, source, conn)
+
+def _read_meta(symbol: str, source: str, conn) -> tuple[int, int | None] | None:
+    row = conn.execute(
+        'SELECT row_count, last_time FROM series_meta WHERE source = ? AND symbol = ?', (source, symbol)
+    ).fetchone()
+    return (row[0], row[1]) if row else None
+
+def append(symbol: str, source: str, rows: list[tuple]):
+    """
+    Appends newly stored (funding_time, funding_rate, interval_hours) rows to an
+    existing cache. Rows older than the cached tail that are not already in it mean
+    history was backfilled, so the cache is dropped and rebuilt on the next read.
+    """
+    base = _base_path(symbol, source)
+    if not os.path.exists(base + ".times"):
+        return  # Built lazily on first read.
+    with _locked(base):
+        times = _map_column(base + ".times", "q")
+        if times is None:
+            return
+        last_time = times[-1] if len(times) else None
+        new = {}
+        for t, r, h in rows:
+            if last_time is None or t > last_time:
+                new[t] = (r, h or 0.0)
+            elif not _contains(times, t):
+                invalidate(symbol, source)
+                return
+        if not new:
+            return
+        ordered = sorted(new.items())
+        # Hours and rates first: a reader that maps the files in between sees a
+        # length mismatch and falls back to a rebuild, never misaligned rows.
+        with open(base + ".hours", "ab") as f:
+            array("d", [h for _, (_, h) in ordered]).tofile(f)
+        with open(base + ".rates", "ab") as f:
+            array("d", [r for _, (r, _) in ordered]).tofile(f)
+        with open(base + ".times", "ab") as f:
+            array("q", [t for t, _ in ordered]).tofile(f)
+
+def _contains(times, t: int) -> bool:
+    i = bisect_left(times, t)
+    return i < len(times) and times[i] == t
+
+def invalidate(symbol: str, source: str):
+    base = _base_path(symbol, source)
+    for suffix in (".times", ".rates", ".hours"):
+        try:
+            os.remove(base + suffix)
+        except FileNotFoundError:
+            pass
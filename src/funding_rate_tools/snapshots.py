@@ -0,0 +1,60 @@
+import sys
+import time
+
+import requests
+
+from . import profiling
+from .calculations import DAYS_IN_YEAR
+from .config import Exchange
+from .database import (compact_funding_snapshots, get_funding_intervals, get_latest_funding_snapshots,
+                       store_funding_snapshots)
+from .exchanges import get_adapter
+
+def ingest(exchange: Exchange, conn=None, now_ms: int | None = None) -> int:
+    """
+    Samples the predicted funding of every perpetual on `exchange` with one request,
+    stores it, and compacts the samples of intervals that have settled since.
+    Returns the number of samples stored, 0 if the request failed.
+    """
+    now_ms = now_ms or int(time.time() * 1000)
+    try:
+        with profiling.span(f"snapshot {exchange.value}"):
+            snapshots = get_adapter(exchange).fetch_predicted()
+    except (requests.RequestException, ValueError, KeyError, TypeError) as e:
+        print(f"Error fetching predicted funding on {exchange.value}: {e}", file=sys.stderr)
+        return 0
+    stored = store_funding_snapshots(exchange.value, now_ms, snapshots, conn)
+    compact_funding_snapshots(now_ms, conn)
+    return stored
+
+def predicted_pa_rate(funding_rate: float, interval_hours: int | None) -> float | None:
+    """Annualizes one predicted per-interval rate into a p.a. % rate, like annualize_rates."""
+    if not interval_hours:
+        return None
+    return funding_rate * 24 / interval_hours * DAYS_IN_YEAR * 100
+
+def get_predicted(symbols: list[str], exchange: Exchange, conn=None, now_ms: int | None = None) -> dict[str, dict | None]:
+    """
+    The newest stored prediction of each symbol as {symbol: {"funding_rate",
+    "next_funding_time", "sample_time", "predicted_pa"}}, or None for symbols without a
+    sample for the upcoming settlement. Annualized with the stored funding interval.
+    """
+    now_ms = now_ms or int(time.time() * 1000)
+    adapter = get_adapter(exchange)
+    names = {symbol: adapter.market_symbol(symbol) for symbol in symbols}
+    latest = get_latest_funding_snapshots(exchange.value, sorted(set(names.values())), conn)
+    intervals = get_funding_intervals(exchange.value)
+    predicted = {}
+    for symbol, name in names.items():
+        sample = latest.get(name)
+        if sample is None or sample["next_funding_time"] <= now_ms:
+            predicted[symbol] = None
+            continue
+        interval = intervals.get(symbol) or intervals.get(name)
+        predicted[symbol] = {
+            "funding_rate": sample["funding_rate"],
+            "next_funding_time": sample["next_funding_time"],
+            "sample_time": sample["sample_time"],
+            "predicted_pa": predicted_pa_rate(sample["funding_rate"], interval),
+        }
+    return predicted
@@ -0,0 +1,190 @@
+import json
+import math
+
+# All-time statistics of each (source, symbol), kept in funding_stats and updated by
+# store_funding_rates with just the rows it added, so long horizons never need a
+# rescan. Each payment is annualized on its own accrual hours and weighted by them:
+# the mean is the time-weighted p.a. rate, the standard deviation its volatility,
+# and the quantiles come from a t-digest sketch. Sign counts are per payment.
+HOURS_PER_YEAR = 24 * 365
+SKETCH_COMPRESSION = 100
+QUANTILES = {"p5": 0.05, "p25": 0.25, "median": 0.5, "p75": 0.75, "p95": 0.95}
+
+class QuantileSketch:
+    """
+    Merging t-digest (Dunning & Ertl): weighted centroids, small near the tails and
+    large in the middle, so extreme quantiles stay accurate in a bounded size of
+    roughly `compression` centroids however many values are added.
+    """
+
+    def __init__(self, centroids: list | None = None, compression: int = SKETCH_COMPRESSION):
+        self.compression = compression
+        self.centroids = [list(c) for c in centroids or []]
+        self._buffer = []
+
+    def add(self, value: float, weight: float = 1.0):
+        self._buffer.append([value, weight])
+        if len(self._buffer) >= 10 * self.compression:
+            self._compress()
+
+    def _k(self, q: float) -> float:
+        return self.compression / (2 * math.pi) * math.asin(2 * min(max(q, 0.0), 1.0) - 1)
+
+    def _compress(self):
+        if not self._buffer:
+            return
+        points = sorted(self.centroids + self._buffer)
+        self._buffer = []
+        total = sum(w for _, w in points)
+        merged = [list(points[0])]
+        before = 0.0  # weight of the centroids before merged[-1]
+        for value, weight in points[1:]:
+            current = merged[-1]
+            if self._k((before + current[1] + weight) / total) - self._k(before / total) <= 1:
+                current[1] += weight
+                current[0] += (value - current[0]) * weight / current[1]
+            else:
+                before += current[1]
+                merged.append([value, weight])
+        self.centroids = merged
+
+    def quantile(self, q: float, lo: float, hi: float) -> float | None:
+        """The q-quantile, interpolating between centroid midpoints; lo and hi are the exact extremes."""
+        self._compress()
+        if not self.centroids:
+            return None
+        total = sum(w for _, w in self.centroids)
+        target = q * total
+        prev_value, prev_mid, cumulative = lo, 0.0, 0.0
+        for value, weight in self.centroids:
+            mid = cumulative + weight / 2
+            if target < mid:
+                span = mid - prev_mid
+                return prev_value + (value - prev_value) * ((target - prev_mid) / span if span else 0)
+            prev_value, prev_mid, cumulative = value, mid, cumulative + weight
+        span = total - prev_mid
+        return prev_value + (hi - prev_value) * ((target - prev_mid) / span if span else 0)
+
+    def to_json(self) -> str:
+        self._compress()
+        return json.dumps([[round(v, 6), round(w, 6)] for v, w in self.centroids])
+
+class FundingStats:
+    """Running statistics of one symbol's payments; see the module comment."""
+
+    def __init__(self, row=None):
+        if row is None:
+            self.first_time = self.last_time = None
+            self.payments = self.negative = self.positive = 0
+            self.hours = self.mean = self.m2 = 0.0
+            self.min_pa = self.max_pa = None
+            self.sketch = QuantileSketch()
+        else:
+            (self.first_time, self.last_time, self.payments, self.negative, self.positive,
+             self.hours, self.mean, self.m2, self.min_pa, self.max_pa) = row[:10]
+            self.sketch = QuantileSketch(json.loads(row[10]))
+
+    def add(self, funding_time: int, rate: float, interval_hours: int | None):
+        self.first_time = funding_time if self.first_time is None else min(self.first_time, funding_time)
+        self.last_time = funding_time if self.last_time is None else max(self.last_time, funding_time)
+        self.payments += 1
+        self.negative += rate < 0
+        self.positive += rate > 0
+        if not interval_hours:
+            return
+        pa = rate * HOURS_PER_YEAR / interval_hours * 100
+        # Weighted Welford (West, 1979), weighted by accrual hours.
+        self.hours += interval_hours
+        delta = pa - self.mean
+        self.mean += delta * interval_hours / self.hours
+        self.m2 += interval_hours * delta * (pa - self.mean)
+        self.min_pa = pa if self.min_pa is None else min(self.min_pa, pa)
+        self.max_pa = pa if self.max_pa is None else max(self.max_pa, pa)
+        self.sketch.add(pa, interval_hours)
+
+    def row(self) -> tuple:
+        return (self.first_time, self.last_time, self.payments, self.negative, self.positive,
+                self.hours, self.mean, self.m2, self.min_pa, self.max_pa, self.sketch.to_json())
+
+    def summary(self) -> dict:
+        """Rounded p.a. statistics as exposed by funding-cli --stats and the dashboard."""
+        known = self.hours > 0
+        return {
+            "payments": self.payments,
+            "first_time": self.first_time,
+            "last_time": self.last_time,
+            "mean_pa": round(self.mean, 2) if known else None,
+            "stdev_pa": round(math.sqrt(max(self.m2, 0.0) / self.hours), 2) if known else None,
+            "min_pa": round(self.min_pa, 2) if known else None,
+            "max_pa": round(self.max_pa, 2) if known else None,
+            **{name: round(self.sketch.quantile(q, self.min_pa, self.max_pa), 2) if known else None
+               for name, q in QUANTILES.items()},
+            "negative_pct": round(self.negative / self.payments * 100, 2) if self.payments else None,
+            "positive_pct": round(self.positive / self.payments * 100, 2) if self.payments else None,
+        }
+
+_COLUMNS = "first_time, last_time, payments, negative, positive, hours, mean, m2, min_pa, max_pa, sketch"
+
+def _load(conn, source: str, symbol: str) -> FundingStats | None:
+    row = conn.execute(f'SELECT {_COLUMNS} FROM funding_stats WHERE source = ? AND symbol = ?', (source, symbol)).fetchone()
+    return FundingStats(tuple(row)) if row else None
+
+def _save(conn, source: str, symbol: str, stats: FundingStats):
+    conn.execute(
+        f'INSERT OR REPLACE INTO funding_stats (source, symbol, {_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+        (source, symbol) + stats.row()
+    )
+
+def rebuild(conn, source: str, symbol: str) -> FundingStats | None:
+    """Recomputes a symbol's statistics from every stored row, inside the caller's transaction."""
+    stats = FundingStats()
+    cursor = conn.execute('''
+        SELECT funding_time, funding_rate, interval_hours FROM funding_rates
+        WHERE source = ? AND symbol = ? ORDER BY funding_time
+    ''', (source, symbol))
+    for t, rate, hours in cursor:
+        stats.add(t, rate, hours)
+    if not stats.payments:
+        conn.execute('DELETE FROM funding_stats WHERE source = ? AND symbol = ?', (source, symbol))
+        return None
+    _save(conn, source, symbol, stats)
+    return stats
+
+def update(conn, source: str, symbol: str, rows: list[tuple], inserted: int):
+    """
+    Folds newly stored rows into a symbol's statistics, inside the writer's transaction.
+    `rows` are the (funding_time, funding_rate, interval_hours) rows stored over the
+    written range and `inserted` how many of them are new. New rows before or after
+    everything seen so far are added; rows filling a gap in between can't be told
+    apart from old ones, so they trigger a rebuild, as does a missing stats row.
+    """
+    stats = _load(conn, source, symbol)
+    if stats is None:
+        rebuild(conn, source, symbol)
+        return
+    new = [row for row in rows if row[0] > stats.last_time or row[0] < stats.first_time]
+    if len(new) != inserted:
+        rebuild(conn, source, symbol)
+        return
+    for t, rate, hours in new:
+        stats.add(t, rate, hours)
+    _save(conn, source, symbol, stats)
+
+def get_stats(symbols: list[str], source: str, conn=None) -> dict[str, dict | None]:
+    """
+    {symbol: summary()} for each symbol, None for symbols without stored rates.
+    Statistics missing from funding_stats (older databases, after a bulk import) are
+    rebuilt once here and kept up to date on ingest from then on.
+    """
+    from .database import _connection
+    with _connection(conn) as conn:
+        results, rebuilt = {}, False
+        for symbol in symbols:
+            stats = _load(conn, source, symbol)
+            if stats is None:
+                stats = rebuild(conn, source, symbol)
+                rebuilt = rebuilt or stats is not None
+            results[symbol] = stats.summary() if stats else None
+        if rebuilt:
+            conn.commit()
+    return results
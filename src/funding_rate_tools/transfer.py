@@ -0,0 +1,261 @@
+import argparse
+import gzip
+import json
+import struct
+import sys
+import time
+from array import array
+from datetime import datetime, timezone
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet support is optional; the built-in format needs nothing extra.
+    pa = pq = None
+
+from .database import bulk_insert_funding_rates, bulk_store_funding_infos, get_db_connection
+
+BLOCK_ROWS = 65536
+COMMIT_ROWS = 500_000
+
+# Built-in format: gzip of MAGIC followed by blocks, each holding one run of a (source,
+# symbol) whose rates accrued over the same interval_hours:
+#   <u32 header length> <JSON header {"source", "symbol", "interval_hours", "rows"}>
+#   <rows x little-endian int64 funding_time> <rows x little-endian float64 funding_rate>
+# A zero header length ends the stream.
+MAGIC = b"FRTCOL1\n"
+PARQUET_MAGIC = b"PAR1"
+GZIP_MAGIC = b"\x1f\x8b"
+_LITTLE_ENDIAN = sys.byteorder == "little"
+
+def _select(conn, sources: list[str] | None, symbols: list[str] | None, start_ms: int | None, end_ms: int | None):
+    """Cursor over the selection, ordered so each (source, symbol) run is contiguous."""
+    where, params = [], []
+    if sources:
+        where.append(f"r.source IN ({','.join('?' * len(sources))})")
+        params.extend(sources)
+    if symbols:
+        where.append(f"r.symbol IN ({','.join('?' * len(symbols))})")
+        params.extend(symbols)
+    if start_ms is not None:
+        where.append("r.funding_time >= ?")
+        params.append(start_ms)
+    if end_ms is not None:
+        where.append("r.funding_time <= ?")
+        params.append(end_ms)
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    cursor.execute(f'''
+        SELECT r.source, r.symbol, r.funding_time, r.funding_rate, r.interval_hours
+        FROM funding_rates r
+        {"WHERE " + " AND ".join(where) if where else ""}
+        ORDER BY r.source, r.symbol, r.funding_time
+    ''', params)
+    return cursor
+
+def _runs(cursor):
+    """Groups the cursor into ((source, symbol, interval_hours), times, rates) runs of at most BLOCK_ROWS."""
+    key, times, rates = None, array("q"), array("d")
+    while True:
+        rows = cursor.fetchmany(BLOCK_ROWS)
+        if not rows:
+            break
+        for source, symbol, t, r, interval in rows:
+            if (source, symbol, interval) != key or len(times) >= BLOCK_ROWS:
+                if times:
+                    yield key, times, rates
+                key, times, rates = (source, symbol, interval), array("q"), array("d")
+            times.append(t)
+            rates.append(r)
+    if times:
+        yield key, times, rates
+
+def _write_columnar(path: str, cursor) -> int:
+    total = 0
+    with gzip.open(path, "wb", compresslevel=6) as f:
+        f.write(MAGIC)
+        for (source, symbol, interval), times, rates in _runs(cursor):
+            header = json.dumps({"source": source, "symbol": symbol, "interval_hours": interval, "rows": len(times)}).encode()
+            f.write(struct.pack("<I", len(header)))
+            f.write(header)
+            if not _LITTLE_ENDIAN:
+                times.byteswap()
+                rates.byteswap()
+            f.write(times.tobytes())
+            f.write(rates.tobytes())
+            total += len(times)
+        f.write(struct.pack("<I", 0))
+    return total
+
+def _read_columnar(path: str):
+    """Yields (source, symbol, interval_hours, times, rates) blocks from a built-in format file."""
+    with gzip.open(path, "rb") as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f"{path} is not a funding export file.")
+        while True:
+            (length,) = struct.unpack("<I", f.read(4))
+            if length == 0:
+                return
+            header = json.loads(f.read(length))
+            n = header["rows"]
+            times, rates = array("q"), array("d")
+            times.frombytes(f.read(8 * n))
+            rates.frombytes(f.read(8 * n))
+            if not _LITTLE_ENDIAN:
+                times.byteswap()
+                rates.byteswap()
+            yield header["source"], header["symbol"], header["interval_hours"], times, rates
+
+def _parquet_schema():
+    return pa.schema([
+        ("source", pa.string()),
+        ("symbol", pa.string()),
+        ("funding_time", pa.int64()),
+        ("funding_rate", pa.float64()),
+        ("interval_hours", pa.int32()),
+    ])
+
+def _write_parquet(path: str, cursor) -> int:
+    total = 0
+    schema = _parquet_schema()
+    with pq.ParquetWriter(path, schema, compression="zstd") as writer:
+        while True:
+            rows = cursor.fetchmany(BLOCK_ROWS)
+            if not rows:
+                break
+            columns = list(zip(*rows))
+            writer.write_table(pa.Table.from_arrays(
+                [pa.array(c, type=field.type) for c, field in zip(columns, schema)], schema=schema
+            ))
+            total += len(rows)
+    return total
+
+def _read_parquet(path: str):
+    """Yields (source, symbol, interval_hours, times, rates) runs in file order, like _read_columnar."""
+    for batch in pq.ParquetFile(path).iter_batches(batch_size=BLOCK_ROWS):
+        data = batch.to_pydict()
+        key, times, rates = None, array("q"), array("d")
+        for source, symbol, t, r, interval in zip(data["source"], data["symbol"], data["funding_time"],
+                                                  data["funding_rate"], data["interval_hours"]):
+            if (source, symbol, interval) != key:
+                if times:
+                    yield *key, times, rates
+                key, times, rates = (source, symbol, interval), array("q"), array("d")
+            times.append(t)
+            rates.append(r)
+        if times:
+            yield *key, times, rates
+
+def export_rates(path: str, fmt: str, sources: list[str] | None = None, symbols: list[str] | None = None,
+                 start_ms: int | None = None, end_ms: int | None = None) -> int:
+    """Streams a selection of funding_rates (with intervals) into `path`. Returns the number of rows."""
+    conn = get_db_connection()
+    try:
+        cursor = _select(conn, sources, symbols, start_ms, end_ms)
+        return _write_parquet(path, cursor) if fmt == "parquet" else _write_columnar(path, cursor)
+    finally:
+        conn.close()
+
+def import_rates(path: str) -> tuple[int, int]:
+    """
+    Merges an export file into the database with INSERT OR IGNORE, committing every
+    COMMIT_ROWS rows. The format is detected from the file. Returns (rows read, rows inserted).
+    Each run's interval is stored as its symbol's funding interval before the run is
+    inserted, so rows whose gaps don't tell their interval fall back to the exported
+    one; runs come oldest first, so the newest run's interval is what remains.
+    """
+    with open(path, "rb") as f:
+        magic = f.read(4)
+    if magic.startswith(GZIP_MAGIC):
+        blocks = _read_columnar(path)
+    elif magic == PARQUET_MAGIC:
+        if pq is None:
+            raise ValueError(f"{path} is a Parquet file, but pyarrow is not installed.")
+        blocks = _read_parquet(path)
+    else:
+        raise ValueError(f"{path} is not a funding export file.")
+
+    conn = get_db_connection()
+    read = inserted = pending = 0
+    intervals = {}
+    try:
+        for source, symbol, interval, times, rates in blocks:
+            if interval and intervals.get((source, symbol)) != interval:
+                bulk_store_funding_infos({symbol: interval}, source, conn)
+                intervals[(source, symbol)] = interval
+            rows = [(symbol, t, r, source) for t, r in zip(times, rates)]
+            inserted += bulk_insert_funding_rates(rows, conn)
+            read += len(rows)
+            pending += len(rows)
+            if pending >= COMMIT_ROWS:
+                conn.commit()
+                pending = 0
+        conn.commit()
+    finally:
+        conn.close()
+    return read, inserted
+
+def _parse_date_ms(value: str, end_of_day: bool = False) -> int:
+    dt = datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc)
+    ms = int(dt.timestamp() * 1000)
+    return ms + 24 * 60 * 60 * 1000 - 1 if end_of_day else ms
+
+def export_main():
+    """Main function for funding-export."""
+    parser = argparse.ArgumentParser(description="Export stored funding rates to a compact columnar file.")
+    parser.add_argument("output", help="File to write.")
+    parser.add_argument(
+        "--exchange",
+        nargs="+",
+        choices=["binance", "hyperliquid", "bybit"],
+        help="Only export these exchanges. Default: all"
+    )
+    parser.add_argument(
+        "--symbols",
+        nargs="+",
+        help="Only export these symbols. Default: all",
+        metavar="SYMBOL"
+    )
+    parser.add_argument("--since", help="Only export rates from this date on (YYYY-MM-DD).", metavar="YYYY-MM-DD")
+    parser.add_argument("--until", help="Only export rates up to and including this date (YYYY-MM-DD).", metavar="YYYY-MM-DD")
+    parser.add_argument(
+        "--format",
+        choices=["parquet", "columnar"],
+        default="parquet" if pq is not None else "columnar",
+        help="Parquet (needs pyarrow) or the built-in gzip columnar format. Default: parquet if pyarrow is installed."
+    )
+    args = parser.parse_args()
+
+    if args.format == "parquet" and pq is None:
+        print("Error: --format parquet needs pyarrow (pip install pyarrow); use --format columnar instead.")
+        sys.exit(1)
+    try:
+        start_ms = _parse_date_ms(args.since) if args.since else None
+        end_ms = _parse_date_ms(args.until, end_of_day=True) if args.until else None
+    except ValueError:
+        print("Error: Invalid date format for --since/--until. Use YYYY-MM-DD.")
+        sys.exit(1)
+
+    t0 = time.time()
+    symbols = [s.upper() for s in args.symbols] if args.symbols else None
+    rows = export_rates(args.output, args.format, args.exchange, symbols, start_ms, end_ms)
+    print(f"Exported {rows} rate(s) to {args.output} ({args.format}) in {time.time() - t0:.1f}s")
+
+def import_main():
+    """Main function for funding-import."""
+    parser = argparse.ArgumentParser(description="Merge a funding-export file into the local database.")
+    parser.add_argument("input", nargs="+", help="File(s) written by funding-export.")
+    args = parser.parse_args()
+
+    failed = False
+    for path in args.input:
+        t0 = time.time()
+        try:
+            read, inserted = import_rates(path)
+        except (OSError, ValueError, EOFError, struct.error) as e:
+            print(f"Error importing {path}: {e}")
+            failed = True
+            continue
+        print(f"Imported {path}: {read} rate(s) read, {inserted} new, in {time.time() - t0:.1f}s")
+    if failed:
+        sys.exit(1)
@@ -1,23 +1,54 @@
 import time
-from .database import get_funding_interval_hours, get_last_funding_time
+from .database import get_refresh_state
+
+def plan_refresh(symbols: list[str], exchange_value: str, refresh_mode: str = "smart", conn=None) -> list[dict]:
+    """
+    Decides for all symbols at once which ones need refreshing and from where,
+    using one database round trip regardless of the number of symbols.
+    refresh_mode is "smart", "always" or "never".
+    Returns one entry per symbol, in order:
+      {symbol, due, start_time_ms, last_time, interval_hours}
+    where start_time_ms is the fetch cursor (None if nothing is stored yet).
+    """
+    state = get_refresh_state(symbols, exchange_value, conn)
+    current_time_ms = int(time.time() * 1000)
+    plan = []
+    for symbol in symbols:
+        last_time_ms = state.get(symbol, {}).get("last_time")
+        interval_hours = state.get(symbol, {}).get("interval_hours")
+        if refresh_mode == "always":
+            due = True
+        elif refresh_mode == "never":
+            due = False
+        elif last_time_ms is None or interval_hours is None:
+            # No data or no interval info, should refresh to be safe
+            due = True
+        else:
+            # Check if enough time has passed for a potential new funding rate
+            due = current_time_ms >= last_time_ms + interval_hours * 60 * 60 * 1000
+        plan.append({
+            "symbol": symbol,
+            "due": due,
+            "start_time_ms": last_time_ms + 1 if last_time_ms else None,
+            "last_time": last_time_ms,
+            "interval_hours": interval_hours,
+        })
+    return plan
 
 def should_refresh_symbol(symbol: str, exchange_value: str) -> bool:
     """
     Determines if a symbol should be refreshed based on smart refresh logic.
     Returns True if refresh is needed, False otherwise.
     """
-    last_time_ms = get_last_funding_time(symbol, exchange_value)
-    if last_time_ms is None:
-        # No data exists, should refresh
-        return True
-
-    interval_hours = get_funding_interval_hours(symbol, exchange_value)
-    if interval_hours is None:
-        # No interval info, should refresh to be safe
-        return True
+    return plan_refresh([symbol], exchange_value)[0]["due"]
 
-    current_time_ms = int(time.time() * 1000)
-    interval_ms = interval_hours * 60 * 60 * 1000
-
-    # Check if enough time has passed for a potential new funding rate
-    return current_time_ms >= (last_time_ms + interval_ms)
+def base_asset(symbol: str) -> str:
+    """
+    Returns the base asset of a pair (BTCUSDT -> BTC), so the same asset can be
+    matched across venues that name their contracts differently.
+    """
+    s = symbol.upper()
+    for suffix in ("USDT", "USD", "USDC"):
+        if s.endswith(suffix):
+            return s[: -len(suffix)]
+    return s